@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from sklearn.preprocessing import StandardScaler
+
+from weather_agent.training.compiled_ensemble import TOLERANCE, compile_model_set, verify
+from weather_agent.training.model_registry import ModelSet
+from weather_agent.training.parallel_trainer import fit_targets
+
+
+def quantized_rows(rng, n):
+    # Open-Meteo style inputs: one decimal, so many rows sit exactly on a
+    # split threshold learned from the same values
+    spread = np.array([5, 8, 3, 6, 4, 2, 9, 1, 7, 3]) * 6
+    offset = np.array([12, 15, 6, 20, 25, 0, 50, 1, 3, 2])
+    X = np.round(rng.normal(size=(n, len(spread))) * spread + offset, 1).astype(np.float32)
+    targets = {"temperature": X[:, 0] * 0.3 + np.sin(X[:, 1]) + X[:, 4] * 0.1,
+               "humidity": X[:, 6] * 0.5 - X[:, 3]}
+    return X, targets
+
+
+def fitted_model_set(estimator):
+    X, targets = quantized_rows(np.random.default_rng(0), 5000)
+    scaler = StandardScaler().fit(X)
+    models, _ = fit_targets(scaler.transform(X), targets, estimator, estimator == 'hist', 1)
+    return X, ModelSet(models, {param: scaler for param in models})
+
+
+def sklearn_predictions(model_set, targets, X):
+    return np.column_stack([model_set.models[param].predict(model_set.scalers[param].transform(X))
+                            for param in targets])
+
+
+@pytest.mark.parametrize("estimator", ["gbr", "hist"])
+def test_compiled_matches_sklearn_on_training_rows(estimator):
+    X, model_set = fitted_model_set(estimator)
+    compiled = compile_model_set(model_set)
+    expected = sklearn_predictions(model_set, compiled.targets, X)
+    np.testing.assert_allclose(compiled.predict(X), expected, rtol=0, atol=1e-9)
+
+
+@pytest.mark.parametrize("estimator", ["gbr", "hist"])
+def test_verify_catches_scaling_in_float64(estimator):
+    _, model_set = fitted_model_set(estimator)
+    compiled = compile_model_set(model_set)
+    assert verify(compiled, model_set) <= TOLERANCE
+
+    # Scaling with the float64 mean/scale flips splits for rows on a threshold
+    scaler = model_set.scalers[compiled.targets[0]]
+    compiled.mean = np.array([scaler.mean_] * len(compiled.targets))
+    compiled.scale = np.array([scaler.scale_] * len(compiled.targets))
+    assert verify(compiled, model_set) > TOLERANCE
@@ -0,0 +1,84 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from weather_agent.data_cache import HistoryCache
+from weather_agent.data_fetcher import OpenMeteoFetcher
+
+VARIABLES = list(OpenMeteoFetcher.HOURLY_VARIABLES)
+LAT, LON = 19.08, 72.88
+
+
+class Archive:
+    # Stands in for the API: hourly rows for the requested days, with hours
+    # from `observed_until` on still null (the archive's lag)
+    def __init__(self, observed_until=None):
+        self.observed_until = pd.Timestamp(observed_until) if observed_until else None
+        self.calls = []
+
+    def fetch(self, start, end):
+        self.calls.append((start, end))
+        times = pd.date_range(start, pd.Timestamp(end) + pd.Timedelta(hours=23), freq="h")
+        frame = pd.DataFrame({"time": times})
+        for i, name in enumerate(VARIABLES):
+            values = np.arange(len(times), dtype=float) + i
+            if self.observed_until is not None:
+                values[times >= self.observed_until] = np.nan
+            frame[name] = values
+        return frame
+
+
+def test_partial_hit_fetches_only_missing_ranges(tmp_path):
+    cache = HistoryCache(str(tmp_path))
+    archive = Archive()
+    cache.get(LAT, LON, VARIABLES, "2024-01-01", "2024-01-05", archive.fetch)
+    cache.get(LAT, LON, VARIABLES, "2024-01-10", "2024-01-12", archive.fetch)
+    archive.calls.clear()
+
+    frame = cache.get(LAT, LON, VARIABLES, "2024-01-01", "2024-01-12", archive.fetch)
+
+    assert archive.calls == [("2024-01-06", "2024-01-09")]
+    assert len(frame) == 12 * 24
+    assert frame["time"].is_monotonic_increasing
+
+
+def test_pending_tail_is_fetched_again(tmp_path):
+    cache = HistoryCache(str(tmp_path), refresh_after=timedelta(0))
+    archive = Archive(observed_until="2024-01-03 18:00")
+    cache.get(LAT, LON, VARIABLES, "2024-01-01", "2024-01-03", archive.fetch)
+
+    # The complete days come from the cache; only the day with null hours is asked for again
+    archive.calls.clear()
+    archive.observed_until = None
+    frame = cache.get(LAT, LON, VARIABLES, "2024-01-01", "2024-01-03", archive.fetch)
+
+    assert archive.calls == [("2024-01-03", "2024-01-03")]
+    assert not frame[VARIABLES].isna().any().any()
+    assert cache.missing_ranges(LAT, LON, VARIABLES, "2024-01-01", "2024-01-03") == []
+
+
+def test_pending_tail_waits_for_refresh_after(tmp_path):
+    cache = HistoryCache(str(tmp_path), refresh_after=timedelta(hours=1))
+    archive = Archive(observed_until="2024-01-03 18:00")
+    cache.get(LAT, LON, VARIABLES, "2024-01-01", "2024-01-03", archive.fetch)
+    archive.calls.clear()
+
+    cache.get(LAT, LON, VARIABLES, "2024-01-01", "2024-01-03", archive.fetch)
+
+    assert archive.calls == []
+
+
+def test_empty_result_keeps_variable_columns(tmp_path):
+    cache = HistoryCache(str(tmp_path))
+    empty = lambda start, end: pd.DataFrame(columns=["time"] + VARIABLES)
+
+    frame = cache.get(LAT, LON, VARIABLES, "2024-01-01", "2024-01-02", empty)
+    assert list(frame.columns) == ["time"] + VARIABLES
+    assert list(cache.stitch([], VARIABLES, "2024-01-01", "2024-01-02").columns) == ["time"] + VARIABLES
+
+    fetcher = OpenMeteoFetcher(cache=cache)
+    fetcher._fetch_range = lambda latitude, longitude, start, end, variables: empty(start, end)
+    series = fetcher.fetch_historical_series(LAT, LON, "2024-02-01", "2024-02-02")
+    assert len(series) == 0
+    assert set(series.names()) == set(OpenMeteoFetcher.HOURLY_VARIABLES.values())
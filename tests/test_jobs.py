@@ -0,0 +1,81 @@
+import time
+import threading
+
+from weather_agent.training.jobs import TrainingJobQueue
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+class BlockingRunner:
+    # run_job that records who ran each job and holds it until released
+    def __init__(self):
+        self.runs = []
+        self.release = threading.Event()
+
+    def __call__(self, job, progress):
+        self.runs.append(job["id"])
+        self.release.wait(10)
+        return {"ok": True}
+
+
+def test_job_of_live_owner_is_not_requeued(tmp_path):
+    db = str(tmp_path / "jobs.sqlite3")
+    runner = BlockingRunner()
+    first = TrainingJobQueue(runner, db, poll_interval=0.05, lease_seconds=0.6)
+    second = TrainingJobQueue(runner, db, poll_interval=0.05, lease_seconds=0.6)
+    try:
+        first.start()
+        job_id = first.submit(19.08, 72.88)
+        assert wait_for(lambda: len(runner.runs) == 1)
+        # A new worker starting up, for several leases, must leave it alone
+        second.start()
+        time.sleep(2.0)
+        assert len(runner.runs) == 1
+        job = second.get(job_id)
+        assert job["status"] == "running"
+        assert job["owner"] == first.owner
+    finally:
+        runner.release.set()
+        first.stop(2)
+        second.stop(2)
+
+
+def test_job_of_dead_owner_is_requeued_after_lease(tmp_path):
+    db = str(tmp_path / "jobs.sqlite3")
+    runner = BlockingRunner()
+    dead = TrainingJobQueue(runner, db, poll_interval=0.05, lease_seconds=0.6)
+    live = TrainingJobQueue(runner, db, poll_interval=0.05, lease_seconds=0.6)
+    try:
+        dead.start()
+        job_id = dead.submit(19.08, 72.88)
+        assert wait_for(lambda: len(runner.runs) == 1)
+        # The owner stops heartbeating (as if its process had died mid-job)
+        dead._stop.set()
+        live.start()
+        assert wait_for(lambda: len(runner.runs) == 2)
+        assert live.get(job_id)["owner"] == live.owner
+
+        runner.release.set()
+        assert wait_for(lambda: live.get(job_id)["status"] == "succeeded")
+    finally:
+        runner.release.set()
+        dead.stop(2)
+        live.stop(2)
+
+
+def test_queued_jobs_for_same_location_are_deduplicated(tmp_path):
+    queue = TrainingJobQueue(lambda job, progress: {}, str(tmp_path / "jobs.sqlite3"))
+    first = queue.submit(19.08, 72.88, options={"estimator": "gbr"})
+
+    assert queue.submit(19.08, 72.88, options={"estimator": "gbr"}) == first
+    assert queue.submit(19.08, 72.88, options={"estimator": "hist"}) != first
+    assert queue.submit(19.08, 72.88, kind="refresh") != first
+    assert queue.submit(12.97, 77.59, options={"estimator": "gbr"}) != first
+    assert len(queue.list(status="queued")) == 4
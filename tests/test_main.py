@@ -0,0 +1,12 @@
+import subprocess
+import sys
+
+from weather_agent.benchmarks.startup import HEAVY_MODULES
+
+
+def test_importing_the_app_loads_no_heavy_modules():
+    # A fresh worker must come up without pandas, pyarrow or sklearn; they
+    # load with the predictor on the first request (or the warmup)
+    code = f"import sys, weather_agent.main; print([m for m in {HEAVY_MODULES!r} if m in sys.modules])"
+    process = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert process.stdout.strip() == "[]"
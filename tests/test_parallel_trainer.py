@@ -0,0 +1,35 @@
+import numpy as np
+
+from weather_agent.training.parallel_trainer import can_warm_start, fit_targets, warm_start_targets
+
+
+def rows(rng, n):
+    X = rng.normal(size=(n, 6)).astype(np.float32)
+    y = np.sin(X[:, 0]) * 2 + X[:, 1] + 0.5 * X[:, 2] + 0.3 * rng.normal(size=n)
+    return X, y
+
+
+def rmse(model, X, y):
+    return float(np.sqrt(np.mean(np.square(model.predict(X) - y))))
+
+
+def test_refresh_on_same_distribution_keeps_held_out_error():
+    # A refresh's new hours come from the same weather as the training
+    # window; the extra stages must not undo what the old ones learned
+    np.random.seed(0)  # sklearn's trees break ties with the global RNG
+    rng = np.random.default_rng(0)
+    X, y = rows(rng, 20000)
+    X_new, y_new = rows(rng, 192)
+    X_test, y_test = rows(rng, 5000)
+
+    models, _ = fit_targets(X, {"temperature": y}, 'gbr', False, 1)
+    extended, _ = warm_start_targets(models, X_new, {"temperature": y_new}, 10)
+
+    assert len(extended["temperature"].estimators_) == len(models["temperature"].estimators_) + 10
+    assert rmse(extended["temperature"], X_test, y_test) <= rmse(models["temperature"], X_test, y_test) * 1.05
+
+
+def test_hist_models_fall_back_to_a_full_retrain():
+    X, y = rows(np.random.default_rng(0), 2000)
+    models, _ = fit_targets(X, {"temperature": y}, 'hist', True, 1)
+    assert not can_warm_start(models["temperature"])
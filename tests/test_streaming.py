@@ -0,0 +1,41 @@
+import numpy as np
+
+from weather_agent.history_store import LocationHistory
+from weather_agent.hourly_series import HourlySeries
+from weather_agent.training.streaming import iter_feature_chunks
+from weather_agent.weather_predictor import WeatherPredictor
+
+HOUR = 3600
+PARAMETERS = WeatherPredictor.PARAMETERS
+
+
+def series(start, hours, missing=()):
+    times = start + HOUR * np.arange(hours, dtype=np.int64)
+    columns = {name: np.arange(hours, dtype=np.float32) + i
+               for i, name in enumerate(PARAMETERS + ['pressure', 'wind_direction'])}
+    for hour, param in missing:
+        columns[param][hour] = np.nan
+    return HourlySeries(times, columns)
+
+
+def prepare_features(history: LocationHistory):
+    return history.values.T.copy()
+
+
+def test_chunks_drop_hours_with_a_missing_target():
+    # Hour 5 of the first chunk lost one target and the second chunk ends in
+    # the archive's null tail; fill_gaps() fills both, but neither may be a
+    # training row
+    start = 1_700_000_000 // HOUR * HOUR
+    first = series(start, 48, missing=[(5, 'humidity')])
+    second = series(start + 48 * HOUR, 48, missing=[(hour, param) for hour in range(40, 48) for param in PARAMETERS])
+
+    chunks = list(iter_feature_chunks([("a", first), ("a", second)], prepare_features, PARAMETERS))
+
+    times = np.concatenate([chunk[1] for chunk in chunks])
+    assert start + 5 * HOUR not in times
+    assert len(times) == 96 - 1 - 8
+    assert times[-1] == start + 87 * HOUR
+    for _, _, X, Y in chunks:
+        assert len(X) == len(Y)
+        assert not np.isnan(Y).any()
@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from weather_agent.hourly_series import HourlySeries
+from weather_agent.training.model_registry import ModelRegistry
+from weather_agent.weather_predictor import WeatherPredictor
+
+LAT, LON = 19.076, 72.8777
+HOUR = 3600
+NOISE = np.random.default_rng(0).normal(size=(6, 10007))
+
+
+class Archive:
+    # Stands in for OpenMeteoFetcher: a daily cycle plus noise for every
+    # requested hour, with the last `null_hours` still null (the archive's lag)
+    def __init__(self, null_hours=0, offset=0.0):
+        self.null_hours = null_hours
+        self.offset = offset
+        self.last = None
+
+    def fetch_historical_series(self, latitude, longitude, start_date, end_date):
+        start = int(datetime.strptime(start_date, "%Y-%m-%d").timestamp()) // HOUR * HOUR
+        end = int(datetime.strptime(end_date, "%Y-%m-%d").timestamp()) // HOUR * HOUR + 23 * HOUR
+        times = np.arange(start, end + 1, HOUR, dtype=np.int64)
+        # The same hour always gets the same values, whichever range asks for it
+        noise = NOISE[:, (times // HOUR) % NOISE.shape[1]]
+        daily = np.sin(2 * np.pi * ((times // HOUR) % 24) / 24)
+        columns = {
+            "temperature": 28 + 4 * daily + noise[0] + self.offset,
+            "precipitation": np.clip(noise[1], 0, None),
+            "humidity": 70 - 10 * daily + noise[2],
+            "wind_speed": 10 + 2 * daily + noise[3],
+            "pressure": 1010 + noise[4],
+            "wind_direction": 180 + 50 * noise[5],
+        }
+        if self.null_hours:
+            for values in columns.values():
+                values[-self.null_hours:] = np.nan
+        self.last = HourlySeries(times, columns)
+        return self.last
+
+
+@pytest.fixture
+def predictor(tmp_path):
+    predictor = WeatherPredictor(ModelRegistry(str(tmp_path)))
+    predictor.TRAINING_WINDOW_DAYS = 60
+    predictor.INTERVAL_MAX_LEAD = 24
+    return predictor
+
+
+def test_train_calibrates_only_on_observed_hours(predictor):
+    predictor.data_fetcher = Archive(null_hours=72)
+    calibrated = []
+    calibrate = predictor._calibrate_intervals
+
+    def spy(models, scaler, features, targets, times=None):
+        calibrated.append(times)
+        return calibrate(models, scaler, features, targets, times)
+
+    predictor._calibrate_intervals = spy
+    predictor.train(LAT, LON, n_jobs=1)
+
+    fetched = predictor.data_fetcher.last.times
+    times, = calibrated
+    # Every calibration origin and target is one of the observed hours; the
+    # forward-filled tail would have added the last 72
+    assert np.isin(times, fetched[:-72]).all()
+    assert times[-1] == fetched[-73]
+    model_set = predictor.registry.get(predictor._model_key(LAT, LON))
+    assert model_set.metadata["trained_through"] == fetched[-73]
+    intervals = model_set.metadata["intervals"]
+    assert intervals["n_calibration"] == len(times)
+    assert intervals["temperature"]["leads"] == list(range(predictor.INTERVAL_MAX_LEAD + 1))
+
+
+def test_refresh_extends_models_without_drift(predictor):
+    predictor.data_fetcher = Archive(null_hours=72)
+    predictor.train(LAT, LON, n_jobs=1)
+    key = predictor._model_key(LAT, LON)
+    trained = predictor.registry.get(key)
+
+    # Two more days of the same weather have been published since
+    predictor.data_fetcher = Archive(null_hours=24)
+    result = predictor.refresh(LAT, LON)
+
+    assert result["message"] == "Models refreshed"
+    assert result["new_hours"] == 48
+    assert max(result["drift"].values()) < predictor.DRIFT_RATIO
+    refreshed = predictor.registry.get(key)
+    assert refreshed.version != trained.version
+    assert refreshed.metadata["refreshes"] == 1
+    assert refreshed.metadata["trained_through"] == trained.metadata["trained_through"] + 48 * HOUR
+    assert refreshed.metadata["intervals"] == trained.metadata["intervals"]
+    # The new hours plus the context before the calibration window, none of
+    # the calibration hours themselves
+    assert refreshed.metadata["n_refresh_samples"] == 48 + predictor.REFRESH_CONTEXT_HOURS
+    assert (len(refreshed.models["temperature"].estimators_)
+            == len(trained.models["temperature"].estimators_) + predictor.REFRESH_ESTIMATORS)
+
+
+def test_refresh_retrains_in_full_on_drift(predictor):
+    predictor.data_fetcher = Archive(null_hours=72)
+    predictor.train(LAT, LON, n_jobs=1)
+    key = predictor._model_key(LAT, LON)
+    trained = predictor.registry.get(key)
+
+    # Temperatures jump by 8 degrees everywhere, far outside the intervals
+    predictor.data_fetcher = Archive(null_hours=24, offset=8.0)
+    predictor.history_store.discard(predictor.registry.location_key(LAT, LON))
+    result = predictor.refresh(LAT, LON, n_jobs=1)
+
+    assert result["refresh"] == "full retrain: drift in temperature"
+    retrained = predictor.registry.get(key)
+    assert retrained.version == result["version"] != trained.version
+    assert retrained.metadata["refreshes"] == 0
+    assert retrained.metadata["trained_through"] == trained.metadata["trained_through"] + 48 * HOUR
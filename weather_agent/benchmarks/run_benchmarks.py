@@ -0,0 +1,249 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime, timedelta
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import BaseAdapter
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+DEFAULT_FIXTURE = os.path.join(FIXTURE_DIR, "open_meteo_archive_30d.json")
+DEFAULT_SIZES = [30, 365, 730, 1825]
+DEFAULT_TRAIN_SIZES = [30, 365, 730]
+
+# Older variable names some collectors still ask for -> the ones in the fixture
+VARIABLE_ALIASES = {
+    "windspeed_10m": "wind_speed_10m",
+    "winddirection_10m": "wind_direction_10m",
+    "cloudcover": "cloud_cover",
+    "pressure_msl": "surface_pressure"
+}
+
+
+class FixtureAdapter(BaseAdapter):
+    # requests transport that answers Open-Meteo archive calls from a fixture
+    # response. The checked-in fixture is synthetic (generated values, not real
+    # Open-Meteo data) unless replaced with --record. Any date range is served
+    # by repeating the fixture's hours, so one 30-day fixture covers benchmarks
+    # from 30 days to 5 years.
+    def __init__(self, fixture_path: str = DEFAULT_FIXTURE):
+        super().__init__()
+        with open(fixture_path) as f:
+            self.fixture = json.load(f)
+        self.calls = 0
+
+    def send(self, request, **kwargs):
+        self.calls += 1
+        params = {k: v[0] for k, v in parse_qs(urlparse(request.url).query).items()}
+        if "elevation" in request.url:
+            body = {"elevation": [self.fixture.get("elevation", 0.0)]}
+        else:
+            body = self.payload(params)
+
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps(body).encode()
+        response.headers["Content-Type"] = "application/json"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def payload(self, params: dict) -> dict:
+        fixture_hourly = self.fixture["hourly"]
+        times = pd.date_range(params["start_date"], pd.Timestamp(params["end_date"]) + pd.Timedelta(hours=23), freq="h")
+        repeat = np.arange(len(times)) % len(fixture_hourly["time"])
+
+        hourly = {"time": times.strftime("%Y-%m-%dT%H:%M").tolist()}
+        for variable in params["hourly"].split(","):
+            values = fixture_hourly[VARIABLE_ALIASES.get(variable, variable)]
+            hourly[variable] = [values[i] for i in repeat]
+
+        body = {k: v for k, v in self.fixture.items() if k != "hourly"}
+        body.update({"latitude": float(params["latitude"]), "longitude": float(params["longitude"]), "hourly": hourly})
+        return body
+
+    def close(self):
+        pass
+
+
+def record_fixture(path: str, lat: float, lon: float, days: int = 30):
+    # Save a real archive response to replay later (needs network access)
+    from weather_agent.data_fetcher import OpenMeteoFetcher
+
+    end = datetime.now() - timedelta(days=7)
+    variables = list(OpenMeteoFetcher.HOURLY_VARIABLES) + ["cloud_cover", "wind_direction_10m"]
+    response = requests.get("https://archive-api.open-meteo.com/v1/archive", params={
+        "latitude": lat,
+        "longitude": lon,
+        "start_date": (end - timedelta(days=days - 1)).strftime("%Y-%m-%d"),
+        "end_date": end.strftime("%Y-%m-%d"),
+        "hourly": ",".join(variables)
+    })
+    response.raise_for_status()
+    with open(path, "w") as f:
+        json.dump(response.json(), f, ensure_ascii=False, separators=(",", ":"))
+
+
+def timeit(fn, repeats: int):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return {
+        "repeats": repeats,
+        "min_s": round(min(timings), 6),
+        "median_s": round(float(np.median(timings)), 6),
+        "p95_s": round(float(np.percentile(timings, 95)), 6)
+    }
+
+
+def run(sizes: list, train_sizes: list, repeats: int, fixture: str, estimator: str) -> list:
+    from weather_agent import http_client
+    from weather_agent.data_cache import HistoryCache
+    from weather_agent.data_fetcher import OpenMeteoFetcher
+    from weather_agent.training.model_registry import ModelRegistry
+    from weather_agent.weather_predictor import WeatherPredictor
+    from weather_agent.data_processors.weather_analyzer import WeatherAnalyzer
+
+    session = requests.Session()
+    session.mount("https://", FixtureAdapter(fixture))
+    session.mount("http://", FixtureAdapter(fixture))
+    http_client.set_session(session)
+
+    lat, lon = 19.0760, 72.8777
+    workdir = tempfile.mkdtemp(prefix="weather_agent_bench_")
+    results = []
+
+    def record(name, days, stats):
+        stats = dict(name=name, days=days, **stats)
+        results.append(stats)
+        print(f"{name:<24} {days:>5}d  median {stats['median_s'] * 1000:10.2f} ms  p95 {stats['p95_s'] * 1000:10.2f} ms")
+
+    uncached = OpenMeteoFetcher(use_cache=False)
+    analyzer = WeatherAnalyzer()
+    for days in sizes:
+        end = datetime.now()
+        start_date = (end - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+        end_date = end.strftime("%Y-%m-%d")
+
+        # Download + JSON parse + DataFrame build, no cache
+        record("fetch_parse", days, timeit(
+            lambda: uncached.fetch_historical_data(lat, lon, start_date, end_date), repeats))
+
+        # Same request answered from a warm local cache
+        cached = OpenMeteoFetcher(cache=HistoryCache(os.path.join(workdir, f"cache_{days}")))
+        cached.fetch_historical_data(lat, lon, start_date, end_date)
+        record("fetch_cached", days, timeit(
+            lambda: cached.fetch_historical_data(lat, lon, start_date, end_date), repeats))
+
+        data = uncached.fetch_historical_data(lat, lon, start_date, end_date)
+        predictor = WeatherPredictor(registry=ModelRegistry(os.path.join(workdir, "models_features")))
+        record("prepare_features", days, timeit(lambda: predictor._prepare_features(data), repeats))
+
+        raw = {"weather": uncached_body(session, lat, lon, start_date, end_date), "elevation": [14.0]}
+        record("analyze_historical_data", days, timeit(lambda: analyzer.analyze_historical_data(raw), repeats))
+
+    for days in train_sizes:
+        predictor = WeatherPredictor(registry=ModelRegistry(os.path.join(workdir, f"models_{days}")))
+        predictor.data_fetcher = OpenMeteoFetcher(cache=HistoryCache(os.path.join(workdir, "cache_train")))
+        predictor.TRAINING_WINDOW_DAYS = days
+        record(f"train_{estimator}", days, timeit(
+            lambda: predictor.train(lat, lon, estimator=estimator), 1))
+
+        # Per-request latency once models and recent data are warm
+        predictor.predict("mumbai", datetime.now().strftime("%Y-%m-%d"))
+        record("predict", days, timeit(
+            lambda: predictor.predict("mumbai", datetime.now().strftime("%Y-%m-%d")), max(repeats, 20)))
+
+        # Just the models on one row: compiled ensemble vs. sklearn per parameter
+        model_set = predictor._get_model_set(lat, lon)
+        if model_set.compiled is not None:
+            row = model_set.compiled.mean[:1].astype(np.float32)
+            record("models_compiled", days, timeit(lambda: model_set.compiled.predict(row), max(repeats, 20)))
+            record("models_sklearn", days, timeit(lambda: {
+                param: model.predict(model_set.scalers[param].transform(row)) for param, model in model_set.models.items()
+            }, max(repeats, 20)))
+
+    return results
+
+
+def uncached_body(session, lat, lon, start_date, end_date) -> bytes:
+    return session.get("https://archive-api.open-meteo.com/v1/archive", params={
+        "latitude": lat,
+        "longitude": lon,
+        "start_date": start_date,
+        "end_date": end_date,
+        "hourly": "temperature_2m,precipitation,windspeed_10m,cloudcover"
+    }).content
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(__file__)).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: list, baseline_path: str):
+    with open(baseline_path) as f:
+        baseline = {(r["name"], r["days"]): r for r in json.load(f)["results"]}
+    print(f"\nvs {baseline_path} (median, >1 is slower)")
+    for r in results:
+        base = baseline.get((r["name"], r["days"]))
+        if base and base["median_s"] > 0:
+            days = f"{r['days']}d" if r["days"] is not None else ""
+            print(f"{r['name']:<24} {days:>6}  {r['median_s'] / base['median_s']:6.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the fetch, feature, train and predict hot paths")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma-separated history lengths in days")
+    parser.add_argument("--train-sizes", default=",".join(map(str, DEFAULT_TRAIN_SIZES)),
+                        help="history lengths to train on (training is slow, keep these small)")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--estimator", default="gbr", choices=["gbr", "hist"])
+    parser.add_argument("--fixture", default=DEFAULT_FIXTURE)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--record", action="store_true", help="record a fresh fixture from the live API and exit")
+    args = parser.parse_args(argv)
+
+    if args.record:
+        record_fixture(args.fixture, 19.0760, 72.8777)
+        print(f"Recorded {args.fixture}")
+        return
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    train_sizes = [int(s) for s in args.train_sizes.split(",") if s]
+    results = run(sizes, train_sizes, args.repeats, args.fixture, args.estimator)
+
+    report = {
+        "commit": git_commit(),
+        "created_at": datetime.now().isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "fixture": os.path.basename(args.fixture),
+        "results": results
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
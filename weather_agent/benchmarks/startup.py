@@ -0,0 +1,115 @@
+import os
+import sys
+import json
+import argparse
+import platform
+import subprocess
+from datetime import datetime
+
+import numpy as np
+
+from .run_benchmarks import git_commit, compare
+
+DEFAULT_MODULES = ["weather_agent.main"]
+# Modules a fresh worker shouldn't need before its first real request
+HEAVY_MODULES = ["pandas", "sklearn", "scipy", "pyarrow", "joblib", "osmnx", "shapely", "rasterio"]
+
+# Run in a fresh interpreter: import (and optionally build the predictor), then
+# report peak RSS and which heavy modules ended up loaded
+CHILD = """
+import sys, time, json, resource
+def snapshot(started):
+    return {{
+        "seconds": time.perf_counter() - started,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "heavy": [name for name in {heavy!r} if name in sys.modules]
+    }}
+started = time.perf_counter()
+import {module} as target
+report = {{"import": snapshot(started)}}
+if {predictor} and hasattr(target, "get_predictor"):
+    target.get_predictor()
+    report["ready"] = snapshot(started)
+print(json.dumps(report))
+"""
+
+
+def measure(module: str, predictor: bool = False) -> dict:
+    # One cold start; -X importtime writes "self | cumulative | name" (us) per import to stderr
+    code = CHILD.format(module=module, predictor=predictor, heavy=HEAVY_MODULES)
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                             capture_output=True, text=True, cwd=os.getcwd())
+    if process.returncode != 0:
+        raise Exception(f"Importing {module} failed:\n{process.stderr[-2000:]}")
+
+    imports = []
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        imports.append((name.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6))
+    report = json.loads(process.stdout.strip().splitlines()[-1])
+    report["imports"] = imports
+    return report
+
+
+def run(modules: list, repeats: int, predictor: bool, top: int) -> list:
+    results = []
+    for module in modules:
+        runs = [measure(module, predictor) for _ in range(repeats)]
+        for stage in ("import", "ready"):
+            if stage not in runs[-1]:
+                continue
+            timings = [r[stage]["seconds"] for r in runs]
+            results.append({
+                "name": f"{stage}:{module}",
+                "days": None,
+                "repeats": repeats,
+                "min_s": round(min(timings), 6),
+                "median_s": round(float(np.median(timings)), 6),
+                "p95_s": round(float(np.percentile(timings, 95)), 6),
+                "max_rss_mb": round(float(np.median([r[stage]["max_rss_mb"] for r in runs])), 1),
+                "heavy_modules": runs[-1][stage]["heavy"]
+            })
+            print(f"{stage + ':' + module:<40} median {results[-1]['median_s'] * 1000:8.1f} ms  "
+                  f"rss {results[-1]['max_rss_mb']:7.1f} MB  heavy: {', '.join(runs[-1][stage]['heavy']) or '-'}")
+
+        # Slowest imports of the last run by their own (self) time
+        slowest = sorted(runs[-1]["imports"], key=lambda i: i[1], reverse=True)[:top]
+        for name, self_s, cumulative_s in slowest:
+            print(f"    {name:<50} self {self_s * 1000:7.1f} ms  cumulative {cumulative_s * 1000:7.1f} ms")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold-start import time and memory with python -X importtime")
+    parser.add_argument("--modules", default=",".join(DEFAULT_MODULES), help="comma-separated modules to import")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--predictor", action="store_true",
+                        help="also time building the predictor after import (the first request's extra cost)")
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    parser.add_argument("--output", default="startup_results.json")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    modules = [m for m in args.modules.split(",") if m]
+    results = run(modules, args.repeats, args.predictor, args.top)
+
+    report = {
+        "commit": git_commit(),
+        "created_at": datetime.now().isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": results
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
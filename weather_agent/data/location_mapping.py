@@ -1,3 +1,7 @@
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
 class MicroLocationMapper:
     def __init__(self):
         self.micro_regions = {
@@ -14,4 +18,81 @@ class MicroLocationMapper:
                 "andheri": {"lat": 19.1136, "lon": 72.8697}
             },
             # Add Delhi and Chennai micro-regions
-        }
\ No newline at end of file
+        }
+        self._build_index()
+
+    def _build_index(self):
+        # Flat list of every area and sub-region, keyed "city.area[.sub_region]"
+        self.regions = []
+        for city, areas in self.micro_regions.items():
+            for area, info in areas.items():
+                self.regions.append(self._region(city, area, None, info))
+                for sub_region in info.get("sub_regions", []):
+                    self.regions.append(self._region(city, area, sub_region["name"], sub_region))
+        self._by_key = {region["key"]: region for region in self.regions}
+
+        # KD-tree over unit vectors on the sphere: straight-line (chord) distance
+        # orders points the same way great-circle distance does, so nearest
+        # queries are exact and O(log n)
+        from sklearn.neighbors import KDTree
+        self._tree = KDTree(self._unit_vectors([r["lat"] for r in self.regions], [r["lon"] for r in self.regions]))
+
+    def get_coordinates(self, city: str, area: str) -> dict:
+        region = self._by_key.get(f"{city.lower()}.{area.lower()}")
+        if region is None:
+            raise Exception(f"Unknown area {area} in {city}")
+        return region
+
+    def get_sub_regions(self, city: str, area: str) -> list:
+        # The area's sub-regions, or the area itself when it has none
+        area_region = self.get_coordinates(city, area)
+        subs = [r for r in self.regions
+                if r["city"] == area_region["city"] and r["area"] == area_region["area"] and r["sub_region"]]
+        return subs or [area_region]
+
+    def nearest(self, lat: float, lon: float, k: int = 1) -> list:
+        # [(region, distance_km), ...] closest first
+        k = min(k, len(self.regions))
+        chord, index = self._tree.query(self._unit_vectors([lat], [lon]), k=k)
+        distances = 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(chord[0] / 2, 1.0))
+        return [(self.regions[i], float(d)) for i, d in zip(index[0], distances)]
+
+    def resolve(self, location: str) -> dict:
+        # Accepts "city.area[.sub_region]" (also with "/" or ", "), "area", "city" or "lat,lon"
+        text = location.strip().lower()
+        parts = [p.strip() for p in text.replace("/", ".").replace(",", ".").split(".") if p.strip()]
+
+        try:
+            lat, lon = (float(v) for v in text.split(","))
+            return {"key": None, "city": None, "area": None, "sub_region": None, "lat": lat, "lon": lon}
+        except ValueError:
+            pass
+
+        key = ".".join(parts)
+        if key in self._by_key:
+            return self._by_key[key]
+        # "area, city" written the other way round
+        reversed_key = ".".join(reversed(parts))
+        if reversed_key in self._by_key:
+            return self._by_key[reversed_key]
+        if len(parts) == 1:
+            if parts[0] in self.micro_regions:
+                return self._city_region(parts[0])
+            areas = [r for r in self.regions if r["area"] == parts[0] and r["sub_region"] is None]
+            if len(areas) == 1:
+                return areas[0]
+        raise Exception(f"Unknown location {location}")
+
+    def _city_region(self, city: str) -> dict:
+        areas = [r for r in self.regions if r["city"] == city and r["sub_region"] is None]
+        return {"key": city, "city": city, "area": None, "sub_region": None,
+                "lat": float(np.mean([r["lat"] for r in areas])), "lon": float(np.mean([r["lon"] for r in areas]))}
+
+    def _region(self, city, area, sub_region, info) -> dict:
+        key = ".".join(part for part in (city, area, sub_region) if part)
+        return {"key": key, "city": city, "area": area, "sub_region": sub_region,
+                "lat": info["lat"], "lon": info["lon"]}
+
+    def _unit_vectors(self, lats, lons) -> np.ndarray:
+        lat, lon = np.radians(lats), np.radians(lons)
+        return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
@@ -0,0 +1,174 @@
+import os
+import json
+import asyncio
+import hashlib
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from .paths import DEFAULT_CACHE_DIR
+
+
+class HistoryCache:
+    # On-disk cache of Open-Meteo hourly history, one Parquet file per month:
+    #   <cache_dir>/history/<lat>_<lon>/<variable set hash>/<YYYY-MM>.parquet
+    # Days that are not complete yet (the archive lags a few days behind) are
+    # tracked in a small manifest so they get refetched, but at most once per
+    # `refresh_after` instead of on every request.
+    def __init__(self, cache_dir: str = None, precision: int = 2,
+                 refresh_after: timedelta = timedelta(hours=1)):
+        self.cache_dir = os.path.join(cache_dir or DEFAULT_CACHE_DIR, "history")
+        self.precision = precision
+        self.refresh_after = refresh_after
+
+    def round_coordinates(self, lat: float, lon: float):
+        return round(float(lat), self.precision), round(float(lon), self.precision)
+
+    def get(self, lat: float, lon: float, variables: list, start_date: str, end_date: str, fetch) -> pd.DataFrame:
+        # `fetch(start_date, end_date)` is only called for the missing ranges
+        cached = self.read(lat, lon, variables, start_date, end_date)
+        missing = self.missing_ranges(lat, lon, variables, start_date, end_date, cached)
+        if not missing:
+            return cached
+
+        fetched = []
+        for start, end in missing:
+            frame = fetch(start, end)
+            self.write(lat, lon, variables, frame, requested=(start, end))
+            fetched.append(frame)
+        return self.stitch([cached] + fetched, variables, start_date, end_date)
+
+    async def aget(self, lat: float, lon: float, variables: list, start_date: str, end_date: str, fetch) -> pd.DataFrame:
+        # Same as get() for an async `fetch`; the missing ranges are requested
+        # concurrently and the Parquet reads/writes run in a thread so the
+        # event loop keeps serving other requests
+        cached = await asyncio.to_thread(self.read, lat, lon, variables, start_date, end_date)
+        missing = await asyncio.to_thread(self.missing_ranges, lat, lon, variables, start_date, end_date, cached)
+        if not missing:
+            return cached
+
+        fetched = await asyncio.gather(*(fetch(start, end) for start, end in missing))
+        await asyncio.to_thread(self._write_ranges, lat, lon, variables, missing, fetched)
+        return self.stitch([cached] + list(fetched), variables, start_date, end_date)
+
+    def read(self, lat: float, lon: float, variables: list, start_date: str, end_date: str) -> pd.DataFrame:
+        key_dir = self._key_dir(lat, lon, variables)
+        start, end = self._day_bounds(start_date, end_date)
+
+        frames = []
+        for month in pd.period_range(start, end, freq="M"):
+            path = os.path.join(key_dir, f"{month}.parquet")
+            if os.path.exists(path):
+                frames.append(pd.read_parquet(path))
+
+        if not frames:
+            return pd.DataFrame(columns=["time"] + list(variables))
+        return self.stitch(frames, variables, start_date, end_date)
+
+    def write(self, lat: float, lon: float, variables: list, df: pd.DataFrame, requested: tuple = None):
+        key_dir = self._key_dir(lat, lon, variables)
+        os.makedirs(key_dir, exist_ok=True)
+
+        df = df[["time"] + list(variables)]
+        months = df.groupby(df["time"].dt.to_period("M")) if not df.empty else []
+        for month, part in months:
+            path = os.path.join(key_dir, f"{month}.parquet")
+            if os.path.exists(path):
+                part = pd.concat([pd.read_parquet(path), part], ignore_index=True)
+            part = part.drop_duplicates("time", keep="last").sort_values("time")
+
+            # Write to a temp file and swap it in so readers never see a partial file
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            part.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+
+        # Days we asked for but didn't get back count as pending too
+        days = set(df["time"].dt.strftime("%Y-%m-%d").unique()) if not df.empty else set()
+        if requested:
+            days.update(d.strftime("%Y-%m-%d") for d in pd.date_range(*self._day_bounds(*requested), freq="D"))
+        self._record_pending(key_dir, df, variables, days)
+
+    def _write_ranges(self, lat: float, lon: float, variables: list, ranges: list, frames: list):
+        for (start, end), frame in zip(ranges, frames):
+            self.write(lat, lon, variables, frame, requested=(start, end))
+
+    def missing_ranges(self, lat: float, lon: float, variables: list, start_date: str, end_date: str,
+                       cached: pd.DataFrame = None) -> list:
+        if cached is None:
+            cached = self.read(lat, lon, variables, start_date, end_date)
+        start, end = self._day_bounds(start_date, end_date)
+
+        complete_days = set(self._complete_days(cached, variables))
+        pending = self._load_manifest(self._key_dir(lat, lon, variables))
+        now = datetime.now()
+
+        missing_days = []
+        for day in pd.date_range(start, end, freq="D"):
+            day_key = day.strftime("%Y-%m-%d")
+            if day_key in complete_days:
+                continue
+            fetched_at = pending.get(day_key)
+            if fetched_at and now - datetime.fromisoformat(fetched_at) < self.refresh_after:
+                continue
+            missing_days.append(day)
+
+        # Collapse consecutive days into (start, end) ranges so each gap is one request
+        ranges = []
+        for day in missing_days:
+            if ranges and day - ranges[-1][1] == timedelta(days=1):
+                ranges[-1][1] = day
+            else:
+                ranges.append([day, day])
+        return [(s.strftime("%Y-%m-%d"), e.strftime("%Y-%m-%d")) for s, e in ranges]
+
+    def stitch(self, frames: list, variables: list, start_date: str, end_date: str) -> pd.DataFrame:
+        frames = [f for f in frames if not f.empty]
+        if not frames:
+            # Same shape as read() so callers can still select the variables
+            return pd.DataFrame(columns=["time"] + list(variables))
+        df = pd.concat(frames, ignore_index=True)
+        df = df.drop_duplicates("time", keep="last").sort_values("time")
+
+        start, end = self._day_bounds(start_date, end_date)
+        mask = (df["time"] >= start) & (df["time"] < end + timedelta(days=1))
+        return df[mask].reset_index(drop=True)
+
+    def _key_dir(self, lat: float, lon: float, variables: list) -> str:
+        lat, lon = self.round_coordinates(lat, lon)
+        variable_key = hashlib.sha1(",".join(sorted(variables)).encode()).hexdigest()[:12]
+        return os.path.join(self.cache_dir, f"{lat:.{self.precision}f}_{lon:.{self.precision}f}", variable_key)
+
+    def _complete_days(self, df: pd.DataFrame, variables: list):
+        if df.empty:
+            return []
+        # A day is complete once it has all 24 hours with no missing values
+        valid = df[list(variables)].notna().all(axis=1)
+        counts = valid.groupby(df["time"].dt.strftime("%Y-%m-%d")).sum()
+        return counts.index[counts >= 24]
+
+    def _record_pending(self, key_dir: str, df: pd.DataFrame, variables: list, days: set):
+        pending = self._load_manifest(key_dir)
+        complete_days = set(self._complete_days(df, variables))
+        fetched_at = datetime.now().isoformat()
+
+        for day in days:
+            if day in complete_days:
+                pending.pop(day, None)
+            else:
+                pending[day] = fetched_at
+
+        manifest_path = os.path.join(key_dir, "_pending.json")
+        tmp_path = f"{manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(pending, f)
+        os.replace(tmp_path, manifest_path)
+
+    def _load_manifest(self, key_dir: str) -> dict:
+        try:
+            with open(os.path.join(key_dir, "_pending.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _day_bounds(self, start_date: str, end_date: str):
+        return pd.Timestamp(start_date).normalize(), pd.Timestamp(end_date).normalize()
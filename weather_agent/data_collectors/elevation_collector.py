@@ -1,35 +1,125 @@
-import requests
+import asyncio
 import numpy as np
 
+from ..http_client import get_async_client, get_session
+from ..terrain_cache import SRTMTileCache, get_tile_cache
+
 class ElevationAPI:
-    def __init__(self):
-        # SRTM data API endpoint (30-meter resolution)
+    # opentopodata accepts at most 100 locations per request
+    MAX_POINTS_PER_REQUEST = 100
+
+    def __init__(self, tiles: SRTMTileCache = None):
+        # SRTM data API endpoint (30-meter resolution), only used when the
+        # local tile cache can't get a tile
         self.api_url = "https://api.opentopodata.org/v1/srtm30m"
+        self.tiles = tiles or get_tile_cache()
         
     def get_detailed_elevation(self, location):
-        # Get elevation data for 1km² area around point
+        # Get elevation data for 1km² area around point (~100m spacing),
+        # sliced from the local SRTM tiles
+        lat, lon = location['lat'], location['lon']
+        try:
+            return self.tiles.window(lat, lon, half_size=0.005, resolution=0.001).astype(float)
+        except Exception as e:
+            print(f"SRTM tile cache unavailable, using {self.api_url}: {e}")
+        return self._fetch_remote(lat, lon)
+
+    async def aget_detailed_elevation(self, location):
         lat, lon = location['lat'], location['lon']
-        points = self._generate_grid(lat, lon, resolution=0.001)  # ~100m spacing
+        try:
+            # A cold tile means a download, keep it off the event loop
+            window = await asyncio.to_thread(self.tiles.window, lat, lon, 0.005, 0.001)
+            return window.astype(float)
+        except Exception as e:
+            print(f"SRTM tile cache unavailable, using {self.api_url}: {e}")
+        return await self._afetch_remote(lat, lon)
+
+    def _fetch_remote(self, lat, lon):
+        points = self._generate_grid(lat, lon, resolution=0.001)
         
-        response = requests.post(self.api_url, json={
-            "locations": points
-        })
+        results = []
+        for chunk in self._chunks(points):
+            response = get_session().post(self.api_url, json={"locations": "|".join(chunk)})
+            results.extend(response.json()["results"])
         
-        return self._process_elevation_data(response.json())
+        return self._process_elevation_data(results)
+
+    async def _afetch_remote(self, lat, lon):
+        points = self._generate_grid(lat, lon, resolution=0.001)
+
+        client = get_async_client()
+        responses = await asyncio.gather(*(
+            client.post_json(self.api_url, {"locations": "|".join(chunk)}) for chunk in self._chunks(points)
+        ))
+        return self._process_elevation_data([r for response in responses for r in response["results"]])
+
+    def _generate_grid(self, lat, lon, resolution, half_size=0.005):
+        # Row-major grid of "lat,lon" points, north to south
+        steps = int(round(2 * half_size / resolution)) + 1
+        lats = lat + half_size - np.arange(steps) * resolution
+        lons = lon - half_size + np.arange(steps) * resolution
+        return [f"{a:.6f},{b:.6f}" for a in lats for b in lons]
+
+    def _chunks(self, points):
+        return [points[i:i + self.MAX_POINTS_PER_REQUEST]
+                for i in range(0, len(points), self.MAX_POINTS_PER_REQUEST)]
+
+    def _process_elevation_data(self, results):
+        elevations = np.array([r.get("elevation") for r in results], dtype=float)
+        size = int(round(np.sqrt(len(elevations))))
+        return elevations.reshape(size, size)
 
 
-import elevation
-import rasterio
-import numpy as np
 
 class ElevationData:
-    def __init__(self):
-        self.data_dir = 'c:/Users/drips/agent-2/weather_agent/data/elevation'
+    def __init__(self, tiles: SRTMTileCache = None):
+        # SRTM 30m tiles, downloaded once into the local tile cache
+        self.tiles = tiles or get_tile_cache()
         
     def get_elevation(self, lat, lon):
-        # Download SRTM 30m data (free)
-        elevation.clip(bounds=(lon-0.1, lat-0.1, lon+0.1, lat+0.1),
-                      output=f'{self.data_dir}/temp.tif')
-        
-        with rasterio.open(f'{self.data_dir}/temp.tif') as dataset:
-            return dataset.read(1)  # Returns elevation array
\ No newline at end of file
+        # Native-resolution window of +-0.1 degrees around the point
+        return self.tiles.window(lat, lon, half_size=0.1)  # Returns elevation array
+
+
+class OpenTopographyService:
+    # Local terrain shape (slope, aspect, relief) around a point, computed from
+    # the SRTM tile cache at native 1 arc-second (~30m) resolution
+    METERS_PER_DEGREE = 111320.0
+
+    def __init__(self, tiles: SRTMTileCache = None, half_size: float = 0.005):
+        self.tiles = tiles or get_tile_cache()
+        self.half_size = half_size
+
+    def get_local_features(self, location):
+        lat, lon = location['lat'], location['lon']
+        window = self.tiles.window(lat, lon, half_size=self.half_size).astype(float)
+        return self._terrain_features(window, lat)
+
+    async def aget_local_features(self, location):
+        return await asyncio.to_thread(self.get_local_features, location)
+
+    def _terrain_features(self, window, lat):
+        # Rows run north to south; spacing in metres between samples
+        spacing = self.METERS_PER_DEGREE / 3600
+        dz_drow, dz_dcol = np.gradient(window, spacing, spacing * np.cos(np.radians(lat)))
+        dz_dnorth, dz_deast = -dz_drow, dz_dcol
+        slope = np.degrees(np.arctan(np.hypot(dz_deast, dz_dnorth)))
+        # Aspect: compass direction the slope faces (downhill), 0 = north
+        aspect = np.degrees(np.arctan2(-dz_deast, -dz_dnorth)) % 360
+
+        center = tuple(s // 2 for s in window.shape)
+        # Slope-weighted circular mean of the downhill directions
+        weights = np.nan_to_num(slope)
+        radians = np.radians(np.nan_to_num(aspect))
+        dominant = np.degrees(np.arctan2((weights * np.sin(radians)).sum(), (weights * np.cos(radians)).sum())) % 360
+
+        return {
+            "elevation_m": float(window[center]),
+            "mean_slope_deg": float(np.nanmean(slope)),
+            "max_slope_deg": float(np.nanmax(slope)),
+            "slope_deg": float(slope[center]),
+            "aspect_deg": float(aspect[center]),
+            "dominant_aspect_deg": float(dominant),
+            "relief_m": float(np.nanmax(window) - np.nanmin(window)),
+            "roughness_m": float(np.nanstd(window))
+        }
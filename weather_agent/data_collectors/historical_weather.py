@@ -1,21 +1,56 @@
 from datetime import datetime, timedelta
 
+from ..http_client import get_async_client, get_session
+from ..hourly_series import HourlySeries
+from ..open_meteo_batch import GRID_DEGREES, afetch_cells, fetch_cells, grid_cells, location_key, stack, unique_locations
+
 class OpenMeteoHistorical:
     def __init__(self):
         self.base_url = "https://archive-api.open-meteo.com/v1/archive"
         
     def get_hourly_history(self, location):
-        # Get 5 years of hourly data
+        return self._fetch_and_process_data(self._params(location))
+
+    async def aget_hourly_history(self, location):
+        content = await get_async_client().get_content(self.base_url, params=self._params(location))
+        return self._process_data(content)
+
+    def get_hourly_histories(self, locations: list, grid_degrees: float = GRID_DEGREES):
+        # Every location's history in one stacked frame ("location", "time", ...);
+        # locations on the same grid point are fetched once, and many grid
+        # points go in each request
+        locations = unique_locations(locations)
+        cells, index = grid_cells(locations, grid_degrees)
+        series = fetch_cells(self.base_url, self._params(None), cells)
+        return stack([location_key(location) for location in locations], [series[i] for i in index])
+
+    async def aget_hourly_histories(self, locations: list, grid_degrees: float = GRID_DEGREES):
+        locations = unique_locations(locations)
+        cells, index = grid_cells(locations, grid_degrees)
+        series = await afetch_cells(self.base_url, self._params(None), cells)
+        return stack([location_key(location) for location in locations], [series[i] for i in index])
+
+    def _params(self, location):
+        # Get 5 years of hourly data (coordinates are filled in per batch when
+        # location is None)
         end_date = datetime.now()
         start_date = end_date - timedelta(days=5*365)
         
-        params = {
-            "latitude": location['lat'],
-            "longitude": location['lon'],
+        return {
+            "latitude": location['lat'] if location else None,
+            "longitude": location['lon'] if location else None,
             "start_date": start_date.strftime("%Y-%m-%d"),
             "end_date": end_date.strftime("%Y-%m-%d"),
-            "hourly": ["temperature_2m", "precipitation", "cloudcover",
-                      "windspeed_10m", "winddirection_10m"]
+            "hourly": ",".join(["temperature_2m", "precipitation", "cloudcover",
+                                "windspeed_10m", "winddirection_10m"])
         }
-        
-        return self._fetch_and_process_data(params)
\ No newline at end of file
+
+    def _fetch_and_process_data(self, params):
+        response = get_session().get(self.base_url, params=params)
+        if response.status_code != 200:
+            raise Exception("Failed to fetch data from OpenMeteo")
+        return self._process_data(response.content)
+
+    def _process_data(self, content):
+        # Raw response -> float32 columns, wrapped (not copied) by the frame
+        return HourlySeries.from_json(content).to_frame()
@@ -1,15 +1,127 @@
+import asyncio
+
+from .elevation_collector import ElevationAPI, OpenTopographyService
+from .historical_weather import OpenMeteoHistorical
+from .terrain_analyzer import OpenStreetMapData
+from ..instrumentation import span
+from ..open_meteo_batch import location_key
+
 class MicroRegionCollector:
-    def __init__(self):
+    # Seconds each source gets before it's reported as timed out; the others'
+    # results are still returned
+    SOURCE_TIMEOUTS = {
+        "elevation_profile": 10.0,
+        "terrain_features": 10.0,
+        "historical_patterns": 60.0,
+        "urban_features": 5.0
+    }
+    # Locations rounded to this many decimals share one history request (~1km)
+    WEATHER_CELL_DECIMALS = 2
+
+    def __init__(self, timeouts: dict = None):
         # Replace local sensors with available data sources
         self.elevation_data = ElevationAPI()  # Using SRTM data
         self.terrain_data = OpenTopographyService()
         self.historical_weather = OpenMeteoHistorical()
         self.land_use = OpenStreetMapData()
-        
+        self.timeouts = dict(self.SOURCE_TIMEOUTS, **(timeouts or {}))
+
     def collect_micro_data(self, location: dict) -> dict:
-        return {
-            "elevation_profile": self.elevation_data.get_detailed_elevation(location),
-            "terrain_features": self.terrain_data.get_local_features(location),
-            "historical_patterns": self.historical_weather.get_hourly_history(location),
-            "urban_features": self.land_use.get_area_details(location)
-        }
\ No newline at end of file
+        return asyncio.run(self.acollect_micro_data(location))
+
+    def collect_batch(self, locations: list) -> list:
+        return asyncio.run(self.acollect_batch(locations))
+
+    async def acollect_micro_data(self, location: dict) -> dict:
+        return (await self.acollect_batch([location]))[0]
+
+    async def acollect_city(self, city: str) -> list:
+        # Every mapped area and sub-region of the city in one batch
+        regions = [r for r in self.land_use.mapper.regions if r["city"] == city.lower()]
+        if not regions:
+            raise Exception(f"Unknown city {city}")
+        return await self.acollect_batch(regions)
+
+    async def acollect_batch(self, locations: list) -> list:
+        # All four sources run at once, each over the whole batch, so the batch
+        # takes as long as the slowest source rather than the sum. Locations
+        # that need the same data share one request. A source that fails or
+        # times out leaves its field None and is listed in "errors".
+        # Points in the same SRTM tile also share its single download and mmap,
+        # and the history of every weather cell comes from one bulk request.
+        cells = list(dict.fromkeys(self._weather_cell_key(location) for location in locations))
+        histories = asyncio.ensure_future(self.historical_weather.aget_hourly_histories(
+            [{"lat": lat, "lon": lon} for lat, lon in cells], grid_degrees=None
+        ))
+        sources = {
+            "elevation_profile": (self._window_key, self.elevation_data.aget_detailed_elevation),
+            "terrain_features": (self._window_key, self.terrain_data.aget_local_features),
+            "historical_patterns": (self._weather_cell_key, lambda location: self._ahistory(histories, location)),
+            "urban_features": (self._window_key, self._aurban_features)
+        }
+        try:
+            outcomes = await asyncio.gather(*(
+                self._collect_source(name, locations, key, fetch) for name, (key, fetch) in sources.items()
+            ))
+        finally:
+            histories.cancel()
+
+        results = []
+        for i, location in enumerate(locations):
+            result = {"location": location, "errors": {}}
+            for name, values in zip(sources, outcomes):
+                value = values[i]
+                if isinstance(value, BaseException):
+                    result[name] = None
+                    result["errors"][name] = self._describe(value, name)
+                else:
+                    result[name] = value
+            results.append(result)
+        return results
+
+    async def _collect_source(self, name: str, locations: list, key, fetch) -> list:
+        # One fetch per distinct key; whatever hasn't finished by the source's
+        # deadline is cancelled and reported as a timeout for its locations
+        keys = [key(location) for location in locations]
+        tasks = {}
+        for k, location in zip(keys, locations):
+            if k not in tasks:
+                tasks[k] = asyncio.ensure_future(fetch(location))
+        if tasks:
+            with span(f"collect.{name}"):
+                _, pending = await asyncio.wait(tasks.values(), timeout=self.timeouts[name])
+            for task in pending:
+                task.cancel()
+
+        values = {}
+        for k, task in tasks.items():
+            if not task.done() or task.cancelled():
+                values[k] = asyncio.TimeoutError()
+            else:
+                values[k] = task.exception() or task.result()
+        return [values[k] for k in keys]
+
+    async def _ahistory(self, histories: asyncio.Future, location: dict):
+        # The cell's rows of the batch's stacked history, so every location in
+        # it gets the same series; shield() keeps a timeout here from
+        # cancelling the shared request
+        frame = await asyncio.shield(histories)
+        key = location_key(self._weather_cell_key(location))
+        return frame[frame["location"] == key].drop(columns="location").reset_index(drop=True)
+
+    async def _aurban_features(self, location: dict):
+        # First use of a city loads its grid from disk, so keep it off the loop
+        return await asyncio.to_thread(self.land_use.get_area_details, location)
+
+    def _window_key(self, location: dict):
+        # Same point -> same elevation window, terrain window and urban cell
+        return round(float(location["lat"]), 4), round(float(location["lon"]), 4), location.get("city")
+
+    def _weather_cell_key(self, location: dict):
+        return (round(float(location["lat"]), self.WEATHER_CELL_DECIMALS),
+                round(float(location["lon"]), self.WEATHER_CELL_DECIMALS))
+
+    def _describe(self, error: BaseException, name: str) -> str:
+        if isinstance(error, asyncio.TimeoutError):
+            return f"timed out after {self.timeouts[name]}s"
+        return str(error) or error.__class__.__name__
@@ -1,21 +1,222 @@
-import osmnx as ox
+import os
+import argparse
+import threading
+
+import numpy as np
+
+from ..paths import DEFAULT_CACHE_DIR
+from ..data.location_mapping import MicroLocationMapper, EARTH_RADIUS_KM
+
+DEFAULT_URBAN_GRID_DIR = os.environ.get("WEATHER_AGENT_URBAN_GRID_DIR", os.path.join(DEFAULT_CACHE_DIR, "urban"))
+
+# OSM tags pulled for the grid, and which values count as water / green
+OSM_TAGS = {
+    'building': True,
+    'natural': True,
+    'water': True,
+    'landuse': ['forest', 'grass', 'meadow', 'recreation_ground', 'village_green', 'reservoir', 'basin'],
+    'leisure': ['park', 'garden', 'nature_reserve', 'golf_course', 'pitch']
+}
+WATER_NATURAL = ['water', 'wetland', 'bay', 'strait']
+WATER_LANDUSE = ['reservoir', 'basin']
+GREEN_NATURAL = ['wood', 'scrub', 'grassland', 'heath', 'tree_row', 'mangrove']
+GREEN_LANDUSE = ['forest', 'grass', 'meadow', 'recreation_ground', 'village_green']
+GREEN_LEISURE = ['park', 'garden', 'nature_reserve', 'golf_course', 'pitch']
+
+
+class UrbanFeatureGrid:
+    # Per-city raster of urban feature fractions, one uint8 layer each
+    # (0 = none of the cell, 255 = all of it), rows north to south. A summed-area
+    # table built on load makes the mean over any window four lookups.
+    LAYERS = ('building_coverage', 'water_fraction', 'green_fraction')
+
+    def __init__(self, city: str, layers: np.ndarray, bounds: tuple, resolution: float):
+        self.city = city
+        self.layers = layers
+        self.bounds = tuple(float(b) for b in bounds)  # south, west, north, east
+        self.resolution = float(resolution)
+        integral = np.zeros((layers.shape[0], layers.shape[1] + 1, layers.shape[2] + 1), dtype=np.int64)
+        np.cumsum(np.cumsum(layers, axis=1, dtype=np.int64), axis=2, out=integral[:, 1:, 1:])
+        self._integral = integral
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path) as data:
+            return cls(str(data["city"]), data["layers"], tuple(data["bounds"]), float(data["resolution"]))
+
+    def save(self, path: str):
+        # Written next to the target and renamed, so readers never see a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(f, city=self.city, layers=self.layers,
+                                bounds=np.array(self.bounds), resolution=self.resolution)
+        os.replace(tmp_path, path)
+
+    def contains(self, lat: float, lon: float) -> bool:
+        south, west, north, east = self.bounds
+        return south <= lat < north and west <= lon < east
+
+    def index(self, lat: float, lon: float):
+        south, west, north, east = self.bounds
+        row = min(int((north - lat) / self.resolution), self.layers.shape[1] - 1)
+        col = min(int((lon - west) / self.resolution), self.layers.shape[2] - 1)
+        return max(row, 0), max(col, 0)
+
+    def cell(self, lat: float, lon: float) -> dict:
+        row, col = self.index(lat, lon)
+        return {name: float(self.layers[i, row, col]) / 255 for i, name in enumerate(self.LAYERS)}
+
+    def area_mean(self, lat: float, lon: float, radius_m: float = 500) -> dict:
+        # Mean fractions over the square of +-radius_m around the point
+        row, col = self.index(lat, lon)
+        half_rows = int(round(np.degrees(radius_m / 1000 / EARTH_RADIUS_KM) / self.resolution))
+        half_cols = int(round(half_rows / max(np.cos(np.radians(lat)), 1e-6)))
+        top, bottom = max(row - half_rows, 0), min(row + half_rows + 1, self.layers.shape[1])
+        left, right = max(col - half_cols, 0), min(col + half_cols + 1, self.layers.shape[2])
+
+        sums = (self._integral[:, bottom, right] - self._integral[:, top, right]
+                - self._integral[:, bottom, left] + self._integral[:, top, left])
+        cells = (bottom - top) * (right - left)
+        return {name: float(sums[i]) / cells / 255 for i, name in enumerate(self.LAYERS)}
+
 
 class OpenStreetMapData:
-    def __init__(self):
-        # Configure OSM with free tier settings
-        ox.config(use_cache=True, 
-                 log_console=True,
-                 useful_tags_way=['building', 'natural', 'water'],
-                 cache_folder='c:/Users/drips/agent-2/weather_agent/data/osm_cache')
-    
+    # Urban features from precomputed per-city grids (<grid_dir>/<city>.npz).
+    # The OSM download and footprint geometry work happen once per city in
+    # build_city_grid(); get_area_details() is only an array lookup.
+    def __init__(self, grid_dir: str = None, mapper: MicroLocationMapper = None):
+        self.grid_dir = grid_dir or DEFAULT_URBAN_GRID_DIR
+        self.mapper = mapper or MicroLocationMapper()
+        self._grids = {}
+        self._lock = threading.Lock()
+
     def get_area_details(self, location):
-        # Get 1km² area features
-        area = ox.geometries_from_point(
-            (location['lat'], location['lon']),
-            dist=500,  # 500m radius
-            tags={'building': True, 
-                  'natural': True,
-                  'water': True}
-        )
-        
-        return self._analyze_urban_features(area)
\ No newline at end of file
+        # Get 1km² area features (500m each way), plus the cell the point is in
+        lat, lon = float(location['lat']), float(location['lon'])
+        grid = self._grid_for(lat, lon, location.get('city'))
+        if grid is None:
+            raise Exception(f"No urban feature grid covers {lat}, {lon}; build one with "
+                            f"python -m weather_agent.data_collectors.terrain_analyzer <city>")
+
+        details = grid.area_mean(lat, lon, radius_m=500)
+        details["cell"] = grid.cell(lat, lon)
+        details["city"] = grid.city
+        details["grid_resolution_deg"] = grid.resolution
+        return details
+
+    def build_city_grid(self, city: str, extract_path: str = None, resolution: float = 0.001,
+                        margin: float = 0.05, supersample: int = 4) -> str:
+        # Pull building/natural/water features for the whole city once, from a
+        # local .osm extract when given (else the Overpass API), and rasterize
+        # them into coverage fractions. Returns the path of the saved grid.
+        import osmnx as ox
+
+        ox.settings.use_cache = True
+        ox.settings.log_console = True
+        ox.settings.cache_folder = os.path.join(DEFAULT_CACHE_DIR, "osm")
+
+        bounds = self._city_bounds(city, margin)
+        south, west, north, east = bounds
+        if extract_path:
+            features = ox.features_from_xml(extract_path, tags=OSM_TAGS)
+            features = features.cx[west:east, south:north]
+        else:
+            features = ox.features_from_bbox((west, south, east, north), tags=OSM_TAGS)
+        features = features[features.geometry.geom_type.isin(["Polygon", "MultiPolygon"])]
+
+        def present(name):
+            return features[name].notna().to_numpy() if name in features.columns else np.zeros(len(features), dtype=bool)
+
+        def values(name):
+            return features[name].to_numpy(dtype=object) if name in features.columns else np.full(len(features), None)
+
+        is_building = present('building')
+        is_water = present('water') | np.isin(values('natural'), WATER_NATURAL) | np.isin(values('landuse'), WATER_LANDUSE)
+        is_green = (np.isin(values('natural'), GREEN_NATURAL) | np.isin(values('landuse'), GREEN_LANDUSE)
+                    | np.isin(values('leisure'), GREEN_LEISURE))
+
+        geometries = features.geometry.to_numpy()
+        layers = np.stack([
+            self._rasterize(geometries[mask], bounds, resolution, supersample)
+            for mask in (is_building, is_water, is_green)
+        ])
+
+        os.makedirs(self.grid_dir, exist_ok=True)
+        path = self._grid_path(city)
+        UrbanFeatureGrid(city, layers, bounds, resolution).save(path)
+        with self._lock:
+            self._grids.pop(city, None)
+        return path
+
+    def _rasterize(self, geometries, bounds, resolution, supersample):
+        # Fraction of each cell covered, from supersample x supersample test
+        # points per cell checked against an R-tree of the footprints
+        import shapely
+
+        south, west, north, east = bounds
+        rows = int(round((north - south) / resolution))
+        cols = int(round((east - west) / resolution))
+        step = resolution / supersample
+        lats = north - (np.arange(rows * supersample) + 0.5) * step
+        lons = west + (np.arange(cols * supersample) + 0.5) * step
+
+        covered = np.zeros(len(lats) * len(lons), dtype=bool)
+        if len(geometries):
+            tree = shapely.STRtree(geometries)
+            # A band of point rows at a time keeps memory flat on big cities
+            band = max(1, 200000 // len(lons))
+            for first in range(0, len(lats), band):
+                block = lats[first:first + band]
+                points = shapely.points(np.tile(lons, len(block)), np.repeat(block, len(lons)))
+                inside, _ = tree.query(points, predicate="within")
+                covered[first * len(lons) + inside] = True
+
+        fraction = covered.reshape(rows, supersample, cols, supersample).mean(axis=(1, 3))
+        return np.rint(fraction * 255).astype(np.uint8)
+
+    def _grid_for(self, lat: float, lon: float, city: str = None):
+        cities = [city.lower()] if city else self._available_cities()
+        for name in cities:
+            grid = self._load(name)
+            if grid is not None and grid.contains(lat, lon):
+                return grid
+        return None
+
+    def _load(self, city: str):
+        with self._lock:
+            if city not in self._grids:
+                path = self._grid_path(city)
+                self._grids[city] = UrbanFeatureGrid.load(path) if os.path.exists(path) else None
+            return self._grids[city]
+
+    def _available_cities(self) -> list:
+        if not os.path.isdir(self.grid_dir):
+            return []
+        return sorted(name[:-4] for name in os.listdir(self.grid_dir) if name.endswith(".npz"))
+
+    def _city_bounds(self, city: str, margin: float):
+        regions = [r for r in self.mapper.regions if r["city"] == city.lower()]
+        if not regions:
+            raise Exception(f"Unknown city {city}")
+        lats = [r["lat"] for r in regions]
+        lons = [r["lon"] for r in regions]
+        return min(lats) - margin, min(lons) - margin, max(lats) + margin, max(lons) + margin
+
+    def _grid_path(self, city: str) -> str:
+        return os.path.join(self.grid_dir, f"{city.lower()}.npz")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute a city's urban feature grid from OpenStreetMap")
+    parser.add_argument("city")
+    parser.add_argument("--extract", help="local .osm extract; without it features come from the Overpass API")
+    parser.add_argument("--resolution", type=float, default=0.001, help="cell size in degrees (~100 m)")
+    parser.add_argument("--margin", type=float, default=0.05, help="degrees added around the city's mapped areas")
+    args = parser.parse_args(argv)
+
+    path = OpenStreetMapData().build_city_grid(args.city, args.extract, args.resolution, args.margin)
+    print(f"Wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,67 @@
-import requests
+import asyncio
 from datetime import datetime, timedelta
 import json
 import os
 
+from ..http_client import get_async_client, get_session
+from ..hourly_series import HourlySeries
+from ..open_meteo_batch import (GRID_DEGREES, afetch_cells, batch_params, coordinate_batches, coordinates,
+                                fetch_cells, grid_cells, location_key, stack, unique_locations)
+
 class HistoricalWeather:
     def __init__(self):
         self.api_url = "https://archive-api.open-meteo.com/v1/archive"
+        self.elevation_api = "https://api.open-meteo.com/v1/elevation"
         self.elevation_cache_file = "c:/Users/drips/agent-2/weather_agent/data/elevation_cache.json"
         
     def get_historical_data(self, lat, lon):
-        params = {
+        response = get_session().get(self.api_url, params=self._params(lat, lon))
+        weather_data = HourlySeries.from_json(response.content)
+        elevation_data = self._get_elevation(lat, lon)
+        
+        return self._package(lat, lon, weather_data, elevation_data)
+
+    async def aget_historical_data(self, lat, lon):
+        # Weather and elevation are independent, so fetch them concurrently
+        content, elevation_data = await asyncio.gather(
+            get_async_client().get_content(self.api_url, params=self._params(lat, lon)),
+            self._aget_elevation(lat, lon)
+        )
+        weather_data = HourlySeries.from_json(content)
+        
+        return self._package(lat, lon, weather_data, elevation_data)
+
+    def get_historical_data_batch(self, locations: list, grid_degrees: float = GRID_DEGREES):
+        # Weather for many locations as one stacked frame ("location", "time", ...)
+        # plus each location's elevation, both many coordinates per request;
+        # locations on the same grid point share one weather series
+        locations = unique_locations(locations)
+        cells, index = grid_cells(locations, grid_degrees)
+        series = fetch_cells(self.api_url, self._params(None, None), cells)
+        elevations = self._get_elevations([coordinates(location) for location in locations])
+        return self._package_batch(locations, [series[i] for i in index], elevations)
+
+    async def aget_historical_data_batch(self, locations: list, grid_degrees: float = GRID_DEGREES):
+        locations = unique_locations(locations)
+        cells, index = grid_cells(locations, grid_degrees)
+        series, elevations = await asyncio.gather(
+            afetch_cells(self.api_url, self._params(None, None), cells),
+            self._aget_elevations([coordinates(location) for location in locations])
+        )
+        return self._package_batch(locations, [series[i] for i in index], elevations)
+
+    def _params(self, lat, lon):
+        return {
             "latitude": lat,
             "longitude": lon,
             "start_date": (datetime.now() - timedelta(days=365)).strftime("%Y-%m-%d"),
             "end_date": datetime.now().strftime("%Y-%m-%d"),
-            "hourly": ["temperature_2m", "precipitation", "windspeed_10m", 
-                      "winddirection_10m", "cloudcover", "pressure_msl"],
+            "hourly": ",".join(["temperature_2m", "precipitation", "windspeed_10m",
+                                "winddirection_10m", "cloudcover", "pressure_msl"]),
             "timezone": "auto"
         }
-        
-        weather_data = requests.get(self.api_url, params=params).json()
-        elevation_data = self._get_elevation(lat, lon)
-        
+
+    def _package(self, lat, lon, weather_data, elevation_data):
         return {
             "weather": weather_data,
             "elevation": elevation_data,
@@ -31,18 +71,72 @@ class HistoricalWeather:
             }
         }
     
+    def _package_batch(self, locations, series, elevations):
+        keys = [location_key(location) for location in locations]
+        return {
+            "weather": stack(keys, series),
+            "elevation": dict(zip(keys, elevations)),
+            "metadata": {
+                "locations": {key: dict(zip(("lat", "lon"), coordinates(location)))
+                              for key, location in zip(keys, locations)},
+                "timestamp": datetime.now().isoformat()
+            }
+        }
+
+    def _get_elevations(self, points):
+        # One elevation per (lat, lon), up to 100 points per request; None
+        # for the points of a batch that failed
+        elevations = []
+        for batch in coordinate_batches(self.elevation_api, {}, points):
+            try:
+                response = get_session().get(self.elevation_api, params=batch_params({}, points, batch))
+                elevations.extend(self._batch_elevations(response.json(), len(batch)))
+            except Exception as e:
+                print(f"Error fetching elevation data: {e}")
+                elevations.extend([None] * len(batch))
+        return elevations
+
+    async def _aget_elevations(self, points):
+        async def fetch(batch):
+            try:
+                data = await get_async_client().get_json(self.elevation_api, params=batch_params({}, points, batch))
+                return self._batch_elevations(data, len(batch))
+            except Exception as e:
+                print(f"Error fetching elevation data: {e}")
+                return [None] * len(batch)
+        batches = await asyncio.gather(*(fetch(batch) for batch in coordinate_batches(self.elevation_api, {}, points)))
+        return [elevation for batch in batches for elevation in batch]
+
+    def _batch_elevations(self, data, expected):
+        elevations = data.get('elevation') or []
+        if len(elevations) != expected:
+            raise Exception(f"Expected {expected} elevations, got {len(elevations)}")
+        return elevations
+
     def _get_elevation(self, lat, lon):
         # Using Open-Meteo's geocoding API which includes elevation data
-        elevation_api = f"https://api.open-meteo.com/v1/elevation"
         params = {
             "latitude": lat,
             "longitude": lon
         }
         
         try:
-            response = requests.get(elevation_api, params=params)
+            response = get_session().get(self.elevation_api, params=params)
             data = response.json()
             return data.get('elevation', None)
         except Exception as e:
             print(f"Error fetching elevation data: {e}")
-            return None
\ No newline at end of file
+            return None
+
+    async def _aget_elevation(self, lat, lon):
+        params = {
+            "latitude": lat,
+            "longitude": lon
+        }
+        
+        try:
+            data = await get_async_client().get_json(self.elevation_api, params=params)
+            return data.get('elevation', None)
+        except Exception as e:
+            print(f"Error fetching elevation data: {e}")
+            return None
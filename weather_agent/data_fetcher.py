@@ -1,38 +1,210 @@
-import requests
+import asyncio
+
 import pandas as pd
 from datetime import datetime, timedelta
 
+from .data_cache import HistoryCache
+from .hourly_series import HourlySeries
+from .http_client import get_async_client, get_session
+from .instrumentation import timed
+from .open_meteo_batch import (GRID_DEGREES, afetch_cells, coordinates, fetch_cells, grid_cells,
+                               location_key, stack, unique_locations)
+
 class OpenMeteoFetcher:
-    def __init__(self):
+    # Open-Meteo hourly variable -> our column name
+    HOURLY_VARIABLES = {
+        "temperature_2m": "temperature",
+        "precipitation": "precipitation",
+        "relative_humidity_2m": "humidity",
+        "wind_speed_10m": "wind_speed",
+        "surface_pressure": "pressure",
+        "wind_direction_10m": "wind_direction"
+    }
+
+    def __init__(self, cache: HistoryCache = None, use_cache: bool = True):
         self.base_url = "https://archive-api.open-meteo.com/v1/archive"
+        self.cache = cache if cache is not None else (HistoryCache() if use_cache else None)
     
     def fetch_historical_data(self, latitude: float, longitude: float, start_date: str, end_date: str):
-        params = {
+        return self.fetch_historical_series(latitude, longitude, start_date, end_date).to_frame("timestamp")
+
+    async def afetch_historical_data(self, latitude: float, longitude: float, start_date: str, end_date: str):
+        series = await self.afetch_historical_series(latitude, longitude, start_date, end_date)
+        return series.to_frame("timestamp")
+
+    @timed("fetch")
+    def fetch_historical_series(self, latitude: float, longitude: float, start_date: str, end_date: str) -> HourlySeries:
+        # Columnar float32 view of the history, in our column names
+        variables = list(self.HOURLY_VARIABLES)
+
+        if self.cache is None:
+            raw = self._fetch_range(latitude, longitude, start_date, end_date, variables)
+        else:
+            # Only the date ranges missing from the local cache hit the API
+            latitude, longitude = self.cache.round_coordinates(latitude, longitude)
+            raw = self.cache.get(
+                latitude, longitude, variables, start_date, end_date,
+                fetch=lambda start, end: self._fetch_range(latitude, longitude, start, end, variables)
+            )
+        return self._to_series(raw)
+
+    @timed("fetch")
+    async def afetch_historical_series(self, latitude: float, longitude: float, start_date: str, end_date: str) -> HourlySeries:
+        # Non-blocking version for the API; goes through the shared async client
+        variables = list(self.HOURLY_VARIABLES)
+
+        if self.cache is None:
+            raw = await self._afetch_range(latitude, longitude, start_date, end_date, variables)
+        else:
+            latitude, longitude = self.cache.round_coordinates(latitude, longitude)
+            raw = await self.cache.aget(
+                latitude, longitude, variables, start_date, end_date,
+                fetch=lambda start, end: self._afetch_range(latitude, longitude, start, end, variables)
+            )
+        return self._to_series(raw)
+
+    @timed("fetch")
+    def fetch_locations(self, locations: list, start_date: str, end_date: str,
+                        grid_degrees: float = GRID_DEGREES) -> pd.DataFrame:
+        # History for many locations (mapper regions or (lat, lon) pairs) as one
+        # stacked frame: "location", "timestamp" and our columns. Locations on
+        # the same point are fetched once and fanned back out; only points
+        # missing part of the range in the cache are requested, many
+        # coordinates per request. Without a cache, locations are merged onto
+        # the grid_degrees grid; with one, onto the cache's own keys.
+        locations = unique_locations(locations)
+        cells, index, requests = self._plan_locations(locations, start_date, end_date, grid_degrees)
+        fetched = self._fetch_cells(cells, requests)
+        return self._stack_locations(locations, index, fetched, start_date, end_date)
+
+    @timed("fetch")
+    async def afetch_locations(self, locations: list, start_date: str, end_date: str,
+                               grid_degrees: float = GRID_DEGREES) -> pd.DataFrame:
+        # Same as fetch_locations() with the requests run concurrently
+        locations = unique_locations(locations)
+        cells, index, requests = self._plan_locations(locations, start_date, end_date, grid_degrees)
+        fetched = await self._afetch_cells(cells, requests)
+        return self._stack_locations(locations, index, fetched, start_date, end_date)
+
+    @timed("fetch")
+    def prefetch_locations(self, locations: list, start_date: str, end_date: str,
+                           grid_degrees: float = GRID_DEGREES) -> int:
+        # Brings the cache up to date for every location in bulk without
+        # reading anything back, e.g. before training on them month by month.
+        # Returns how many grid points had to be fetched.
+        if self.cache is None:
+            raise Exception("prefetch_locations needs a history cache")
+        locations = unique_locations(locations)
+        cells, index, requests = self._plan_locations(locations, start_date, end_date, grid_degrees)
+        fetched = self._fetch_cells(cells, requests)
+        self._store_locations(locations, index, fetched)
+        return len(fetched)
+
+    def _plan_locations(self, locations: list, start_date: str, end_date: str, grid_degrees: float):
+        # (points, each location's point, {(start, end): [points to fetch]}).
+        # A point is fetched over the span of whatever its locations are
+        # missing in the cache, so points missing the same days share requests.
+        if self.cache is None:
+            cells, index = grid_cells(locations, grid_degrees)
+            return cells, index, {(start_date, end_date): list(range(len(cells)))}
+
+        # Open-Meteo downscales to each requested coordinate, so what goes in a
+        # location's cache must be fetched at that cache key's coordinates, the
+        # same as fetch_historical_series() would; no merging onto the grid
+        rounded = [self.cache.round_coordinates(*coordinates(location)) for location in locations]
+        cells, index = grid_cells(rounded, None)
+        variables = list(self.HOURLY_VARIABLES)
+        spans = {}
+        for (lat, lon), cell in zip(rounded, index):
+            for start, end in self.cache.missing_ranges(lat, lon, variables, start_date, end_date):
+                first, last = spans.get(int(cell), (start, end))
+                spans[int(cell)] = (min(first, start), max(last, end))
+        requests = {}
+        for cell, span in spans.items():
+            requests.setdefault(span, []).append(cell)
+        return cells, index, requests
+
+    def _fetch_cells(self, cells: list, requests: dict) -> dict:
+        # {point: (HourlySeries, (start, end))}
+        variables = list(self.HOURLY_VARIABLES)
+        fetched = {}
+        for (start, end), members in requests.items():
+            params = self._params(None, None, start, end, variables)
+            series = fetch_cells(self.base_url, params, [cells[c] for c in members], variables)
+            fetched.update((c, (s, (start, end))) for c, s in zip(members, series))
+        return fetched
+
+    async def _afetch_cells(self, cells: list, requests: dict) -> dict:
+        variables = list(self.HOURLY_VARIABLES)
+        results = await asyncio.gather(*(
+            afetch_cells(self.base_url, self._params(None, None, start, end, variables),
+                         [cells[c] for c in members], variables)
+            for (start, end), members in requests.items()
+        ))
+        fetched = {}
+        for ((start, end), members), series in zip(requests.items(), results):
+            fetched.update((c, (s, (start, end))) for c, s in zip(members, series))
+        return fetched
+
+    def _store_locations(self, locations: list, index, fetched: dict):
+        # Each point's fetch goes into the cache key it was fetched for
+        variables = list(self.HOURLY_VARIABLES)
+        written = set()
+        for location, cell in zip(locations, index):
+            lat, lon = self.cache.round_coordinates(*coordinates(location))
+            if int(cell) in fetched and (lat, lon) not in written:
+                series, requested = fetched[int(cell)]
+                self.cache.write(lat, lon, variables, series.to_frame(), requested=requested)
+                written.add((lat, lon))
+
+    def _stack_locations(self, locations: list, index, fetched: dict, start_date: str, end_date: str) -> pd.DataFrame:
+        if self.cache is None:
+            series = [fetched[int(cell)][0].rename(self.HOURLY_VARIABLES) for cell in index]
+        else:
+            self._store_locations(locations, index, fetched)
+            variables = list(self.HOURLY_VARIABLES)
+            series = [self._to_series(self.cache.read(*self.cache.round_coordinates(*coordinates(location)),
+                                                      variables, start_date, end_date))
+                      for location in locations]
+        return stack([location_key(location) for location in locations], series, "timestamp")
+
+    @timed("fetch.api")
+    def _fetch_range(self, latitude: float, longitude: float, start_date: str, end_date: str, variables: list):
+        params = self._params(latitude, longitude, start_date, end_date, variables)
+        
+        response = get_session().get(self.base_url, params=params)
+        if response.status_code != 200:
+            raise Exception("Failed to fetch data from OpenMeteo")
+            
+        return self._parse(response.content, variables)
+
+    @timed("fetch.api")
+    async def _afetch_range(self, latitude: float, longitude: float, start_date: str, end_date: str, variables: list):
+        params = self._params(latitude, longitude, start_date, end_date, variables)
+        try:
+            content = await get_async_client().get_content(self.base_url, params=params)
+        except Exception as e:
+            raise Exception(f"Failed to fetch data from OpenMeteo: {e}")
+        return self._parse(content, variables)
+
+    def _params(self, latitude: float, longitude: float, start_date: str, end_date: str, variables: list):
+        return {
             "latitude": latitude,
             "longitude": longitude,
             "start_date": start_date,
             "end_date": end_date,
-            "hourly": ["temperature_2m", "precipitation", "relative_humidity_2m",
-                      "wind_speed_10m", "surface_pressure"]
+            "hourly": ",".join(variables)
         }
-        
-        response = requests.get(self.base_url, params=params)
-        if response.status_code != 200:
-            raise Exception("Failed to fetch data from OpenMeteo")
-            
-        data = response.json()
-        
-        # Convert to pandas DataFrame
-        df = pd.DataFrame({
-            "timestamp": pd.to_datetime(data["hourly"]["time"]),
-            "temperature": data["hourly"]["temperature_2m"],
-            "precipitation": data["hourly"]["precipitation"],
-            "humidity": data["hourly"]["relative_humidity_2m"],
-            "wind_speed": data["hourly"]["wind_speed_10m"],
-            "pressure": data["hourly"]["surface_pressure"]
-        })
-        
-        return df
+
+    def _parse(self, content: bytes, variables: list) -> pd.DataFrame:
+        # Response bytes straight to float32 arrays; the frame handed to the
+        # cache wraps those arrays rather than copying them
+        return HourlySeries.from_json(content, variables).to_frame()
+
+    def _to_series(self, raw: pd.DataFrame) -> HourlySeries:
+        # Convert to our column names
+        series = HourlySeries.from_frame(raw[["time"] + list(self.HOURLY_VARIABLES)])
+        return series.rename(self.HOURLY_VARIABLES)
 
 class WeatherDataFetcher:
     def __init__(self):
@@ -2,55 +2,100 @@ import pandas as pd
 import numpy as np
 from datetime import datetime
 
+from ..hourly_series import HourlySeries
+
 class WeatherAnalyzer:
+    # Open-Meteo hourly variable -> short column name used here
+    COLUMN_MAP = {
+        'temperature_2m': 'temp',
+        'precipitation': 'precip',
+        'windspeed_10m': 'wind',
+        'wind_speed_10m': 'wind',
+        'cloudcover': 'cloud'
+    }
+
     def __init__(self):
         self.patterns = {}
-    
+
     def analyze_historical_data(self, data):
-        # Convert hourly data to pandas DataFrame
-        df = pd.DataFrame({
-            'time': pd.to_datetime(data['weather']['hourly']['time']),
-            'temp': data['weather']['hourly']['temperature_2m'],
-            'precip': data['weather']['hourly']['precipitation'],
-            'wind': data['weather']['hourly']['windspeed_10m'],
-            'cloud': data['weather']['hourly']['cloudcover']
-        })
-        
-        # Add time-based features
-        df['hour'] = df['time'].dt.hour
-        df['month'] = df['time'].dt.month
-        
-        # Calculate patterns
-        self.patterns = {
-            'hourly_rain_prob': self._calculate_rain_probability(df),
-            'temp_patterns': self._analyze_temperature(df),
-            'wind_patterns': self._analyze_wind(df),
-            'elevation_impact': self._analyze_elevation_impact(df, data['elevation'])
-        }
-        
+        # data['weather'] is an HourlySeries, or a raw Open-Meteo response (bytes or dict)
+        weather = data['weather']
+        if not isinstance(weather, HourlySeries):
+            weather = HourlySeries.from_json(weather)
+        # The frame wraps the series' float32 arrays, nothing is copied
+        df = weather.to_frame()
+
+        self.patterns = self.analyze_frame(df, elevations={None: data['elevation']})[None]
         return self.patterns
-    
-    def _calculate_rain_probability(self, df):
-        return df.groupby('hour')['precip'].apply(
-            lambda x: (x > 0.1).mean()
-        ).to_dict()
-    
-    def _analyze_temperature(self, df):
-        return {
-            'hourly_avg': df.groupby('hour')['temp'].mean().to_dict(),
-            'monthly_avg': df.groupby('month')['temp'].mean().to_dict()
-        }
-    
-    def _analyze_wind(self, df):
-        return {
-            'hourly_avg': df.groupby('hour')['wind'].mean().to_dict(),
-            'max_wind': df.groupby('hour')['wind'].max().to_dict()
-        }
-    
+
+    def analyze_frame(self, df: pd.DataFrame, elevations: dict = None, location_col: str = 'location') -> dict:
+        # All statistics for many locations in one pass. `df` has time/temp/precip/wind
+        # columns (Open-Meteo names work too) and optionally a location column;
+        # returns {location: patterns}, with location None when there's no column.
+        df = df.rename(columns={k: v for k, v in self.COLUMN_MAP.items() if k in df.columns})
+        if location_col in df.columns:
+            location_codes, locations = pd.factorize(df[location_col])
+        else:
+            location_codes, locations = np.zeros(len(df), dtype=np.int64), [None]
+        n_locations = len(locations)
+
+        times = pd.DatetimeIndex(df['time'])
+        hour_keys = location_codes * 24 + times.hour.to_numpy()
+        month_keys = location_codes * 12 + times.month.to_numpy() - 1
+
+        # float32 columns are used as-is; bincount accumulates in float64 anyway
+        temp = df['temp'].to_numpy()
+        precip = df['precip'].to_numpy()
+        wind = df['wind'].to_numpy()
+
+        n_hour_keys, n_month_keys = n_locations * 24, n_locations * 12
+        hour_rows = np.bincount(hour_keys, minlength=n_hour_keys)
+        month_rows = np.bincount(month_keys, minlength=n_month_keys)
+
+        # Rain probability counts every row (like (x > 0.1).mean()); means skip NaN
+        rain_prob = np.bincount(hour_keys, weights=precip > 0.1, minlength=n_hour_keys) / np.maximum(hour_rows, 1)
+        hourly_temp = self._nan_mean(hour_keys, temp, n_hour_keys)
+        monthly_temp = self._nan_mean(month_keys, temp, n_month_keys)
+        hourly_wind = self._nan_mean(hour_keys, wind, n_hour_keys)
+        max_wind = np.full(n_hour_keys, -np.inf)
+        valid = ~np.isnan(wind)
+        np.maximum.at(max_wind, hour_keys[valid], wind[valid])
+        max_wind[np.isinf(max_wind)] = np.nan
+
+        elevations = elevations or {}
+        results = {}
+        for code, location in enumerate(locations):
+            hours = slice(code * 24, (code + 1) * 24)
+            months = slice(code * 12, (code + 1) * 12)
+            results[location] = {
+                'hourly_rain_prob': self._to_dict(rain_prob[hours], hour_rows[hours]),
+                'temp_patterns': {
+                    'hourly_avg': self._to_dict(hourly_temp[hours], hour_rows[hours]),
+                    'monthly_avg': self._to_dict(monthly_temp[months], month_rows[months], first_key=1)
+                },
+                'wind_patterns': {
+                    'hourly_avg': self._to_dict(hourly_wind[hours], hour_rows[hours]),
+                    'max_wind': self._to_dict(max_wind[hours], hour_rows[hours])
+                },
+                'elevation_impact': self._analyze_elevation_impact(df, elevations.get(location))
+            }
+        return results
+
+    def _nan_mean(self, keys, values, n_keys):
+        valid = ~np.isnan(values)
+        sums = np.bincount(keys[valid], weights=values[valid], minlength=n_keys)
+        counts = np.bincount(keys[valid], minlength=n_keys)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(counts > 0, sums / counts, np.nan)
+
+    def _to_dict(self, values, rows, first_key=0):
+        # Only keys that occur in the data, like groupby().to_dict()
+        return {i + first_key: float(v) for i, (v, n) in enumerate(zip(values, rows)) if n > 0}
+
     def _analyze_elevation_impact(self, df, elevation):
         if elevation is None:
             return {}
-            
+
         # Handle elevation data whether it's a list or single value
         try:
             if isinstance(elevation, list):
@@ -59,10 +104,10 @@ class WeatherAnalyzer:
                 elevation_value = float(elevation)
         except (TypeError, ValueError, IndexError):
             return {}
-            
+
         # Basic elevation impact analysis
         return {
             'elevation_m': elevation_value,
             'temp_correction': -0.0065 * elevation_value,  # Standard lapse rate
             'pressure_factor': np.exp(-elevation_value/7400)  # Atmospheric pressure decay
-        }
\ No newline at end of file
+        }
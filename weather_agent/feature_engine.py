@@ -0,0 +1,138 @@
+import threading
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+# Same columns, in the same order, as WeatherPredictor._prepare_features
+FEATURE_NAMES = [
+    'hour', 'day', 'month', 'season',
+    'temperature_moving_avg', 'pressure_gradient', 'temp_humidity_index',
+    'pressure_tendency', 'last_24h_rain', 'temp_range'
+]
+
+# month (1-12) -> season: 0 winter, 1 spring, 2 summer, 3 fall
+SEASON_BY_MONTH = np.array([0, 0, 0, 1, 1, 1, 2, 2, 2, 3, 3, 3, 0])
+
+
+class RollingFeatureEngine:
+    # Streaming version of _prepare_features for one location. Keeps ring
+    # buffers of the last `window` hours and updates the rolling mean/sum/max/min
+    # in O(1) per observation, so the cost of a new feature row doesn't depend
+    # on how much history has been seen.
+    #
+    # Missing values are forward-filled from the previous observation, matching
+    # the ffill() the batch path does; before any value has been seen the batch
+    # placeholders are used (0, and 50 for humidity).
+    DEFAULTS = {'temperature': 0.0, 'precipitation': 0.0, 'humidity': 50.0, 'pressure': 0.0}
+
+    def __init__(self, window: int = 24):
+        self.window = window
+        self.count = 0
+        self.last_timestamp = None
+        self._lock = threading.Lock()
+
+        self._temperature = np.zeros(window)
+        self._precipitation = np.zeros(window)
+        self._pressure = np.zeros(4)  # enough for the 3-hour tendency
+        self._temperature_sum = 0.0
+        self._precipitation_sum = 0.0
+        # Monotonic deques of (position, value) for the rolling max/min
+        self._max = deque()
+        self._min = deque()
+        self._last = dict(self.DEFAULTS)
+        self._row = np.zeros(len(FEATURE_NAMES), dtype=np.float32)
+
+    def update(self, timestamp, temperature, precipitation, humidity, pressure) -> np.ndarray:
+        # Feed one hourly observation; older or repeated timestamps are ignored
+        timestamp = pd.Timestamp(timestamp)
+        with self._lock:
+            if self.last_timestamp is not None and timestamp <= self.last_timestamp:
+                return self._row.copy()
+            self._push(timestamp, temperature, precipitation, humidity, pressure)
+            return self._row.copy()
+
+    def update_many(self, data) -> np.ndarray:
+        # Feed hourly observations (a DataFrame or HourlySeries with timestamp, temperature,
+        # precipitation, humidity, pressure) and return one contiguous float32 feature row per new hour
+        with self._lock:
+            timestamps = pd.DatetimeIndex(data['timestamp'])
+            # Rows are in time order, so the new hours are a suffix
+            start = 0 if self.last_timestamp is None else timestamps.searchsorted(self.last_timestamp, side='right')
+            n = len(timestamps) - start
+            rows = np.empty((n, len(FEATURE_NAMES)), dtype=np.float32)
+            columns = zip(timestamps[start:], *(np.asarray(data[name], dtype=float)[start:] if name in data else
+                                               np.full(n, np.nan) for name in
+                                               ('temperature', 'precipitation', 'humidity', 'pressure')))
+            for i, (timestamp, temperature, precipitation, humidity, pressure) in enumerate(columns):
+                self._push(timestamp, temperature, precipitation, humidity, pressure)
+                rows[i] = self._row
+            return rows
+
+    def features(self, timestamp=None) -> np.ndarray:
+        # Current feature row, optionally with the temporal features moved to `timestamp`
+        with self._lock:
+            if self.count == 0:
+                raise Exception("No observations fed to the feature engine")
+            row = self._row.copy()
+        if timestamp is not None:
+            timestamp = pd.Timestamp(timestamp)
+            row[0:4] = (timestamp.hour, timestamp.day, timestamp.month, SEASON_BY_MONTH[timestamp.month])
+        return row
+
+    def _push(self, timestamp, temperature, precipitation, humidity, pressure):
+        temperature = self._fill('temperature', temperature)
+        precipitation = self._fill('precipitation', precipitation)
+        humidity = self._fill('humidity', humidity)
+        pressure = self._fill('pressure', pressure)
+
+        n, slot = self.count, self.count % self.window
+        if n >= self.window:
+            self._temperature_sum -= self._temperature[slot]
+            self._precipitation_sum -= self._precipitation[slot]
+        self._temperature[slot] = temperature
+        self._precipitation[slot] = precipitation
+        self._temperature_sum += temperature
+        self._precipitation_sum += precipitation
+        if slot == self.window - 1:
+            # Re-sum once per lap so floating point drift can't build up
+            self._temperature_sum = float(self._temperature.sum())
+            self._precipitation_sum = float(self._precipitation.sum())
+
+        while self._max and self._max[-1][1] <= temperature:
+            self._max.pop()
+        self._max.append((n, temperature))
+        while self._min and self._min[-1][1] >= temperature:
+            self._min.pop()
+        self._min.append((n, temperature))
+        oldest = n - self.window + 1
+        if self._max[0][0] < oldest:
+            self._max.popleft()
+        if self._min[0][0] < oldest:
+            self._min.popleft()
+
+        previous_pressure = self._pressure[(n - 1) % 4] if n >= 1 else pressure
+        pressure_3h_ago = self._pressure[(n - 3) % 4] if n >= 3 else pressure
+        self._pressure[n % 4] = pressure
+
+        self.count = n + 1
+        self.last_timestamp = timestamp
+        filled = min(self.count, self.window)
+        row = self._row
+        row[0] = timestamp.hour
+        row[1] = timestamp.day
+        row[2] = timestamp.month
+        row[3] = SEASON_BY_MONTH[timestamp.month]
+        row[4] = self._temperature_sum / filled
+        row[5] = pressure - previous_pressure
+        row[6] = temperature * humidity
+        row[7] = pressure - pressure_3h_ago
+        row[8] = self._precipitation_sum
+        row[9] = self._max[0][1] - self._min[0][1]
+
+    def _fill(self, name, value):
+        if value is None or value != value:  # NaN
+            return self._last[name]
+        value = float(value)
+        self._last[name] = value
+        return value
@@ -0,0 +1,177 @@
+import threading
+
+import numpy as np
+
+from .hourly_series import HourlySeries, HOUR
+
+VARIABLES = ('temperature', 'precipitation', 'humidity', 'wind_speed', 'pressure')
+# Used for a variable that has no observations at all
+DEFAULTS = {'temperature': 0.0, 'precipitation': 0.0, 'humidity': 50.0, 'wind_speed': 0.0, 'pressure': 0.0}
+
+
+class Observation:
+    # One hourly reading; __slots__ keeps it to the fields, no per-instance dict
+    __slots__ = ('timestamp', 'temperature', 'precipitation', 'humidity', 'wind_speed', 'pressure')
+
+    def __init__(self, timestamp, temperature=np.nan, precipitation=np.nan, humidity=np.nan,
+                 wind_speed=np.nan, pressure=np.nan):
+        self.timestamp = timestamp
+        self.temperature = temperature
+        self.precipitation = precipitation
+        self.humidity = humidity
+        self.wind_speed = wind_speed
+        self.pressure = pressure
+
+    def __repr__(self):
+        return f"Observation({', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)})"
+
+
+class LocationHistory:
+    # Hourly history for one location in a preallocated float32 block, one
+    # contiguous row per variable. Timestamps aren't stored: hour i is
+    # start + i * step (epoch seconds), and missing hours are NaN. The block
+    # doubles when it fills up, so appends are amortised O(1).
+    __slots__ = ('start', 'step', 'length', 'variables', '_index', '_values')
+
+    def __init__(self, start: int, variables: tuple = VARIABLES, capacity: int = 24 * 366, step: int = HOUR):
+        self.start = int(start)
+        self.step = step
+        self.length = 0
+        self.variables = tuple(variables)
+        self._index = {name: i for i, name in enumerate(self.variables)}
+        self._values = np.full((len(self.variables), max(capacity, 1)), np.nan, dtype=np.float32)
+
+    @classmethod
+    def from_series(cls, series: HourlySeries, variables: tuple = VARIABLES, step: int = HOUR):
+        if not len(series):
+            raise Exception("Cannot build a history from an empty series")
+        span = (int(series.times[-1]) - int(series.times[0])) // step + 1
+        history = cls(series.times[0], variables, capacity=span, step=step)
+        history.write(series)
+        return history
+
+    @property
+    def values(self) -> np.ndarray:
+        # (variables, hours) view of the stored hours
+        return self._values[:, :self.length]
+
+    @property
+    def times(self) -> np.ndarray:
+        return self.start + np.arange(self.length, dtype=np.int64) * self.step
+
+    @property
+    def nbytes(self) -> int:
+        return self._values.nbytes
+
+    def column(self, name: str) -> np.ndarray:
+        return self._values[self._index[name], :self.length]
+
+    def write(self, series: HourlySeries):
+        # Place each hour of `series` at its slot; later writes win, hours not
+        # in the series are left alone
+        if not len(series):
+            return
+        if series.times[0] < self.start:
+            self._shift_start(int(series.times[0]))
+        slots = (series.times - self.start) // self.step
+        self._reserve(int(slots[-1]) + 1)
+        for name in self.variables:
+            if name in series:
+                self._values[self._index[name], slots] = series[name]
+        self.length = max(self.length, int(slots[-1]) + 1)
+
+    def append(self, observation: Observation):
+        slot = (int(observation.timestamp) - self.start) // self.step
+        if slot < 0:
+            raise Exception("Observation is older than the start of this history")
+        self._reserve(slot + 1)
+        for name in self.variables:
+            self._values[self._index[name], slot] = getattr(observation, name)
+        self.length = max(self.length, slot + 1)
+
+    def observation(self, i: int) -> Observation:
+        return Observation(self.start + i * self.step,
+                           **{name: float(self._values[j, i]) for j, name in enumerate(self.variables)})
+
+    def window(self, start: int = None, stop: int = None):
+        # (first slot, last slot + 1) covering epoch seconds [start, stop)
+        first = 0 if start is None else max((int(start) - self.start) // self.step, 0)
+        last = self.length if stop is None else min(-(-(int(stop) - self.start) // self.step), self.length)
+        return first, max(first, last)
+
+    def fill_gaps(self, defaults: dict = None):
+        # Forward-fill each variable in place, back-fill the leading gap, and use
+        # the default for variables that were never observed
+        defaults = defaults or DEFAULTS
+        positions = np.arange(self.length)
+        for name in self.variables:
+            column = self.column(name)
+            missing = np.isnan(column)
+            if not missing.any():
+                continue
+            if missing.all():
+                column[:] = defaults.get(name, 0.0)
+                continue
+            # index of the last observed hour at or before each position
+            last_seen = np.where(missing, 0, positions)
+            np.maximum.accumulate(last_seen, out=last_seen)
+            first = int(np.argmax(~missing))
+            last_seen[:first] = first
+            column[missing] = column[last_seen[missing]]
+
+    def to_series(self, first: int = 0, last: int = None) -> HourlySeries:
+        last = self.length if last is None else last
+        return HourlySeries(self.times[first:last],
+                            {name: self._values[i, first:last] for i, name in enumerate(self.variables)})
+
+    def _reserve(self, length: int):
+        capacity = self._values.shape[1]
+        if length <= capacity:
+            return
+        grown = np.full((len(self.variables), max(length, capacity * 2)), np.nan, dtype=np.float32)
+        grown[:, :self.length] = self.values
+        self._values = grown
+
+    def _shift_start(self, start: int):
+        offset = -(-(self.start - start) // self.step)
+        grown = np.full((len(self.variables), self.length + offset + 24), np.nan, dtype=np.float32)
+        grown[:, offset:offset + self.length] = self.values
+        self._values = grown
+        self.start -= offset * self.step
+        self.length += offset
+
+
+class HistoryStore:
+    # In-memory LocationHistory per location key, so retraining many locations
+    # doesn't re-read and re-convert their history every time
+    def __init__(self, variables: tuple = VARIABLES):
+        self.variables = variables
+        self._histories = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        return self._histories.get(key)
+
+    def update(self, key: str, series: HourlySeries) -> LocationHistory:
+        with self._lock:
+            history = self._histories.get(key)
+            if history is None:
+                history = LocationHistory.from_series(series, self.variables)
+                self._histories[key] = history
+            else:
+                history.write(series)
+            return history
+
+    def discard(self, key: str):
+        with self._lock:
+            self._histories.pop(key, None)
+
+    def nbytes(self) -> int:
+        return sum(history.nbytes for history in self._histories.values())
+
+    def stats(self) -> dict:
+        return {
+            "locations": len(self._histories),
+            "hours": sum(history.length for history in self._histories.values()),
+            "bytes": self.nbytes()
+        }
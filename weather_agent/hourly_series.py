@@ -0,0 +1,100 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # fall back to the standard library parser
+    _loads = json.loads
+
+HOUR = 3600
+
+
+def loads(payload):
+    return _loads(payload)
+
+
+class HourlySeries:
+    # Read-only columnar hourly data shared by the fetcher, analyzer and predictor:
+    # `times` are int64 epoch seconds and every variable is a float32 array.
+    # Nothing here copies: renaming, slicing and to_frame() all return views on
+    # the same buffers, and the buffers are marked read-only so no consumer can
+    # change them under another.
+    __slots__ = ("times", "columns", "meta")
+
+    def __init__(self, times: np.ndarray, columns: dict, meta: dict = None):
+        self.times = self._read_only(np.asarray(times, dtype=np.int64))
+        self.columns = {name: self._read_only(np.asarray(values, dtype=np.float32))
+                        for name, values in columns.items()}
+        self.meta = meta or {}
+
+    @classmethod
+    def from_json(cls, payload, variables: list = None, rename: dict = None):
+        # payload: raw response bytes/str or an already parsed Open-Meteo dict
+        data = loads(payload) if isinstance(payload, (bytes, bytearray, memoryview, str)) else payload
+        hourly = data["hourly"]
+        rename = rename or {}
+        variables = variables or [name for name in hourly if name != "time"]
+
+        columns = {}
+        for variable in variables:
+            # None (missing hours) becomes NaN during the C-level conversion
+            columns[rename.get(variable, variable)] = np.array(hourly[variable], dtype=np.float32)
+
+        meta = {k: v for k, v in data.items() if k not in ("hourly", "hourly_units")}
+        return cls(cls._parse_times(hourly["time"]), columns, meta)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, time_column: str = "time", meta: dict = None):
+        times = pd.DatetimeIndex(df[time_column]).as_unit("s").asi8
+        columns = {name: df[name].to_numpy(dtype=np.float32) for name in df.columns if name != time_column}
+        return cls(times, columns, meta)
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        return self.times.view("datetime64[s]")
+
+    def names(self) -> list:
+        return list(self.columns)
+
+    def rename(self, mapping: dict):
+        return HourlySeries(self.times, {mapping.get(k, k): v for k, v in self.columns.items()}, self.meta)
+
+    def slice(self, start: int = None, stop: int = None):
+        window = slice(start, stop)
+        return HourlySeries(self.times[window], {k: v[window] for k, v in self.columns.items()}, self.meta)
+
+    def to_frame(self, time_column: str = "time") -> pd.DataFrame:
+        data = {time_column: pd.DatetimeIndex(self.timestamps)}
+        data.update(self.columns)
+        return pd.DataFrame(data, copy=False)
+
+    def __getitem__(self, name):
+        if name in ("time", "timestamp"):
+            return self.timestamps
+        return self.columns[name]
+
+    def __contains__(self, name):
+        return name in ("time", "timestamp") or name in self.columns
+
+    def __len__(self):
+        return len(self.times)
+
+    @staticmethod
+    def _parse_times(times: list) -> np.ndarray:
+        if not times:
+            return np.empty(0, dtype=np.int64)
+        # Open-Meteo hours are contiguous, so when the endpoints agree we can
+        # build the axis arithmetically instead of parsing every string
+        first, last = np.array([times[0], times[-1]], dtype="datetime64[s]").astype(np.int64)
+        if last - first == (len(times) - 1) * HOUR:
+            return first + np.arange(len(times), dtype=np.int64) * HOUR
+        return np.array(times, dtype="datetime64[s]").astype(np.int64)
+
+    @staticmethod
+    def _read_only(array: np.ndarray) -> np.ndarray:
+        view = array.view()
+        view.flags.writeable = False
+        return view
@@ -0,0 +1,138 @@
+import json
+import random
+import asyncio
+import threading
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .hourly_series import loads
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class AsyncHTTPClient:
+    # Shared async client for every collector:
+    # - one pooled httpx.AsyncClient per event loop (keep-alive, connection limits)
+    # - at most `max_concurrency` upstream requests in flight at once
+    # - retries with exponential backoff + jitter on connection errors and 429/5xx
+    # - identical concurrent GETs (same url + params) share one in-flight request
+    def __init__(self, max_connections: int = 20, max_concurrency: int = 10, retries: int = 3,
+                 backoff: float = 0.5, timeout: float = 30.0, transport: httpx.AsyncBaseTransport = None):
+        self.max_connections = max_connections
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.transport = transport
+        self._loop = None
+        self._client = None
+        self._semaphore = None
+        self._in_flight = {}
+
+    async def get_json(self, url: str, params: dict = None):
+        return loads(await self.get_content(url, params))
+
+    async def get_content(self, url: str, params: dict = None) -> bytes:
+        # Raw response body, for callers that parse straight into arrays
+        self._bind_loop()
+        key = (url, json.dumps(params, sort_keys=True, default=str))
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._request("GET", url, params=params))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # shield() so one caller being cancelled doesn't cancel the others' fetch
+        return await asyncio.shield(task)
+
+    async def post_json(self, url: str, payload: dict):
+        self._bind_loop()
+        return loads(await self._request("POST", url, json=payload))
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _request(self, method: str, url: str, **kwargs):
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._semaphore:
+                    response = await self._client.request(method, url, **kwargs)
+                if response.status_code not in RETRY_STATUSES:
+                    break
+                error = Exception(f"{url} returned {response.status_code}")
+            except httpx.TransportError as e:
+                error = e
+            if attempt == self.retries:
+                raise Exception(f"Request to {url} failed after {self.retries + 1} attempts: {error}")
+            await asyncio.sleep(self.backoff * 2 ** attempt * (1 + random.random()))
+
+        if response.status_code != 200:
+            raise Exception(f"{url} returned {response.status_code}: {response.text[:200]}")
+        return response.content
+
+    def _bind_loop(self):
+        # httpx clients and semaphores belong to the loop they were created on
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+                transport=self.transport
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._in_flight = {}
+
+
+_async_client = None
+_session = None
+_lock = threading.Lock()
+
+
+def get_async_client() -> AsyncHTTPClient:
+    global _async_client
+    with _lock:
+        if _async_client is None:
+            _async_client = AsyncHTTPClient()
+        return _async_client
+
+
+def get_session() -> requests.Session:
+    # Pooled, retrying session for the synchronous paths (training, CLI, examples)
+    global _session
+    with _lock:
+        if _session is None:
+            retry = Retry(total=3, backoff_factor=0.5, status_forcelist=RETRY_STATUSES,
+                          allowed_methods=None)
+            adapter = HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=retry)
+            _session = requests.Session()
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+def set_session(session: requests.Session):
+    # Swap the shared sync session, e.g. for one that replays recorded responses
+    global _session
+    with _lock:
+        _session = session
+
+
+async def close_async_client():
+    # Close the shared client if this process ever created one
+    global _async_client
+    with _lock:
+        client, _async_client = _async_client, None
+    if client is not None:
+        await client.aclose()
+
+
+def set_async_client(client: AsyncHTTPClient):
+    global _async_client
+    with _lock:
+        _async_client = client
@@ -0,0 +1,227 @@
+import os
+import sys
+import time
+import random
+import bisect
+import asyncio
+import functools
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from .paths import DEFAULT_CACHE_DIR
+
+# Seconds; covers a cached response (~1ms) up to a multi-year training run
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+# Stages timed during the current request, so a slow one can be broken down
+_trace = ContextVar("trace", default=None)
+
+
+class Histogram:
+    # Cumulative-bucket histogram per label set, rendered in the Prometheus
+    # text format. observe() is a bisect and a few adds under a lock.
+    def __init__(self, name: str, help: str, labels: tuple, buckets: tuple = BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: (list(counts), total) for labels, (counts, total) in self._series.items()}
+        for label_values, (counts, total) in sorted(series.items()):
+            labels = _labels(self.labels, label_values)
+            braced = f"{{{labels}}}" if labels else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{self.name}_bucket{{{labels}{"," if labels else ""}le="{le}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{braced} {total}")
+            lines.append(f"{self.name}_count{braced} {cumulative}")
+        return lines
+
+
+class Metrics:
+    # Process-wide timings. span("fetch") times a block into
+    # weather_agent_stage_seconds{stage="fetch"}; request_seconds is filled
+    # per endpoint by the service's HTTP middleware. Each worker process keeps
+    # its own numbers and serves them on its own /metrics.
+    def __init__(self):
+        self.stage_seconds = Histogram("weather_agent_stage_seconds",
+                                       "Time spent in each stage of serving and training", ("stage",))
+        self.request_seconds = Histogram("weather_agent_request_seconds",
+                                         "Request latency per endpoint", ("endpoint", "method", "status"))
+        self._gauges = []
+
+    @contextmanager
+    def span(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            self.stage_seconds.observe(seconds, stage)
+            trace = _trace.get()
+            if trace is not None:
+                trace.append((stage, seconds))
+
+    def timed(self, stage: str):
+        # Decorator version of span(), for plain and async functions
+        def decorate(function):
+            if asyncio.iscoroutinefunction(function):
+                @functools.wraps(function)
+                async def wrapper(*args, **kwargs):
+                    with self.span(stage):
+                        return await function(*args, **kwargs)
+            else:
+                @functools.wraps(function)
+                def wrapper(*args, **kwargs):
+                    with self.span(stage):
+                        return function(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def gauge(self, name: str, help: str, read):
+        # `read()` returns the current value (or {label value: value} for a
+        # gauge with one "name" label) whenever /metrics is rendered
+        self._gauges.append((name, help, read))
+
+    def render(self) -> str:
+        lines = self.stage_seconds.render() + self.request_seconds.render()
+        for name, help, read in self._gauges:
+            try:
+                value = read()
+            except Exception:
+                continue
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+            values = value.items() if isinstance(value, dict) else [(None, value)]
+            for label, number in values:
+                if number is None:
+                    continue
+                labels = f'{{name="{label}"}}' if label is not None else ""
+                lines.append(f"{name}{labels} {float(number)}")
+        return "\n".join(lines) + "\n"
+
+    def start_trace(self):
+        return _trace.set([])
+
+    def end_trace(self, token) -> list:
+        trace = _trace.get()
+        _trace.reset(token)
+        return trace or []
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+metrics = Metrics()
+span = metrics.span
+timed = metrics.timed
+
+
+class SlowRequestProfiler:
+    # Opt-in sampling profiler. While a request runs, a background thread
+    # samples the stack of the thread serving it every `interval` seconds; if
+    # the request turns out slower than `threshold` seconds the samples are
+    # written in folded-stack format (one "frame;frame;frame count" line per
+    # stack), which flamegraph.pl, speedscope and inferno read directly.
+    # Fast requests just drop their samples. Stacks of other requests on the
+    # same event loop thread show up in each other's samples.
+    def __init__(self, directory: str, threshold: float, interval: float = 0.005, sample_rate: float = 1.0):
+        self.directory = directory
+        self.threshold = threshold
+        self.interval = interval
+        self.sample_rate = sample_rate
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_env(cls):
+        # Enabled by WEATHER_AGENT_PROFILE_SLOW_MS; None when unset
+        threshold_ms = os.environ.get("WEATHER_AGENT_PROFILE_SLOW_MS")
+        if not threshold_ms:
+            return None
+        return cls(os.environ.get("WEATHER_AGENT_PROFILE_DIR", os.path.join(DEFAULT_CACHE_DIR, "profiles")),
+                   float(threshold_ms) / 1000,
+                   sample_rate=float(os.environ.get("WEATHER_AGENT_PROFILE_SAMPLE", "1.0")))
+
+    def start(self):
+        # Begin sampling the calling thread; returns a session for stop(), or
+        # None when this request wasn't picked by sample_rate
+        if random.random() >= self.sample_rate:
+            return None
+        session = {"thread": threading.get_ident(), "stacks": Counter()}
+        with self._lock:
+            self._sessions[id(session)] = session
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="slow-request-profiler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return session
+
+    def stop(self, session, seconds: float, name: str, stages: list = None):
+        # Returns the path of the written profile, or None
+        if session is None:
+            return None
+        with self._lock:
+            self._sessions.pop(id(session), None)
+        if seconds < self.threshold or not session["stacks"]:
+            return None
+
+        slug = "".join(c if c.isalnum() else "_" for c in name).strip("_") or "request"
+        path = os.path.join(self.directory, f"{time.strftime('%Y%m%dT%H%M%S')}_{slug}_{int(seconds * 1000)}ms.folded")
+        with open(path, "w") as f:
+            for stack, count in session["stacks"].most_common():
+                f.write(f"{stack} {count}\n")
+        breakdown = ", ".join(f"{stage} {stage_seconds * 1000:.1f}ms" for stage, stage_seconds in stages or [])
+        print(f"Slow request {name} took {seconds * 1000:.0f}ms ({breakdown}); profile written to {path}")
+        return path
+
+    def _run(self):
+        while True:
+            with self._lock:
+                sessions = list(self._sessions.values())
+                if not sessions:
+                    self._wake.clear()
+            if not sessions:
+                self._wake.wait()
+                continue
+            frames = sys._current_frames()
+            for session in sessions:
+                frame = frames.get(session["thread"])
+                if frame is not None:
+                    session["stacks"][_fold(frame)] += 1
+            del frames
+            time.sleep(self.interval)
+
+
+def _fold(frame) -> str:
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
@@ -1,15 +1,113 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
+from typing import Dict, List, Optional
 from datetime import datetime, timedelta
+import os
+import time
+import asyncio
+import threading
+from contextlib import asynccontextmanager
 import uvicorn
+import numpy as np
 
-from weather_agent.weather_predictor import WeatherPredictor
-from weather_agent.data_fetcher import OpenMeteoFetcher
-from weather_agent.training.model_trainer import WeatherModelTrainer
-from weather_agent.validation.validator import WeatherValidator
+# Only light modules here: the predictor (pandas, sklearn, model files) is
+# imported and built on the first request that needs it, or by the optional
+# warmup after startup, so a new worker is up and serving health checks fast
+from weather_agent.instrumentation import metrics, span, SlowRequestProfiler
+from weather_agent.response_cache import ResponseCache
+from weather_agent.training.jobs import TrainingJobQueue
+from weather_agent.training.parallel_trainer import ESTIMATORS
 
-app = FastAPI(title="Weather Prediction AI Agent")
-weather_predictor = WeatherPredictor()  # Add this line to create the instance
+_weather_predictor = None
+_training_jobs = None
+_lock = threading.Lock()
+
+def get_predictor():
+    global _weather_predictor
+    with _lock:
+        if _weather_predictor is None:
+            from weather_agent.weather_predictor import WeatherPredictor
+            _weather_predictor = WeatherPredictor()
+        return _weather_predictor
+
+async def aget_predictor():
+    # The first build takes a while (imports), keep it off the event loop
+    if _weather_predictor is not None:
+        return _weather_predictor
+    return await asyncio.to_thread(get_predictor)
+
+def get_training_jobs() -> TrainingJobQueue:
+    global _training_jobs
+    with _lock:
+        if _training_jobs is None:
+            _training_jobs = TrainingJobQueue(
+                run_training_job,
+                workers=int(os.environ.get("WEATHER_AGENT_TRAINING_WORKERS", "1"))
+            )
+        return _training_jobs
+
+def run_training_job(job: dict, progress) -> dict:
+    # The new models only replace the live ones once they are fully saved.
+    # 'refresh' jobs extend the live models with the hours since they were
+    # trained (falling back to a full retrain when one is due or needed).
+    if job["kind"] == "refresh":
+        return get_predictor().refresh(job["lat"], job["lon"], progress=progress, **job["options"])
+    return get_predictor().train(job["lat"], job["lon"], progress=progress, **job["options"])
+
+def warm_up():
+    # Pay for the imports and the default model set before the first request does
+    predictor = get_predictor()
+    try:
+        predictor.registry.get(predictor.model_key(predictor.DEFAULT_LOCATION))
+    except Exception as e:
+        print(f"Warmup could not load the default models: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    get_training_jobs().start()
+    if os.environ.get("WEATHER_AGENT_WARMUP", "0") == "1":
+        threading.Thread(target=warm_up, name="warmup", daemon=True).start()
+    yield
+    get_training_jobs().stop(timeout=5)
+    from weather_agent.http_client import close_async_client
+    await close_async_client()
+
+app = FastAPI(title="Weather Prediction AI Agent", lifespan=lifespan)
+# Repeated forecasts are served from here until the next data hour or a model swap
+response_cache = ResponseCache(
+    max_entries=int(os.environ.get("WEATHER_AGENT_RESPONSE_CACHE_SIZE", "1024")),
+    shared_path=os.environ.get("WEATHER_AGENT_RESPONSE_CACHE_DB")
+)
+# Off unless WEATHER_AGENT_PROFILE_SLOW_MS is set
+profiler = SlowRequestProfiler.from_env()
+
+metrics.gauge("weather_agent_response_cache", "Response cache counters",
+              lambda: {name: value for name, value in response_cache.stats().items()
+                       if name in ("entries", "hits", "shared_hits", "misses", "expired", "evictions")})
+metrics.gauge("weather_agent_loaded_models_bytes", "Size of the model sets loaded in this worker",
+              lambda: _weather_predictor.registry.cache_stats()["bytes"] if _weather_predictor else None)
+
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    # Latency per endpoint (the route template, so /train/{job_id} is one
+    # series), plus a profile of the request if it's slow and profiling is on
+    session = profiler.start() if profiler else None
+    trace = metrics.start_trace()
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        seconds = time.perf_counter() - started
+        stages = metrics.end_trace(trace)
+        route = request.scope.get("route")
+        endpoint = route.path if route is not None else "unmatched"
+        metrics.request_seconds.observe(seconds, endpoint, request.method, str(status))
+        if session is not None:
+            profiler.stop(session, seconds, f"{request.method} {endpoint}", stages)
 
 class WeatherRequest(BaseModel):
     location: str
@@ -21,53 +119,163 @@ class WeatherResponse(BaseModel):
     forecast: dict
     confidence: dict
 
-@app.post("/train")
-async def train_models():
-    try:
-        # Use the weather_predictor instance we created
-        weather_predictor.train(19.0760, 72.8777)  # Mumbai coordinates
-        return {"message": "Models trained successfully"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+class TrainRequest(BaseModel):
+    # Either a mapped location ("bangalore.peenya") or coordinates
+    location: Optional[str] = None
+    lat: float = 19.0760  # Mumbai coordinates
+    lon: float = 72.8777
+    estimator: str = "gbr"
+    # Extend the live models with new hours instead of a full retrain
+    refresh: bool = False
+
+class BatchLocation(BaseModel):
+    # Coordinates, or just a mapped location name
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+    name: Optional[str] = None
+
+class BatchWeatherRequest(BaseModel):
+    locations: List[BatchLocation]
+    horizons: List[int] = list(range(1, 25))
+
+class BatchWeatherResponse(BaseModel):
+    # Columnar: every list has one entry per (location, horizon) pair
+    forecast: Dict[str, list]
+
+class MicroWeatherRequest(BaseModel):
+    city: str
+    area: str
+    date: str
+
+class MicroWeatherResponse(BaseModel):
+    # One entry per sub-region of the area, each with 24 hourly values
+    city: str
+    area: str
+    date: str
+    sub_regions: List[dict]
+    confidence: dict
+
+@app.post("/train", status_code=202)
+async def train_models(request: Optional[TrainRequest] = None):
+    # Queue a retrain and return straight away; poll GET /train/{job_id}
+    request = request or TrainRequest()
+    if request.estimator not in ESTIMATORS:
+        raise HTTPException(status_code=400, detail=f"estimator must be one of {ESTIMATORS}")
+    lat, lon = request.lat, request.lon
+    if request.location:
+        weather_predictor = await aget_predictor()
+        try:
+            region = weather_predictor.micro_location_mapper.resolve(request.location)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        lat, lon = region["lat"], region["lon"]
+    training_jobs = get_training_jobs()
+    # A refresh keeps the live models' estimator unless one is asked for
+    options = {"estimator": request.estimator}
+    if request.refresh and "estimator" not in request.model_fields_set:
+        options = {}
+    job_id = training_jobs.submit(lat, lon, kind="refresh" if request.refresh else "train", options=options)
+    return {"job_id": job_id, "status": training_jobs.get(job_id)["status"]}
+
+@app.get("/train/{job_id}")
+async def training_status(job_id: str):
+    job = get_training_jobs().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown training job {job_id}")
+    return job
 
 @app.post("/predict_weather", response_model=WeatherResponse)
 async def predict_weather(request: WeatherRequest):
     try:
-        forecast = weather_predictor.predict(request.location, request.date)
-        confidence = {
-            "temperature": 0.85,
-            "precipitation": 0.75,
-            "humidity": 0.80,
-            "wind_speed": 0.70
-        }
-        
-        return WeatherResponse(
-            location=request.location,
-            date=request.date,
-            forecast=forecast,
-            confidence=confidence
+        weather_predictor = await aget_predictor()
+        cache_key = ("predict_weather", weather_predictor.location_key(request.location), request.date,
+                     await weather_predictor.amodel_version(request.location))
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            return dict(cached, location=request.location)
+
+        forecast = await weather_predictor.apredict(request.location, request.date)
+        with span("format"):
+            # Probability the observed value falls inside each reported interval
+            confidence = {
+                param: interval["coverage"]
+                for param, interval in forecast["confidence_intervals"].items()
+            }
+
+            response = WeatherResponse(
+                location=request.location,
+                date=request.date,
+                forecast=forecast,
+                confidence=confidence
+            )
+            response_cache.set(cache_key, response.model_dump())
+        return response
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/predict_weather/batch", response_model=BatchWeatherResponse)
+async def predict_weather_batch(request: BatchWeatherRequest):
+    try:
+        weather_predictor = await aget_predictor()
+        forecast = await weather_predictor.apredict_batch(
+            [location.model_dump() for location in request.locations],
+            request.horizons
         )
+        return BatchWeatherResponse(forecast=forecast)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-@app.post("/predict_micro_weather")
+def calculate_micro_confidence(forecast: dict) -> dict:
+    # Share of hours whose whole precipitation interval sits on one side of the
+    # rain threshold, i.e. the rain / no-rain call holds at the interval's coverage
+    threshold = forecast["rain_threshold"]
+    confidence = {}
+    for sub_region in forecast["sub_regions"]:
+        lower = np.asarray(sub_region["hourly"]["precipitation_lower"])
+        upper = np.asarray(sub_region["hourly"]["precipitation_upper"])
+        decided = (lower > threshold) | (upper <= threshold)
+        confidence[sub_region["name"]] = round(float(decided.mean()), 3) if len(decided) else None
+    confidence["interval_coverage"] = forecast["interval_coverage"]
+    return confidence
+
+@app.post("/predict_micro_weather", response_model=MicroWeatherResponse)
 async def predict_micro_weather(request: MicroWeatherRequest):
     try:
-        forecast = weather_predictor.predict_micro_location(
+        weather_predictor = await aget_predictor()
+        area = weather_predictor.micro_location_mapper.get_coordinates(request.city, request.area)
+        cache_key = ("predict_micro_weather", area["key"], request.date,
+                     await weather_predictor.amodel_version((area["lat"], area["lon"])))
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            return dict(cached, city=request.city, area=request.area)
+
+        forecast = await weather_predictor.apredict_micro_location(
             request.city,
             request.area,
             request.date
         )
         
-        return MicroWeatherResponse(
-            city=request.city,
-            area=request.area,
-            date=request.date,
-            hourly_forecast=forecast,
-            confidence=calculate_micro_confidence(forecast)
-        )
+        with span("format"):
+            response = MicroWeatherResponse(
+                city=request.city,
+                area=request.area,
+                date=request.date,
+                sub_regions=forecast["sub_regions"],
+                confidence=calculate_micro_confidence(forecast)
+            )
+            response_cache.set(cache_key, response.model_dump())
+        return response
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.get("/cache/stats")
+async def cache_stats():
+    return response_cache.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    # Prometheus text format; scrape each worker process separately
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
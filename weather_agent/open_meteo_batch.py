@@ -0,0 +1,134 @@
+import asyncio
+from urllib.parse import urlencode
+
+import numpy as np
+import pandas as pd
+
+from .http_client import get_async_client, get_session
+from .hourly_series import HourlySeries, loads
+from .instrumentation import timed
+
+# Open-Meteo accepts comma-separated latitude/longitude lists and answers with
+# one result per coordinate, so many locations cost one request. Batches are
+# cut so the URL stays well under what servers and proxies accept.
+MAX_URL_LENGTH = 4000
+MAX_LOCATIONS = 100
+# Locations are merged onto this grid before fetching. The archive's finest
+# reanalysis (ERA5-Land) is on a 0.1 degree grid, so points rounding to the
+# same grid point get the same series anyway; None only merges identical
+# coordinates.
+GRID_DEGREES = 0.1
+
+
+def location_key(location) -> str:
+    # Name of a location in stacked frames: the mapper's "city.area[.sub_region]"
+    # key when there is one, else "lat,lon"
+    if isinstance(location, dict):
+        if location.get("key"):
+            return location["key"]
+        location = (location["lat"], location["lon"])
+    return f"{float(location[0]):.4f},{float(location[1]):.4f}"
+
+
+def coordinates(location) -> tuple:
+    if isinstance(location, dict):
+        return float(location["lat"]), float(location["lon"])
+    return float(location[0]), float(location[1])
+
+
+def grid_cells(locations: list, grid_degrees: float = GRID_DEGREES):
+    # ([(lat, lon) per distinct grid point], index of each location's point)
+    points = np.array([coordinates(location) for location in locations], dtype=float).reshape(-1, 2)
+    if grid_degrees:
+        points = np.round(points / grid_degrees) * grid_degrees
+    cells, index = np.unique(points.round(4), axis=0, return_inverse=True)
+    return [tuple(map(float, cell)) for cell in cells], index.ravel()
+
+
+def coordinate_batches(url: str, params: dict, cells: list, max_url_length: int = MAX_URL_LENGTH,
+                       max_locations: int = MAX_LOCATIONS) -> list:
+    # Consecutive index lists into `cells` whose request URL stays under
+    # max_url_length (commas counted percent-encoded)
+    base = len(url) + 1 + len(urlencode(dict(params, latitude="", longitude="")))
+    batches, batch, length = [], [], base
+    for i, (lat, lon) in enumerate(cells):
+        added = len(_format(lat)) + len(_format(lon)) + (6 if batch else 0)
+        if batch and (length + added > max_url_length or len(batch) == max_locations):
+            batches.append(batch)
+            batch, length, added = [], base, added - 6
+        batch.append(i)
+        length += added
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+@timed("fetch.api")
+def fetch_cells(url: str, params: dict, cells: list, variables: list = None) -> list:
+    # One HourlySeries per cell, a request per URL-sized batch
+    series = []
+    for batch in coordinate_batches(url, params, cells):
+        response = get_session().get(url, params=batch_params(params, cells, batch))
+        if response.status_code != 200:
+            raise Exception("Failed to fetch data from OpenMeteo")
+        series.extend(_parse(response.content, variables, len(batch)))
+    return series
+
+
+@timed("fetch.api")
+async def afetch_cells(url: str, params: dict, cells: list, variables: list = None) -> list:
+    # Same as fetch_cells(); the batches are requested concurrently
+    batches = coordinate_batches(url, params, cells)
+    try:
+        contents = await asyncio.gather(*(
+            get_async_client().get_content(url, params=batch_params(params, cells, batch)) for batch in batches
+        ))
+    except Exception as e:
+        raise Exception(f"Failed to fetch data from OpenMeteo: {e}")
+    series = []
+    for batch, content in zip(batches, contents):
+        series.extend(_parse(content, variables, len(batch)))
+    return series
+
+
+def stack(keys: list, series: list, time_column: str = "time") -> pd.DataFrame:
+    # One long frame: a categorical "location" column, the time column and
+    # every variable, each location's hours in order
+    lengths = [len(s) for s in series]
+    data = {
+        "location": pd.Categorical.from_codes(np.repeat(np.arange(len(keys)), lengths), categories=keys),
+        time_column: pd.DatetimeIndex(np.concatenate([s.times for s in series] or [np.empty(0, np.int64)])
+                                      .view("datetime64[s]"))
+    }
+    names = list(dict.fromkeys(name for s in series for name in s.names()))
+    for name in names:
+        data[name] = np.concatenate([s.columns[name] if name in s.columns else np.full(len(s), np.nan, np.float32)
+                                     for s in series])
+    return pd.DataFrame(data, copy=False)
+
+
+def unique_locations(locations: list) -> list:
+    # Drops repeats of the same location key, keeping the first
+    unique = {}
+    for location in locations:
+        unique.setdefault(location_key(location), location)
+    return list(unique.values())
+
+
+def batch_params(params: dict, cells: list, batch: list) -> dict:
+    return dict(params,
+                latitude=",".join(_format(cells[i][0]) for i in batch),
+                longitude=",".join(_format(cells[i][1]) for i in batch))
+
+
+def _parse(content: bytes, variables: list, expected: int) -> list:
+    # A single coordinate comes back as an object, several as a list
+    data = loads(content)
+    results = data if isinstance(data, list) else [data]
+    if len(results) != expected:
+        raise Exception(f"OpenMeteo returned {len(results)} locations, expected {expected}")
+    return [HourlySeries.from_json(result, variables) for result in results]
+
+
+def _format(value: float) -> str:
+    return f"{value:.4f}".rstrip("0").rstrip(".")
@@ -0,0 +1,7 @@
+import os
+
+# Kept free of heavy imports: the job queue and caches read these at import time
+DEFAULT_CACHE_DIR = os.environ.get(
+    "WEATHER_AGENT_CACHE_DIR",
+    os.path.join(os.path.dirname(__file__), "data", "cache")
+)
@@ -0,0 +1,131 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+
+from .sqlite_connection import connect
+
+HOUR = 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL
+)
+"""
+
+
+def next_hour_boundary(now: float = None) -> float:
+    # Inputs only change when a new hourly observation lands
+    now = time.time() if now is None else now
+    return (now // HOUR + 1) * HOUR
+
+
+class ResponseCache:
+    # LRU of finished API responses. Keys should include the model version, so
+    # a swapped model set is never served from an old entry; entries expire at
+    # the next hour boundary by default.
+    #
+    # With `shared_path` set, entries are also written to a small SQLite table
+    # (WAL mode) that every worker process on the host reads, so a response
+    # computed by one worker is a hit for the others.
+    def __init__(self, max_entries: int = 1024, shared_path: str = None, purge_every: int = 256):
+        self.max_entries = max_entries
+        self.shared_path = shared_path
+        self.purge_every = purge_every
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+        if shared_path:
+            os.makedirs(os.path.dirname(os.path.abspath(shared_path)), exist_ok=True)
+            with self._connect() as db:
+                db.execute("PRAGMA journal_mode=WAL")
+                db.execute(SCHEMA)
+
+    def get(self, key):
+        key = self._key(key)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.expired += 1
+
+        if self.shared_path:
+            with self._connect() as db:
+                row = db.execute("SELECT value, expires_at FROM responses WHERE key = ? AND expires_at > ?",
+                                 (key, now)).fetchone()
+            if row is not None:
+                value = json.loads(row[0])
+                with self._lock:
+                    self.shared_hits += 1
+                    self._remember(key, value, row[1])
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, value, expires_at: float = None):
+        key = self._key(key)
+        expires_at = expires_at or next_hour_boundary()
+        with self._lock:
+            self._remember(key, value, expires_at)
+            self._writes += 1
+            purge = self._writes % self.purge_every == 0
+
+        if self.shared_path:
+            with self._connect() as db:
+                db.execute("INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)",
+                           (key, json.dumps(value, default=str), expires_at))
+                if purge:
+                    db.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.shared_path:
+            with self._connect() as db:
+                db.execute("DELETE FROM responses")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.shared_hits) / lookups, 4) if lookups else None,
+                "shared": bool(self.shared_path)
+            }
+
+    def _remember(self, key: str, value, expires_at: float):
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _key(self, key) -> str:
+        return key if isinstance(key, str) else json.dumps(key, default=str)
+
+    def _connect(self):
+        return connect(self.shared_path, timeout=5)
+
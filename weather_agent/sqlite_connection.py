@@ -0,0 +1,26 @@
+import sqlite3
+
+
+def connect(path: str, timeout: float, row_factory=None) -> "Connection":
+    # Autocommit connection (transactions are explicit BEGINs) for a `with` block
+    db = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+    if row_factory is not None:
+        db.row_factory = row_factory
+    return Connection(db)
+
+
+class Connection:
+    # sqlite3's own context manager doesn't close the connection; this one
+    # commits an open transaction (or rolls it back on error) and closes
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if self.db.in_transaction:
+                self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.db.close()
@@ -0,0 +1,186 @@
+import os
+import gzip
+import glob
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .paths import DEFAULT_CACHE_DIR
+from .http_client import get_session
+
+DEFAULT_TILE_DIR = os.environ.get("WEATHER_AGENT_TILE_DIR", os.path.join(DEFAULT_CACHE_DIR, "srtm"))
+# Public SRTM 1 arc-second tiles (skadi layout: N19/N19E072.hgt.gz)
+SRTM_URL = os.environ.get(
+    "WEATHER_AGENT_SRTM_URL",
+    "https://s3.amazonaws.com/elevation-tiles-prod/skadi/{lat_dir}/{name}.hgt.gz"
+)
+
+SAMPLES_PER_DEGREE = 3600
+TILE_SIZE = SAMPLES_PER_DEGREE + 1  # tiles overlap by one row/column
+VOID = -32768
+
+
+class SRTMTileCache:
+    # Local cache of SRTM elevation tiles, one 1x1 degree tile per file:
+    #   <tile_dir>/N19E072.npy   (3601 x 3601 int16, north-west corner first)
+    # Each tile is downloaded once, written atomically and then opened
+    # memory-mapped, so point and window queries are array slices that only
+    # touch the pages they need. Tiles with no land (ocean) are remembered with
+    # an empty .none marker and read as sea level.
+    #
+    # Disk use is bounded by `max_bytes`: when a new tile pushes the cache over,
+    # the least recently opened tiles are deleted. Deleting a tile another
+    # process has mapped is safe on POSIX; that mapping stays valid until closed.
+    def __init__(self, tile_dir: str = None, max_bytes: int = None, max_open: int = 64):
+        self.tile_dir = tile_dir or DEFAULT_TILE_DIR
+        if max_bytes is None:
+            max_bytes = int(os.environ.get("WEATHER_AGENT_TILE_CACHE_MB", "2048")) * 1024 * 1024
+        self.max_bytes = max_bytes
+        self.max_open = max_open
+        self._open = OrderedDict()
+        self._lock = threading.Lock()
+        self._tile_locks = {}
+        os.makedirs(self.tile_dir, exist_ok=True)
+
+    @staticmethod
+    def tile_name(lat: float, lon: float) -> str:
+        south, west = int(np.floor(lat)), int(np.floor(lon))
+        return f"{'N' if south >= 0 else 'S'}{abs(south):02d}{'E' if west >= 0 else 'W'}{abs(west):03d}"
+
+    def tile(self, lat: float, lon: float):
+        # Memory-mapped tile containing (lat, lon), or None for an ocean tile
+        name = self.tile_name(lat, lon)
+        with self._lock:
+            if name in self._open:
+                self._open.move_to_end(name)
+                return self._open[name]
+            tile_lock = self._tile_locks.setdefault(name, threading.Lock())
+
+        # One download per tile, other tiles keep loading in parallel
+        with tile_lock:
+            with self._lock:
+                if name in self._open:
+                    return self._open[name]
+            path = self._path(name)
+            if not os.path.exists(path) and not os.path.exists(self._marker(name)):
+                self._download(name)
+                self._evict(keep=name)
+            tile = np.load(path, mmap_mode="r") if os.path.exists(path) else None
+            self._touch(path if tile is not None else self._marker(name))
+
+        with self._lock:
+            self._open[name] = tile
+            while len(self._open) > self.max_open:
+                self._open.popitem(last=False)
+        return tile
+
+    def elevation(self, lat: float, lon: float) -> float:
+        return float(self.window(lat, lon, half_size=0.0)[0, 0])
+
+    def window(self, lat: float, lon: float, half_size: float = 0.005, resolution: float = None) -> np.ndarray:
+        # float32 elevations (m) on a grid centred at (lat, lon), rows north to
+        # south; `resolution` in degrees defaults to the native 1 arc-second.
+        # Windows crossing tile edges are stitched; voids come back as NaN.
+        resolution = resolution or 1.0 / SAMPLES_PER_DEGREE
+        steps = int(round(2 * half_size / resolution)) + 1
+        lats = lat + half_size - np.arange(steps) * resolution
+        lons = lon - half_size + np.arange(steps) * resolution
+        return self.sample(lats, lons)
+
+    def sample(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        # Elevations at every (lat, lon) of the grid lats x lons (nearest sample)
+        rows = np.rint((90.0 - np.asarray(lats, dtype=float)) * SAMPLES_PER_DEGREE).astype(np.int64)
+        cols = np.rint((np.asarray(lons, dtype=float) + 180.0) * SAMPLES_PER_DEGREE).astype(np.int64)
+        out = np.empty((len(rows), len(cols)), dtype=np.float32)
+
+        # Global sample index -> (tile band, index inside the tile)
+        row_bands, col_bands = rows // SAMPLES_PER_DEGREE, cols // SAMPLES_PER_DEGREE
+        for row_band in np.unique(row_bands):
+            row_mask = row_bands == row_band
+            north = 90 - int(row_band)
+            for col_band in np.unique(col_bands):
+                col_mask = col_bands == col_band
+                west = int(col_band) - 180
+                tile = self.tile(north - 1, west)
+                if tile is None:
+                    out[np.ix_(row_mask, col_mask)] = 0.0
+                    continue
+                block = tile[np.ix_(rows[row_mask] % SAMPLES_PER_DEGREE, cols[col_mask] % SAMPLES_PER_DEGREE)]
+                out[np.ix_(row_mask, col_mask)] = np.where(block == VOID, np.nan, block)
+        return out
+
+    def disk_usage(self) -> int:
+        return sum(os.path.getsize(path) for path in glob.glob(os.path.join(self.tile_dir, "*.npy")))
+
+    def _download(self, name: str):
+        url = SRTM_URL.format(lat_dir=name[:3], name=name)
+        response = get_session().get(url, timeout=120)
+        if response.status_code in (403, 404):
+            # No tile published for this square: it's all sea
+            open(self._marker(name), "w").close()
+            return
+        if response.status_code != 200:
+            raise Exception(f"Failed to download SRTM tile {name}: {response.status_code}")
+
+        data = np.frombuffer(gzip.decompress(response.content), dtype=">i2")
+        if data.size != TILE_SIZE * TILE_SIZE:
+            raise Exception(f"SRTM tile {name} has {data.size} samples, expected {TILE_SIZE * TILE_SIZE}")
+
+        # Write under a temporary name and rename, so readers never see half a tile
+        path = self._path(name)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.save(f, data.astype(np.int16).reshape(TILE_SIZE, TILE_SIZE), allow_pickle=False)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _evict(self, keep: str):
+        tiles = []
+        for path in glob.glob(os.path.join(self.tile_dir, "*.npy")):
+            try:
+                tiles.append((os.path.getmtime(path), os.path.getsize(path), path))
+            except OSError:  # removed by another process meanwhile
+                continue
+        total = sum(size for _, size, _ in tiles)
+        for _, size, path in sorted(tiles):
+            if total <= self.max_bytes:
+                break
+            if os.path.basename(path) == f"{keep}.npy":
+                continue
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+            with self._lock:
+                self._open.pop(os.path.basename(path)[:-4], None)
+
+    def _touch(self, path: str):
+        # mtime doubles as "last opened" for eviction (atime is often disabled)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.tile_dir, f"{name}.npy")
+
+    def _marker(self, name: str) -> str:
+        return os.path.join(self.tile_dir, f"{name}.none")
+
+
+_tiles = None
+_tiles_lock = threading.Lock()
+
+
+def get_tile_cache() -> SRTMTileCache:
+    # Shared cache so every collector maps each tile once per process
+    global _tiles
+    with _tiles_lock:
+        if _tiles is None:
+            _tiles = SRTMTileCache()
+        return _tiles
@@ -0,0 +1,232 @@
+import os
+import json
+
+import numpy as np
+
+# Losses whose predictions are the raw boosted sum (identity link)
+IDENTITY_LOSSES = ('squared_error', 'absolute_error', 'huber', 'quantile')
+ARRAYS = ('feature', 'threshold', 'children', 'value', 'missing_left', 'roots', 'tree_target', 'tree_depth',
+          'mean', 'scale')
+# Largest (rows x trees) block walked at once; keeps the index arrays to a few MB
+BLOCK_SIZE = 1 << 18
+# Past this many node visits per call sklearn's compiled traversal is faster
+# than stepping through numpy; ModelSet.predict hands such batches to sklearn
+MAX_VISITS = 1 << 18
+# Compiled predictions must match sklearn's this closely on the probe rows
+TOLERANCE = 1e-6
+# Probe rows are moved this many float32 steps either side of a split threshold
+PROBE_STEPS = 2
+
+
+class CompiledEnsemble:
+    # Every tree of a model set's boosted ensembles packed into flat node
+    # arrays, so all targets are predicted in one vectorized pass without
+    # sklearn's per-call validation:
+    #   feature, threshold  split of each node (x <= threshold goes left)
+    #   children            (left, right) per node, flattened; leaves point at themselves
+    #   value               leaf value, already multiplied by the learning rate
+    #   missing_left        where NaN goes (only consulted when the input has NaN)
+    #   roots, tree_target  root node and target column of each tree
+    #   tree_depth          depth of each tree; trees are stored shallowest first
+    #   mean, scale         (targets, features) StandardScaler in front of each target, float32
+    # Trees are walked one level per step for every (row, tree) pair at once.
+    # Leaves loop onto themselves, and trees no deeper than the current level
+    # (a prefix, thanks to the ordering) are skipped.
+    def __init__(self, targets: list, arrays: dict, baseline, max_depth: int):
+        self.targets = list(targets)
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+        # Versions compiled before the scaler was kept in float32 stored float64
+        self.mean = np.asarray(self.mean, dtype=np.float32)
+        self.scale = np.asarray(self.scale, dtype=np.float32)
+        self.baseline = np.asarray(baseline, dtype=np.float64)
+        self.max_depth = int(max_depth)
+        # (trees, targets) 0/1 matrix summing leaf values into their target
+        self._membership = np.zeros((len(self.roots), len(self.targets)))
+        self._membership[np.arange(len(self.roots)), self.tree_target] = 1.0
+        # First tree still walking at each level
+        self._level_start = np.searchsorted(self.tree_depth, np.arange(self.max_depth), side='right')
+        self.visits_per_row = int(np.sum(self.tree_depth))
+
+    def prefers(self, n_rows: int) -> bool:
+        # Whether predicting n_rows here beats calling sklearn
+        return n_rows * self.visits_per_row <= MAX_VISITS
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        # (rows, targets) predictions for unscaled float32 feature rows (float64
+        # rows are scaled in float64 by sklearn, so only float32 ones match it)
+        X = np.asarray(X)
+        predictions = np.empty((len(X), len(self.targets)))
+        step = max(1, BLOCK_SIZE // max(len(self.roots), 1))
+        for start in range(0, len(X), step):
+            predictions[start:start + step] = self._predict_block(X[start:start + step])
+        return predictions
+
+    def _predict_block(self, X: np.ndarray) -> np.ndarray:
+        n_rows, n_features = X.shape
+        # Scaled exactly the way StandardScaler.transform scales float32 rows:
+        # mean and scale cast to float32 and every step done in float32. Live
+        # inputs are quantized and often sit right on a split threshold, so
+        # rounding any differently would send them down the other branch.
+        scaled = np.empty((len(self.targets), n_rows, n_features), dtype=np.float32)
+        scaled[:] = X
+        scaled -= self.mean[:, None, :]
+        scaled /= self.scale[:, None, :]
+        flat = scaled.ravel()
+        has_nan = np.isnan(flat).any()
+
+        # (trees, rows): position of each pair's feature row in `flat`, and the
+        # node it has reached
+        offsets = (self.tree_target * (n_rows * n_features))[:, None] + np.arange(n_rows) * n_features
+        node = np.repeat(self.roots[:, None], n_rows, axis=1)
+        for start in self._level_start:
+            active = node[start:]
+            x = flat[offsets[start:] + self.feature[active]]
+            right = ~(x <= self.threshold[active])
+            if has_nan:
+                right &= ~(np.isnan(x) & self.missing_left[active])
+            node[start:] = self.children[2 * active + right]
+        return self.baseline + self.value[node].T @ self._membership
+
+    def save(self, directory: str):
+        # Plain .npy files next to the joblib models, so load() can map them
+        # read-only and every worker shares one copy through the page cache
+        for name in ARRAYS:
+            np.save(os.path.join(directory, f"compiled_{name}.npy"), np.ascontiguousarray(getattr(self, name)))
+        with open(os.path.join(directory, "compiled.json"), "w") as f:
+            json.dump({"targets": self.targets, "baseline": self.baseline.tolist(), "max_depth": self.max_depth}, f)
+
+    @classmethod
+    def load(cls, directory: str, mmap_mode: str = 'r'):
+        # None for versions saved without a compiled ensemble
+        try:
+            with open(os.path.join(directory, "compiled.json")) as f:
+                meta = json.load(f)
+        except OSError:
+            return None
+        arrays = {name: np.load(os.path.join(directory, f"compiled_{name}.npy"), mmap_mode=mmap_mode)
+                  for name in ARRAYS}
+        return cls(meta["targets"], arrays, meta["baseline"], meta["max_depth"])
+
+
+def compile_model_set(model_set) -> CompiledEnsemble:
+    # Flatten a model set's fitted GradientBoostingRegressor /
+    # HistGradientBoostingRegressor models and their scalers. Raises for
+    # anything else (e.g. the streaming trainer's linear models).
+    targets = list(model_set.models)
+    trees, baseline, mean, scale = [], [], [], []
+    for column, param in enumerate(targets):
+        model_trees, model_baseline = _extract_trees(model_set.models[param])
+        trees.extend((column, tree) for tree in model_trees)
+        baseline.append(model_baseline)
+        scaler = model_set.scalers[param]
+        if not hasattr(scaler, 'scale_'):
+            raise Exception(f"Can't compile {param}: expected a fitted StandardScaler")
+        n_features = model_set.models[param].n_features_in_
+        mean.append(scaler.mean_ if scaler.mean_ is not None else np.zeros(n_features))
+        scale.append(scaler.scale_ if scaler.scale_ is not None else np.ones(n_features))
+
+    trees.sort(key=lambda item: item[1]["depth"])
+    sizes = np.array([len(tree["feature"]) for _, tree in trees])
+    roots = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    children = []
+    for root, (_, tree) in zip(roots, trees):
+        children.append(np.column_stack([tree["left"], tree["right"]]) + root)
+
+    arrays = {
+        "feature": np.concatenate([tree["feature"] for _, tree in trees]).astype(np.int64),
+        "threshold": np.concatenate([tree["threshold"] for _, tree in trees]).astype(np.float64),
+        "children": np.concatenate(children).ravel().astype(np.int64),
+        "value": np.concatenate([tree["value"] for _, tree in trees]).astype(np.float64),
+        "missing_left": np.concatenate([tree["missing_left"] for _, tree in trees]).astype(bool),
+        "roots": roots.astype(np.int64),
+        "tree_target": np.array([column for column, _ in trees], dtype=np.int64),
+        "tree_depth": np.array([tree["depth"] for _, tree in trees], dtype=np.int64),
+        "mean": np.array(mean, dtype=np.float64).astype(np.float32),
+        "scale": np.array(scale, dtype=np.float64).astype(np.float32)
+    }
+    max_depth = max(tree["depth"] for _, tree in trees)
+    return CompiledEnsemble(targets, arrays, baseline, max_depth)
+
+
+def _extract_trees(model):
+    # ([tree arrays], baseline) for one fitted ensemble
+    name = type(model).__name__
+    if getattr(model, 'loss', None) not in IDENTITY_LOSSES:
+        raise Exception(f"Can't compile {name} with loss {getattr(model, 'loss', None)!r}")
+
+    if name == 'GradientBoostingRegressor':
+        if isinstance(model.init_, str):  # init='zero'
+            baseline = 0.0
+        elif type(model.init_).__name__ == 'DummyRegressor':
+            baseline = float(np.ravel(model.init_.constant_)[0])
+        else:
+            raise Exception(f"Can't compile {name} with a {type(model.init_).__name__} init estimator")
+        trees = []
+        for estimator in model.estimators_[:, 0]:
+            tree = estimator.tree_
+            trees.append(_pack(tree.children_left == -1, tree.feature, tree.threshold,
+                               tree.children_left, tree.children_right,
+                               tree.value[:, 0, 0] * model.learning_rate,
+                               np.zeros(tree.node_count, dtype=bool), tree.max_depth))
+        return trees, baseline
+
+    if name == 'HistGradientBoostingRegressor':
+        trees = []
+        for (predictor,) in model._predictors:
+            nodes = predictor.nodes
+            if nodes['is_categorical'].any():
+                raise Exception(f"Can't compile {name} with categorical splits")
+            # Leaf values already include the learning rate
+            trees.append(_pack(nodes['is_leaf'].astype(bool), nodes['feature_idx'], nodes['num_threshold'],
+                               nodes['left'], nodes['right'], nodes['value'],
+                               nodes['missing_go_to_left'].astype(bool), int(nodes['depth'].max())))
+        return trees, float(np.ravel(model._baseline_prediction)[0])
+
+    raise Exception(f"Can't compile {name}, only gradient boosted trees are supported")
+
+
+def _pack(leaf, feature, threshold, left, right, value, missing_left, depth) -> dict:
+    # Leaves get a split every value falls through (x <= inf, NaN goes left)
+    # and point both children back at themselves
+    index = np.arange(len(leaf))
+    return {
+        "feature": np.where(leaf, 0, feature),
+        "threshold": np.where(leaf, np.inf, threshold),
+        "left": np.where(leaf, index, left),
+        "right": np.where(leaf, index, right),
+        "value": np.where(leaf, value, 0.0),
+        "missing_left": np.where(leaf, True, missing_left),
+        "depth": depth
+    }
+
+
+def verify(compiled: CompiledEnsemble, model_set, n_rows: int = 2048, seed: int = 0) -> float:
+    # Largest difference from sklearn's own predictions on probe rows: random
+    # rows around the training distribution (the scaler's mean +- 3 std), each
+    # with one feature put on a split threshold or up to PROBE_STEPS float32
+    # steps either side of it. Random values alone practically never land on a
+    # threshold, which is where a difference in scaling would show.
+    rng = np.random.default_rng(seed)
+    mean, scale = compiled.mean.astype(np.float64), compiled.scale.astype(np.float64)
+    X = (mean[0] + scale[0] * rng.uniform(-3, 3, size=(n_rows, mean.shape[1]))).astype(np.float32)
+
+    splits = np.flatnonzero(np.isfinite(compiled.threshold))
+    if len(splits):
+        nodes = rng.choice(splits, n_rows)
+        target = compiled.tree_target[np.searchsorted(compiled.roots, nodes, side='right') - 1]
+        feature = compiled.feature[nodes]
+        # The raw value scaling onto the threshold, then stepped off it
+        values = (mean[target, feature] + scale[target, feature] * compiled.threshold[nodes]).astype(np.float32)
+        steps = rng.integers(-PROBE_STEPS, PROBE_STEPS + 1, n_rows)
+        for step in range(1, PROBE_STEPS + 1):
+            values = np.where(steps >= step, np.nextafter(values, np.float32(np.inf)), values)
+            values = np.where(steps <= -step, np.nextafter(values, np.float32(-np.inf)), values)
+        X[np.arange(n_rows), feature] = values
+
+    predictions = compiled.predict(X)
+    worst = 0.0
+    for column, param in enumerate(compiled.targets):
+        expected = model_set.models[param].predict(model_set.scalers[param].transform(X))
+        worst = max(worst, float(np.max(np.abs(predictions[:, column] - expected) / np.maximum(1.0, np.abs(expected)))))
+    return worst
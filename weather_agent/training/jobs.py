@@ -0,0 +1,197 @@
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import threading
+import traceback
+from datetime import datetime
+
+from ..paths import DEFAULT_CACHE_DIR
+from ..sqlite_connection import connect
+
+DEFAULT_JOBS_DB = os.environ.get("WEATHER_AGENT_JOBS_DB", os.path.join(DEFAULT_CACHE_DIR, "jobs.sqlite3"))
+# A running job whose owner hasn't sent a heartbeat for this long is treated
+# as orphaned (its process died) and goes back in the queue
+LEASE_SECONDS = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    lat REAL NOT NULL,
+    lon REAL NOT NULL,
+    options TEXT NOT NULL,
+    status TEXT NOT NULL,
+    stage TEXT,
+    progress REAL NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT,
+    error TEXT,
+    result TEXT,
+    owner TEXT,
+    heartbeat_at REAL
+)
+"""
+# Columns added after the first release, for databases created before them
+ADDED_COLUMNS = {"owner": "TEXT", "heartbeat_at": "REAL"}
+
+
+class TrainingJobQueue:
+    # Training jobs persisted in SQLite and run by a small pool of worker threads,
+    # so /train returns immediately and prediction traffic is never blocked.
+    #
+    # Jobs are of kind 'train' (full retrain) or 'refresh' (incremental).
+    # `run_job(job, progress)` does the actual work; `progress(stage, fraction)`
+    # records how far along it is. Several processes can share one database:
+    # a job is claimed inside a write transaction, so only one worker runs it,
+    # and it records which process owns it. Each process renews a heartbeat
+    # on its running jobs; jobs whose heartbeat is older than `lease_seconds`
+    # (their process crashed) are put back in the queue by whichever worker
+    # claims next.
+    def __init__(self, run_job, db_path: str = None, workers: int = 1, poll_interval: float = 1.0,
+                 lease_seconds: float = LEASE_SECONDS):
+        self.run_job = run_job
+        self.db_path = db_path or DEFAULT_JOBS_DB
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        # pids repeat across containers and restarts, so add something unique
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._threads = []
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(SCHEMA)
+            columns = {row["name"] for row in db.execute("PRAGMA table_info(jobs)")}
+            for column, kind in ADDED_COLUMNS.items():
+                if column not in columns:
+                    try:
+                        db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+                    except sqlite3.OperationalError:
+                        pass  # another process added it first
+
+    def start(self):
+        if self._threads:
+            return
+        self._stop.clear()
+        targets = [(self._work, f"training-worker-{i}") for i in range(self.workers)]
+        targets.append((self._heartbeat, "training-heartbeat"))
+        for target, name in targets:
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = None):
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, lat: float, lon: float, kind: str = "train", options: dict = None) -> str:
+        options_json = json.dumps(options or {}, sort_keys=True)
+        with self._connect() as db:
+            # The same retrain already waiting in the queue covers this request
+            row = db.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' AND kind = ? AND lat = ? AND lon = ? AND options = ?",
+                (kind, lat, lon, options_json)
+            ).fetchone()
+            if row:
+                return row["id"]
+
+            job_id = uuid.uuid4().hex
+            db.execute(
+                "INSERT INTO jobs (id, kind, lat, lon, options, status, created_at) VALUES (?, ?, ?, ?, ?, 'queued', ?)",
+                (job_id, kind, lat, lon, options_json, datetime.now().isoformat())
+            )
+        self._wake.set()
+        return job_id
+
+    def get(self, job_id: str):
+        with self._connect() as db:
+            row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list(self, status: str = None, limit: int = 100) -> list:
+        query, args = "SELECT * FROM jobs", ()
+        if status:
+            query, args = query + " WHERE status = ?", (status,)
+        with self._connect() as db:
+            rows = db.execute(query + " ORDER BY created_at DESC LIMIT ?", args + (limit,)).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def _work(self):
+        while not self._stop.is_set():
+            job = self._claim()
+            if job is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+
+            def progress(stage: str, fraction: float, job_id=job["id"]):
+                self._update(job_id, stage=stage, progress=round(fraction, 3))
+
+            try:
+                result = self.run_job(job, progress)
+                self._update(job["id"], status="succeeded", stage="done", progress=1.0,
+                             finished_at=datetime.now().isoformat(), result=json.dumps(result, default=str))
+            except Exception as e:
+                print(f"Training job {job['id']} failed: {e}")
+                traceback.print_exc()
+                self._update(job["id"], status="failed", finished_at=datetime.now().isoformat(), error=str(e))
+
+    def _heartbeat(self):
+        # Renews the lease on every job this process is running
+        while not self._stop.wait(self.lease_seconds / 3):
+            try:
+                with self._connect() as db:
+                    db.execute("UPDATE jobs SET heartbeat_at = ? WHERE status = 'running' AND owner = ?",
+                               (time.time(), self.owner))
+            except sqlite3.Error as e:
+                print(f"Training job heartbeat failed: {e}")
+
+    def _claim(self):
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            # Jobs whose owner stopped renewing their lease go back in the queue
+            db.execute(
+                "UPDATE jobs SET status = 'queued', stage = NULL, progress = 0, owner = NULL, heartbeat_at = NULL "
+                "WHERE status = 'running' AND (heartbeat_at IS NULL OR heartbeat_at < ?)",
+                (time.time() - self.lease_seconds,)
+            )
+            row = db.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1").fetchone()
+            if row is None:
+                return None
+            db.execute(
+                "UPDATE jobs SET status = 'running', stage = 'starting', started_at = ?, owner = ?, heartbeat_at = ? "
+                "WHERE id = ?",
+                (datetime.now().isoformat(), self.owner, time.time(), row["id"])
+            )
+        return self._to_dict(row)
+
+    def _update(self, job_id: str, **fields):
+        # Only while this process still owns the job; if its lease lapsed and
+        # another worker took it over, that worker's updates win
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as db:
+            db.execute(f"UPDATE jobs SET {assignments} WHERE id = ? AND owner = ?",
+                       tuple(fields.values()) + (job_id, self.owner))
+
+    def _connect(self):
+        return connect(self.db_path, timeout=30, row_factory=sqlite3.Row)
+
+    def _to_dict(self, row) -> dict:
+        job = dict(row)
+        job["options"] = json.loads(job["options"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        if job["started_at"]:
+            end = datetime.fromisoformat(job["finished_at"]) if job["finished_at"] else datetime.now()
+            job["elapsed_seconds"] = round((end - datetime.fromisoformat(job["started_at"])).total_seconds(), 3)
+        return job
+
@@ -0,0 +1,249 @@
+import os
+import json
+import time
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import joblib
+import numpy as np
+
+from .compiled_ensemble import CompiledEnsemble, compile_model_set, verify, TOLERANCE
+
+DEFAULT_MODEL_DIR = os.environ.get(
+    "WEATHER_AGENT_MODEL_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "models", "saved")
+)
+
+
+class ModelSet:
+    # The fitted models + scalers for one location, swapped in and out as a unit.
+    # `compiled` is the same ensembles flattened into arrays (None for models
+    # that can't be compiled).
+    def __init__(self, models: dict, scalers: dict, version: str = None, metadata: dict = None,
+                 compiled: CompiledEnsemble = None):
+        self.models = models
+        self.scalers = scalers
+        self.version = version
+        self.metadata = metadata or {}
+        self.compiled = compiled
+
+    def is_trained(self) -> bool:
+        return all(hasattr(model, 'n_features_in_') for model in self.models.values())
+
+    def predict(self, X) -> dict:
+        # {param: predictions} for unscaled feature rows. Point forecasts go
+        # through the compiled ensemble; big batches (micro forecasts) are
+        # faster in sklearn's own traversal, and it only matches sklearn on
+        # float32 rows (what the feature code produces).
+        X = np.asarray(X)
+        if self.compiled is not None and X.dtype == np.float32 and self.compiled.prefers(len(X)):
+            predictions = self.compiled.predict(X)
+            return {param: predictions[:, column] for column, param in enumerate(self.compiled.targets)}
+        return {param: model.predict(self.scalers[param].transform(X)) for param, model in self.models.items()}
+
+
+class ModelRegistry:
+    # Versioned model files on disk:
+    #   <root>/<location>/<window>/v0001/{param}_model.joblib, {param}_scaler.joblib, manifest.json
+    #                                    compiled.json, compiled_*.npy (see compiled_ensemble.py)
+    #   <root>/<location>/CURRENT  -> which window/version is live
+    # Several workers can point at the same root; each notices a new CURRENT
+    # and swaps to it on its next request.
+    #
+    # Loaded model sets are kept in an LRU cache bounded by `max_cache_bytes`
+    # (sized by their files on disk); the least recently used location is
+    # dropped first and reloaded from disk when it's asked for again.
+    def __init__(self, root: str = None, check_interval: float = 5.0, max_cache_bytes: int = None):
+        self.root = root or DEFAULT_MODEL_DIR
+        self.check_interval = check_interval
+        if max_cache_bytes is None:
+            max_cache_bytes = int(os.environ.get("WEATHER_AGENT_MODEL_CACHE_MB", "512")) * 2 ** 20
+        self.max_cache_bytes = max_cache_bytes
+        self._loaded = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def location_key(lat: float, lon: float) -> str:
+        return f"{round(lat, 2):.2f}_{round(lon, 2):.2f}"
+
+    def save(self, location_key: str, window: str, model_set: ModelSet) -> str:
+        window_dir = os.path.join(self.root, location_key, window)
+        os.makedirs(window_dir, exist_ok=True)
+
+        while True:
+            version = f"v{self._next_version_number(window_dir):04d}"
+            version_dir = os.path.join(window_dir, version)
+            # A fresh directory per attempt: threads of one process saving the
+            # same location must not write into each other's files
+            tmp_dir = tempfile.mkdtemp(prefix=f"{version}.", suffix=".tmp", dir=window_dir)
+
+            for param, model in model_set.models.items():
+                joblib.dump(model, os.path.join(tmp_dir, f"{param}_model.joblib"))
+                joblib.dump(model_set.scalers[param], os.path.join(tmp_dir, f"{param}_scaler.joblib"))
+            compiled = self._compile(model_set)
+            if compiled is not None:
+                compiled.save(tmp_dir)
+
+            manifest = dict(model_set.metadata)
+            manifest.update({
+                "location": location_key,
+                "window": window,
+                "version": version,
+                "parameters": list(model_set.models),
+                "compiled": compiled is not None,
+                "created_at": datetime.now().isoformat()
+            })
+            with open(os.path.join(tmp_dir, "manifest.json"), "w") as f:
+                json.dump(manifest, f, indent=2)
+
+            # Renaming the directory publishes the version atomically; if another
+            # process took this number first, try the next one
+            try:
+                os.rename(tmp_dir, version_dir)
+                break
+            except OSError:
+                self._remove_dir(tmp_dir)
+
+        self._write_pointer(location_key, {"window": window, "version": version})
+        model_set.version = f"{window}/{version}"
+        model_set.metadata = manifest
+        model_set.compiled = compiled
+
+        # This process already has the fitted models in memory, so swap them in directly
+        with self._lock:
+            self._remember(location_key, model_set, time.monotonic())
+        return model_set.version
+
+    def current_version(self, location_key: str):
+        pointer = self._read_pointer(location_key)
+        if pointer is None:
+            return None
+        return f"{pointer['window']}/{pointer['version']}"
+
+    def get(self, location_key: str):
+        # Returns the live ModelSet for a location, loading it on first use and
+        # reloading when CURRENT moves to a new version
+        now = time.monotonic()
+        cached = self._loaded.get(location_key)
+        if cached and now - cached["checked_at"] < self.check_interval:
+            with self._lock:
+                if location_key in self._loaded:
+                    self._loaded.move_to_end(location_key)
+            return cached["model_set"]
+
+        version = self.current_version(location_key)
+        if version is None:
+            return cached["model_set"] if cached else None
+
+        with self._lock:
+            cached = self._loaded.get(location_key)
+            if cached is None or cached["model_set"].version != version:
+                model_set = self.load(location_key, version)
+            else:
+                model_set = cached["model_set"]
+            self._remember(location_key, model_set, now)
+        return model_set
+
+    def cache_stats(self) -> dict:
+        with self._lock:
+            return {
+                "locations": list(self._loaded),
+                "bytes": sum(entry["bytes"] for entry in self._loaded.values()),
+                "max_bytes": self.max_cache_bytes
+            }
+
+    def load(self, location_key: str, version: str = None, mmap_mode: str = 'r') -> ModelSet:
+        version = version or self.current_version(location_key)
+        if version is None:
+            raise Exception(f"No trained models found for {location_key}")
+        version_dir = os.path.join(self.root, location_key, version)
+
+        with open(os.path.join(version_dir, "manifest.json")) as f:
+            manifest = json.load(f)
+
+        # mmap_mode lets workers share the numpy payloads through the page cache
+        models, scalers = {}, {}
+        for param in manifest["parameters"]:
+            models[param] = joblib.load(os.path.join(version_dir, f"{param}_model.joblib"), mmap_mode=mmap_mode)
+            scalers[param] = joblib.load(os.path.join(version_dir, f"{param}_scaler.joblib"), mmap_mode=mmap_mode)
+
+        model_set = ModelSet(models, scalers, version=version, metadata=manifest)
+        model_set.compiled = CompiledEnsemble.load(version_dir, mmap_mode=mmap_mode)
+        if model_set.compiled is None and "compiled" not in manifest:
+            # Saved before models were compiled; compile in memory for this process
+            model_set.compiled = self._compile(model_set)
+        return model_set
+
+    def _compile(self, model_set: ModelSet):
+        # The compiled ensemble, or None when the models aren't boosted trees or
+        # the compiled predictions don't match sklearn's
+        try:
+            compiled = compile_model_set(model_set)
+        except Exception:
+            return None
+        error = verify(compiled, model_set)
+        if error > TOLERANCE:
+            print(f"Warning: compiled models differ from sklearn by {error:.2e}, predicting with sklearn")
+            return None
+        return compiled
+
+    def activate(self, location_key: str, version: str):
+        # Point CURRENT at an existing version (e.g. to roll back)
+        window, version_name = version.split("/")
+        if not os.path.isdir(os.path.join(self.root, location_key, window, version_name)):
+            raise Exception(f"Unknown model version {version} for {location_key}")
+        self._write_pointer(location_key, {"window": window, "version": version_name})
+
+    def list_versions(self, location_key: str) -> list:
+        location_dir = os.path.join(self.root, location_key)
+        if not os.path.isdir(location_dir):
+            return []
+        versions = []
+        for window in sorted(os.listdir(location_dir)):
+            window_dir = os.path.join(location_dir, window)
+            if not os.path.isdir(window_dir):
+                continue
+            versions.extend(f"{window}/{v}" for v in sorted(os.listdir(window_dir)) if not v.endswith(".tmp"))
+        return versions
+
+    def _remember(self, location_key: str, model_set: ModelSet, checked_at: float):
+        # Callers hold self._lock
+        self._loaded[location_key] = {
+            "model_set": model_set,
+            "checked_at": checked_at,
+            "bytes": self._version_bytes(location_key, model_set.version)
+        }
+        self._loaded.move_to_end(location_key)
+        # Evict least recently used sets until we're under budget (always keep the newest)
+        while len(self._loaded) > 1 and sum(e["bytes"] for e in self._loaded.values()) > self.max_cache_bytes:
+            self._loaded.popitem(last=False)
+
+    def _version_bytes(self, location_key: str, version: str) -> int:
+        version_dir = os.path.join(self.root, location_key, version)
+        return sum(os.path.getsize(os.path.join(version_dir, name)) for name in os.listdir(version_dir))
+
+    def _next_version_number(self, window_dir: str) -> int:
+        numbers = [int(name[1:]) for name in os.listdir(window_dir)
+                   if name.startswith("v") and name[1:].isdigit()]
+        return max(numbers, default=0) + 1
+
+    def _write_pointer(self, location_key: str, pointer: dict):
+        path = os.path.join(self.root, location_key, "CURRENT")
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(pointer, f)
+        os.replace(tmp_path, path)
+
+    def _read_pointer(self, location_key: str):
+        try:
+            with open(os.path.join(self.root, location_key, "CURRENT")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _remove_dir(self, path: str):
+        for name in os.listdir(path):
+            os.remove(os.path.join(path, name))
+        os.rmdir(path)
@@ -1,48 +1,175 @@
+import time
+
+import numpy as np
 import pandas as pd
-from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestRegressor
-import joblib
+from sklearn.linear_model import SGDRegressor
+from sklearn.preprocessing import StandardScaler
+
+from .model_registry import ModelRegistry, ModelSet
+from .parallel_trainer import fit_targets
+from .streaming import (FeatureSpool, Reservoir, StandardizedTargetRegressor,
+                        iter_feature_chunks, iter_frame_chunks, iter_location_chunks)
+from ..weather_predictor import WeatherPredictor
+from ..feature_engine import FEATURE_NAMES
+from ..instrumentation import span, timed
 
 class WeatherModelTrainer:
-    def __init__(self):
-        self.models = {
-            'temperature': RandomForestRegressor(),
-            'precipitation': RandomForestRegressor(),
-            'humidity': RandomForestRegressor(),
-            'wind_speed': RandomForestRegressor()
+    # Trains one model set over many locations and years of hourly history
+    # without holding it in memory. History is read a location-month at a time
+    # (the history cache's partitions), features are computed once per chunk
+    # with the predictor's batch feature code and shared by all four targets,
+    # and only bounded state is kept between chunks:
+    #   'hist' / 'gbr': a uniform reservoir sample of at most max_samples rows,
+    #                   fitted once at the end
+    #   'sgd':          a float32 feature spool on disk, fitted with partial_fit
+    #                   over `epochs` passes; every row is used
+    # The most recent CALIBRATION_FRACTION of the time range is held out (up to
+    # calibration_samples rows) to calibrate the prediction intervals.
+    ESTIMATORS = ('hist', 'gbr', 'sgd')
+
+    def __init__(self, registry: ModelRegistry = None, predictor: WeatherPredictor = None,
+                 estimator: str = 'hist', max_samples: int = 1_000_000, calibration_samples: int = 100_000,
+                 chunk_months: int = 1, epochs: int = 5, spool_dir: str = None, n_jobs: int = None,
+                 seed: int = 0):
+        if estimator not in self.ESTIMATORS:
+            raise Exception(f"Unknown estimator {estimator}, expected one of {self.ESTIMATORS}")
+        self.registry = registry or ModelRegistry()
+        self.predictor = predictor or WeatherPredictor(self.registry)
+        self.parameters = list(self.predictor.PARAMETERS)
+        self.estimator = estimator
+        self.max_samples = max_samples
+        self.calibration_samples = calibration_samples
+        self.chunk_months = chunk_months
+        self.epochs = epochs
+        self.spool_dir = spool_dir
+        self.n_jobs = n_jobs
+        self.seed = seed
+
+    def train(self, data: pd.DataFrame, location_key: str = "default", window: str = None, progress=None):
+        # One location's history that's already in a frame (timestamp column)
+        calibration_start = self._calibration_start(data['timestamp'].min(), data['timestamp'].max())
+        chunks = iter_frame_chunks(data, 'timestamp', self.chunk_months)
+        model_set = self.fit_chunks(chunks, calibration_start, progress=progress)
+        window = window or f"{data['timestamp'].min():%Y%m%d}-{data['timestamp'].max():%Y%m%d}"
+        return self.registry.save(location_key, window, model_set)
+
+    def train_locations(self, locations: list, start_date: str, end_date: str, location_key: str = "default",
+                        window: str = None, progress=None):
+        # locations: (lat, lon) pairs or mapper regions ({'lat', 'lon', ...})
+        calibration_start = self._calibration_start(pd.Timestamp(start_date),
+                                                    pd.Timestamp(end_date) + pd.Timedelta(days=1))
+        months = len(pd.period_range(start_date, end_date, freq="M"))
+        total = len(locations) * -(-months // self.chunk_months)
+        chunks = iter_location_chunks(self.predictor.data_fetcher, locations, start_date, end_date,
+                                      self.chunk_months)
+        model_set = self.fit_chunks(chunks, calibration_start, total=total, progress=progress)
+        model_set.metadata.update(start_date=start_date, end_date=end_date, n_locations=len(locations))
+        window = window or f"{pd.Timestamp(start_date):%Y%m%d}-{pd.Timestamp(end_date):%Y%m%d}"
+        return self.registry.save(location_key, window, model_set)
+
+    @timed("train.streaming")
+    def fit_chunks(self, chunks, calibration_start: int, total: int = None, progress=None) -> ModelSet:
+        # chunks: (location key, HourlySeries) in location, then time, order.
+        # Rows at or after calibration_start (epoch seconds) are held out.
+        progress = progress or (lambda stage, fraction: None)
+        n_features, n_targets = len(FEATURE_NAMES), len(self.parameters)
+        scaler = StandardScaler()
+        target_scaler = StandardScaler()
+        calibration = Reservoir(self.calibration_samples, n_features, n_targets, self.seed + 1)
+        sample = spool = None
+        if self.estimator == 'sgd':
+            spool = FeatureSpool(n_features, n_targets, self.spool_dir)
+        else:
+            sample = Reservoir(self.max_samples, n_features, n_targets, self.seed)
+
+        try:
+            # One streaming pass: features for each chunk, computed once
+            n_rows = 0
+            feature_chunks = iter_feature_chunks(chunks, self.predictor._prepare_features, self.parameters)
+            for i, (_, times, X, Y) in enumerate(feature_chunks):
+                held_out = times >= calibration_start
+                calibration.add(X[held_out], Y[held_out])
+                X, Y = X[~held_out], Y[~held_out]
+                if not len(X):
+                    continue
+                scaler.partial_fit(X)
+                n_rows += len(X)
+                if spool is not None:
+                    target_scaler.partial_fit(Y)
+                    spool.append(X, Y)
+                else:
+                    sample.add(X, Y)
+                if total:
+                    progress("features", 0.05 + 0.55 * min((i + 1) / total, 1.0))
+            if not n_rows:
+                raise Exception("No history to train on")
+
+            progress("fitting", 0.6)
+            if spool is not None:
+                with span("train.fit"):
+                    models, timings = self._fit_sgd(spool, scaler, target_scaler, progress)
+                n_fit = n_rows
+            else:
+                X, Y = sample.sample()
+                X = scaler.transform(X).astype(np.float32)
+                try:
+                    with span("train.fit"):
+                        models, timings = fit_targets(X, {param: Y[:, j] for j, param in enumerate(self.parameters)},
+                                                      self.estimator, self.estimator == 'hist', self.n_jobs)
+                except Exception as e:
+                    raise Exception(f"Error training models: {str(e)}")
+                n_fit = len(X)
+        finally:
+            if spool is not None:
+                spool.close()
+
+        progress("calibrating", 0.9)
+        intervals = None
+        if len(calibration):
+            X, Y = calibration.sample()
+            # A random sample of held-out rows, so only lead 0 is calibrated
+            intervals = self.predictor._calibrate_intervals(
+                models, scaler, X.astype(np.float32),
+                {param: Y[:, j] for j, param in enumerate(self.parameters)}
+            )
+
+        model_set = ModelSet(models, {param: scaler for param in models})
+        model_set.metadata = {
+            "n_samples": n_rows,
+            "n_fit": n_fit,
+            "estimator": self.estimator,
+            "streaming": True,
+            "fit_seconds": {param: round(seconds, 3) for param, seconds in timings.items()},
+            "intervals": intervals
         }
-        self.model_path = 'weather_agent/models/saved/'
-    
-    def train(self, data: pd.DataFrame):
-        for parameter, model in self.models.items():
-            print(f"Training {parameter} model...")
-            
-            # Prepare features
-            X = self._prepare_features(data)
-            y = data[parameter]
-            
-            # Split data
-            X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2)
-            
-            # Train model
-            model.fit(X_train, y_train)
-            
-            # Save model
-            joblib.dump(model, f"{self.model_path}{parameter}_model.pkl")
-            
-            # Evaluate
-            score = model.score(X_test, y_test)
-            print(f"{parameter} model R² score: {score:.3f}")
-    
-    def _prepare_features(self, data: pd.DataFrame):
-        features = pd.DataFrame({
-            'hour': data['timestamp'].dt.hour,
-            'day': data['timestamp'].dt.day,
-            'month': data['timestamp'].dt.month,
-            'cloud_cover': data['cloud_cover'],
-            'satellite_temperature': data['satellite_temperature'],
-            'precipitation_intensity': data['precipitation_intensity'],
-            'ground_temperature': data['ground_temperature'],
-            'soil_moisture': data['soil_moisture']
-        })
-        return features 
\ No newline at end of file
+        return model_set
+
+    def _fit_sgd(self, spool: FeatureSpool, scaler: StandardScaler, target_scaler: StandardScaler, progress):
+        # Every target learns from the same spooled feature blocks; targets are
+        # standardized so one learning rate suits all of them
+        rng = np.random.default_rng(self.seed)
+        models = {param: SGDRegressor(penalty='l2', alpha=1e-5, learning_rate='invscaling', eta0=0.01,
+                                      random_state=self.seed)
+                  for param in self.parameters}
+        timings = dict.fromkeys(self.parameters, 0.0)
+        for epoch in range(self.epochs):
+            for X, Y in spool.blocks(rng=rng):
+                X = scaler.transform(X)
+                Y = target_scaler.transform(Y)
+                for j, param in enumerate(self.parameters):
+                    started = time.perf_counter()
+                    models[param].partial_fit(X, Y[:, j])
+                    timings[param] += time.perf_counter() - started
+            progress("fitting", 0.6 + 0.3 * (epoch + 1) / self.epochs)
+
+        models = {
+            param: StandardizedTargetRegressor(model, target_scaler.mean_[j], target_scaler.scale_[j])
+            for j, (param, model) in enumerate(models.items())
+        }
+        return models, timings
+
+    def _calibration_start(self, start, end) -> int:
+        # Epoch seconds from which rows are held out for interval calibration
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        cutoff = end - (end - start) * self.predictor.CALIBRATION_FRACTION
+        return int(cutoff.floor("h").timestamp())
@@ -0,0 +1,118 @@
+import os
+import copy
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+ESTIMATORS = ('gbr', 'hist')
+
+
+def build_regressor(estimator: str = 'gbr', early_stopping: bool = False):
+    # sklearn is only imported once something is actually trained
+    from sklearn.ensemble import GradientBoostingRegressor, HistGradientBoostingRegressor
+
+    if estimator == 'gbr':
+        if early_stopping:
+            return GradientBoostingRegressor(n_iter_no_change=10, validation_fraction=0.1)
+        return GradientBoostingRegressor()
+    if estimator == 'hist':
+        return HistGradientBoostingRegressor(max_iter=500, early_stopping=early_stopping)
+    raise Exception(f"Unknown estimator {estimator}, expected one of {ESTIMATORS}")
+
+
+def fit_targets(X: np.ndarray, targets: dict, estimator: str = 'gbr', early_stopping: bool = False,
+                n_jobs: int = None):
+    # Fit one regressor per target on the same (already scaled) feature matrix.
+    # With more than one job the targets are fitted in a process pool; X and the
+    # targets are placed in shared memory once and the workers map them
+    # read-only instead of each receiving a pickled copy.
+    # Returns ({target: fitted model}, {target: wall seconds}).
+    n_jobs = min(len(targets), n_jobs or os.cpu_count() or 1)
+    if n_jobs <= 1:
+        models, timings = {}, {}
+        for param, y in targets.items():
+            _, models[param], timings[param] = _fit_target(param, X, y, estimator, early_stopping)
+        return models, timings
+
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    Y = np.ascontiguousarray(np.column_stack(list(targets.values())), dtype=np.float64)
+    shared = []
+    try:
+        shared.append(_to_shared_memory(X))
+        shared.append(_to_shared_memory(Y))
+        (_, x_spec), (_, y_spec) = shared
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            futures = [
+                pool.submit(_fit_shared_target, param, x_spec, y_spec, column, estimator, early_stopping)
+                for column, param in enumerate(targets)
+            ]
+            results = [future.result() for future in futures]
+    finally:
+        for shm, _ in shared:
+            shm.close()
+            shm.unlink()
+
+    models = {param: model for param, model, _ in results}
+    timings = {param: seconds for param, _, seconds in results}
+    return models, timings
+
+
+def can_warm_start(model) -> bool:
+    # Only GradientBoostingRegressor can be extended on new data: a warm-started
+    # HistGradientBoostingRegressor re-bins the new X and scores its old trees
+    # against the new bins, so the added stages fit the wrong residuals
+    return type(model).__name__ == 'GradientBoostingRegressor'
+
+
+def warm_start_targets(models: dict, X: np.ndarray, targets: dict, extra_estimators: int = 10):
+    # Extend copies of fitted boosted models with `extra_estimators` more
+    # stages fitted to (X, y); the existing stages are kept as they are, so the
+    # cost depends on len(X), not on how much the models were first trained
+    # on. The given models are left untouched (they may be serving).
+    # Returns ({target: extended model}, {target: wall seconds}).
+    extended, timings = {}, {}
+    for param, y in targets.items():
+        started = time.perf_counter()
+        model = copy.deepcopy(models[param])
+        if not can_warm_start(model):
+            raise Exception(f"Can't warm start {type(model).__name__}")
+        # No early stopping: a few new hours are too few to hold out from
+        model.set_params(warm_start=True, n_estimators=len(model.estimators_) + extra_estimators,
+                         n_iter_no_change=None)
+        model.fit(X, y)
+        extended[param], timings[param] = model, time.perf_counter() - started
+    return extended, timings
+
+
+def _fit_target(param, X, y, estimator, early_stopping):
+    started = time.perf_counter()
+    model = build_regressor(estimator, early_stopping)
+    model.fit(X, y)
+    return param, model, time.perf_counter() - started
+
+
+def _fit_shared_target(param, x_spec, y_spec, column, estimator, early_stopping):
+    x_shm, X = _from_shared_memory(x_spec)
+    y_shm, Y = _from_shared_memory(y_spec)
+    try:
+        return _fit_target(param, X, Y[:, column], estimator, early_stopping)
+    finally:
+        del X, Y
+        x_shm.close()
+        y_shm.close()
+
+
+def _to_shared_memory(array: np.ndarray):
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+    return shm, (shm.name, array.shape, array.dtype.str)
+
+
+def _from_shared_memory(spec):
+    name, shape, dtype = spec
+    shm = shared_memory.SharedMemory(name=name)
+    array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+    array.flags.writeable = False
+    return shm, array
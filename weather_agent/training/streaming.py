@@ -0,0 +1,175 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from ..hourly_series import HourlySeries
+from ..history_store import LocationHistory
+
+# Hours of the previous chunk carried into the next one, so the 24h rolling
+# features and the pressure change continue across chunk edges exactly as if
+# the whole history had been one block
+CARRY_HOURS = 24
+
+
+def month_ranges(start_date: str, end_date: str, months: int = 1):
+    # (start, end) date strings covering [start_date, end_date] in blocks of
+    # whole calendar months, matching the history cache's monthly partitions
+    start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+    periods = pd.period_range(start, end, freq="M")
+    for i in range(0, len(periods), months):
+        block = periods[i:i + months]
+        first = max(block[0].start_time, start)
+        last = min(block[-1].end_time.normalize(), end)
+        yield first.strftime("%Y-%m-%d"), last.strftime("%Y-%m-%d")
+
+
+def iter_location_chunks(fetcher, locations: list, start_date: str, end_date: str, months: int = 1):
+    # (location key, HourlySeries) per location per block of months, location
+    # by location so consecutive chunks of one location follow each other.
+    # Each chunk is read from (or fetched into) the history cache on its own,
+    # so only one chunk is ever in memory. A fetcher with a cache fills it
+    # first, a block of months at a time for all locations together, so a
+    # cold cache costs a request per block instead of per location and block.
+    if getattr(fetcher, "cache", None) is not None and hasattr(fetcher, "prefetch_locations"):
+        for first, last in month_ranges(start_date, end_date, months):
+            fetcher.prefetch_locations(locations, first, last)
+    for location in locations:
+        lat, lon = (location["lat"], location["lon"]) if isinstance(location, dict) else location
+        key = (round(float(lat), 4), round(float(lon), 4))
+        for first, last in month_ranges(start_date, end_date, months):
+            yield key, fetcher.fetch_historical_series(lat, lon, first, last)
+
+
+def iter_frame_chunks(data: pd.DataFrame, time_column: str = 'timestamp', months: int = 1):
+    # Same chunks from a single location's frame that's already in memory
+    data = data.sort_values(time_column)
+    month_index = data[time_column].dt.year * 12 + data[time_column].dt.month
+    for _, part in data.groupby((month_index - month_index.min()) // months, sort=True):
+        yield None, HourlySeries.from_frame(part, time_column)
+
+
+def iter_feature_chunks(chunks, prepare_features, parameters: list):
+    # Turns history chunks into (key, times, features, targets) float32 blocks,
+    # computing the features once for every target. The last CARRY_HOURS of a
+    # location's chunk are prepended to its next chunk and dropped again after
+    # the features are computed. Only hours where every target was observed
+    # are yielded; the ones fill_gaps() filled in still feed the features.
+    carry, carry_key = None, None
+    for key, series in chunks:
+        if not len(series):
+            continue
+        missing = [param for param in parameters if param not in series]
+        if missing:
+            raise Exception(f"Required columns {missing} not found in data. Available columns: {series.names()}")
+        observed = np.ones(len(series), dtype=bool)
+        for param in parameters:
+            observed &= ~np.isnan(series[param])
+
+        if carry is not None and carry_key == key:
+            history = LocationHistory.from_series(carry)
+            history.write(series)
+        else:
+            history = LocationHistory.from_series(series)
+        history.fill_gaps()
+        first = history.window(series.times[0])[0]
+
+        times = history.times[first:]
+        usable = np.isin(times, series.times[observed])
+        features = prepare_features(history)[first:][usable]
+        targets = np.empty((len(features), len(parameters)), dtype=np.float32)
+        for j, param in enumerate(parameters):
+            targets[:, j] = history.column(param)[first:][usable]
+        if len(features):
+            yield key, times[usable], features, targets
+
+        carry, carry_key = history.to_series(max(history.length - CARRY_HOURS, 0)), key
+
+
+class Reservoir:
+    # Uniform random sample of at most `capacity` rows out of a stream of any
+    # length (algorithm R, vectorized over a chunk at a time)
+    def __init__(self, capacity: int, n_features: int, n_targets: int, seed: int = 0):
+        self.capacity = capacity
+        self.seen = 0
+        self.X = np.empty((capacity, n_features), dtype=np.float32)
+        self.Y = np.empty((capacity, n_targets), dtype=np.float32)
+        self._rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        return min(self.seen, self.capacity)
+
+    def add(self, X: np.ndarray, Y: np.ndarray):
+        index = self.seen + np.arange(len(X))
+        slots = index.copy()
+        full = index >= self.capacity
+        # Row t replaces a random slot with probability capacity / (t + 1)
+        slots[full] = (self._rng.random(int(full.sum())) * (index[full] + 1)).astype(np.int64)
+        keep = slots < self.capacity
+        self.X[slots[keep]] = X[keep]
+        self.Y[slots[keep]] = Y[keep]
+        self.seen += len(X)
+
+    def sample(self):
+        return self.X[:len(self)], self.Y[:len(self)]
+
+
+class FeatureSpool:
+    # Feature and target rows appended to flat float32 files, so training
+    # passes after the first re-read them (memory-mapped, a block at a time)
+    # instead of recomputing features. The files are removed on close().
+    def __init__(self, n_features: int, n_targets: int, directory: str = None):
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.directory = tempfile.mkdtemp(prefix="feature_spool_", dir=directory)
+        self.widths = (n_features, n_targets)
+        self.paths = (os.path.join(self.directory, "features.f32"), os.path.join(self.directory, "targets.f32"))
+        self._files = [open(path, "wb") for path in self.paths]
+        self.rows = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def append(self, X: np.ndarray, Y: np.ndarray):
+        for f, block in zip(self._files, (X, Y)):
+            np.ascontiguousarray(block, dtype=np.float32).tofile(f)
+        self.rows += len(X)
+
+    def blocks(self, rows: int = 65536, rng: np.random.Generator = None):
+        # (X, Y) blocks of up to `rows` rows; with `rng` the block order is shuffled
+        for f in self._files:
+            f.flush()
+        if not self.rows:
+            return
+        X, Y = (np.memmap(path, dtype=np.float32, mode="r", shape=(self.rows, width))
+                for path, width in zip(self.paths, self.widths))
+        starts = np.arange(0, self.rows, rows)
+        if rng is not None:
+            rng.shuffle(starts)
+        for start in starts:
+            yield X[start:start + rows], Y[start:start + rows]
+
+    def close(self):
+        for f in self._files:
+            f.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class StandardizedTargetRegressor:
+    # SGD is fitted on standardized targets; predict() returns original units
+    def __init__(self, model, mean: float, scale: float):
+        self.model = model
+        self.mean = float(mean)
+        self.scale = float(scale)
+
+    @property
+    def n_features_in_(self):
+        return self.model.n_features_in_
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return self.model.predict(X) * self.scale + self.mean
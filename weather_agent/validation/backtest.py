@@ -0,0 +1,280 @@
+import os
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .metrics import error_sums, error_metrics
+from ..data_cache import HistoryCache
+from ..data_fetcher import OpenMeteoFetcher
+from ..history_store import LocationHistory
+from ..training.model_registry import ModelRegistry
+from ..weather_predictor import WeatherPredictor
+
+HOUR = 3600
+# Sufficient statistics kept per (location, origin month, horizon, parameter);
+# every metric over any grouping is computed from their sums
+SUMS = ["n", "sum_error", "sum_sq_error", "sum_abs_error", "sum_sq_error_reference", "n_inside"]
+
+
+class WalkForwardBacktest:
+    # Replays cached history as if forecasts had been issued at every
+    # `origin_step` hours between start and end: at each origin the feature row
+    # of that hour is moved to each horizon's valid hour and scored against what
+    # was observed there, exactly as predict_batch would have forecast it.
+    #
+    # Work is split into (location, block of block_days origins) tasks run in a
+    # process pool; each worker loads the model set once (memory-mapped), reads
+    # its slice of history from the local cache and returns only summed errors.
+    # Skill is measured against an hour-of-day x month climatology built from
+    # the climatology_days before `start`, so it never sees the scored hours.
+    def __init__(self, registry: ModelRegistry = None, cache_dir: str = None, horizons=range(1, 25),
+                 origin_step: int = 1, block_days: int = 30, climatology_days: int = 730, n_jobs: int = None):
+        self.registry = registry or ModelRegistry()
+        self.cache_dir = cache_dir
+        self.horizons = np.asarray(list(horizons), dtype=np.int64)
+        self.origin_step = origin_step
+        self.block_days = block_days
+        self.climatology_days = climatology_days
+        self.n_jobs = n_jobs or os.cpu_count() or 1
+        self.predictor = WeatherPredictor(self.registry)
+
+    def run(self, locations: list, start_date: str, end_date: str, model_key: str = None,
+            version: str = None, output: str = None) -> pd.DataFrame:
+        # locations: mapped names ("mumbai.bandra"), (lat, lon) or {"lat", "lon", "name"}.
+        # With model_key every location is scored with that model set (the
+        # current version unless `version` is given), otherwise each with the
+        # one that would serve it live.
+        started = time.perf_counter()
+        locations = [self.predictor.normalize_location(location) for location in locations]
+        start = int(pd.Timestamp(start_date).timestamp())
+        stop = int((pd.Timestamp(end_date) + pd.Timedelta(days=1)).timestamp())
+
+        models = [self._resolve_model(loc, model_key, version) for loc in locations]
+        for key, model_version in set(models):
+            self._warn_if_trained_on(key, model_version, start, stop)
+
+        climatology_start = start - self.climatology_days * 24 * HOUR
+        tasks = []
+        for loc, (key, model_version) in zip(locations, models):
+            for block_start in range(start, stop, self.block_days * 24 * HOUR):
+                tasks.append({
+                    "location": loc, "model_key": key, "model_version": model_version,
+                    "registry_root": self.registry.root, "cache_dir": self.cache_dir,
+                    "start": block_start, "stop": min(block_start + self.block_days * 24 * HOUR, stop),
+                    "climatology": (climatology_start, start),
+                    "horizons": self.horizons, "origin_step": self.origin_step
+                })
+
+        if self.n_jobs <= 1:
+            blocks = [_evaluate_block(task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=self.n_jobs) as pool:
+                blocks = list(pool.map(_evaluate_block, tasks, chunksize=1))
+
+        frames = [block for block in blocks if block is not None]
+        if not frames:
+            raise Exception("No observed hours to score in the backtest window")
+        results = pd.concat(frames, ignore_index=True)
+        results = pd.concat([results, pd.DataFrame(error_metrics(results[SUMS]))], axis=1)
+        for column in ("location", "model_key", "model_version", "month", "parameter"):
+            results[column] = results[column].astype("category")
+
+        if output:
+            os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+            results.to_parquet(output, index=False)
+        print(f"Backtest: {len(locations)} locations, {len(tasks)} blocks, "
+              f"{int(results['n'].sum())} scored forecasts in {time.perf_counter() - started:.1f}s")
+        return results
+
+    @staticmethod
+    def summarize(results: pd.DataFrame, by=("parameter", "horizon")) -> pd.DataFrame:
+        # Metrics re-aggregated over any grouping of the backtest rows
+        sums = results.groupby(list(by), observed=True)[SUMS].sum()
+        return pd.concat([sums, pd.DataFrame(error_metrics(sums), index=sums.index)], axis=1).reset_index()
+
+    def _resolve_model(self, location: dict, model_key: str = None, version: str = None):
+        if model_key:
+            return model_key, version or self.registry.current_version(model_key)
+        key = self.predictor.model_key(location)
+        model_version = self.registry.current_version(key)
+        if model_version is None:
+            raise Exception(f"No trained models for {location['name']}")
+        return key, model_version
+
+    def _warn_if_trained_on(self, key: str, version: str, start: int, stop: int):
+        with open(os.path.join(self.registry.root, key, version, "manifest.json")) as f:
+            metadata = json.load(f)
+        if "start_date" not in metadata or "end_date" not in metadata:
+            return
+        trained_start = pd.Timestamp(metadata["start_date"]).timestamp()
+        trained_stop = (pd.Timestamp(metadata["end_date"]) + pd.Timedelta(days=1)).timestamp()
+        if trained_start < stop and start < trained_stop:
+            print(f"Warning: {key} {version} was trained on {metadata['start_date']}..{metadata['end_date']}, "
+                  f"which overlaps the backtest window; its scores will look better than they are")
+
+
+# Per worker process: the predictor (feature code) and loaded model sets are
+# reused across the blocks that process runs
+_worker = {}
+
+
+def _worker_state(registry_root: str, cache_dir: str):
+    key = (registry_root, cache_dir)
+    if key not in _worker:
+        predictor = WeatherPredictor(ModelRegistry(registry_root))
+        predictor.data_fetcher = OpenMeteoFetcher(cache=HistoryCache(cache_dir))
+        _worker.clear()
+        _worker[key] = {"predictor": predictor, "models": {}}
+    return _worker[key]
+
+
+def _load_history(predictor: WeatherPredictor, lat: float, lon: float, start: int, stop: int):
+    # Gap-filled history for epoch seconds [start, stop) plus which hours were
+    # really observed, or (None, None) if nothing is cached/available
+    first = pd.Timestamp(start, unit="s").strftime("%Y-%m-%d")
+    last = pd.Timestamp(stop - 1, unit="s").strftime("%Y-%m-%d")
+    series = predictor.data_fetcher.fetch_historical_series(lat, lon, first, last)
+    if not len(series):
+        return None, None
+    history = LocationHistory.from_series(series)
+    observed = ~np.isnan(np.vstack([history.column(param) for param in predictor.PARAMETERS]))
+    history.fill_gaps()
+    return history, observed
+
+
+def _climatology(predictor: WeatherPredictor, lat: float, lon: float, start: int, stop: int) -> np.ndarray:
+    # (parameters, 12 months, 24 hours) mean of the observed values; cells never
+    # observed fall back to the hour's mean over all months, then the overall mean
+    history, observed = _load_history(predictor, lat, lon, start, stop)
+    climatology = np.full((len(predictor.PARAMETERS), 12, 24), np.nan)
+    if history is None:
+        return climatology
+    times = history.times.view("datetime64[s]")
+    cell = (times.astype("datetime64[M]").astype(np.int64) % 12) * 24 + (history.times // HOUR) % 24
+    for i, param in enumerate(predictor.PARAMETERS):
+        mask = observed[i]
+        counts = np.bincount(cell[mask], minlength=12 * 24)
+        sums = np.bincount(cell[mask], weights=history.column(param)[mask], minlength=12 * 24)
+        with np.errstate(invalid="ignore"):
+            means = (sums / counts).reshape(12, 24)
+            hourly = sums.reshape(12, 24).sum(axis=0) / counts.reshape(12, 24).sum(axis=0)
+        means = np.where(np.isnan(means), hourly, means)
+        climatology[i] = np.where(np.isnan(means), np.nanmean(means) if mask.any() else np.nan, means)
+    return climatology
+
+
+def _evaluate_block(task: dict):
+    state = _worker_state(task["registry_root"], task["cache_dir"])
+    predictor = state["predictor"]
+    model_id = (task["model_key"], task["model_version"])
+    if model_id not in state["models"]:
+        state["models"][model_id] = predictor.registry.load(*model_id)
+    model_set = state["models"][model_id]
+    location, horizons = task["location"], task["horizons"]
+    lat, lon = location["lat"], location["lon"]
+
+    climatology_key = (lat, lon, task["climatology"])
+    if state.get("climatology_key") != climatology_key:
+        state["climatology"] = _climatology(predictor, lat, lon, *task["climatology"])
+        state["climatology_key"] = climatology_key
+
+    # Origins need the 24 hours before them for their features, and the
+    # longest horizon after the last one for the actual values
+    history, observed = _load_history(predictor, lat, lon, task["start"] - 24 * HOUR,
+                                      task["stop"] + int(horizons.max()) * HOUR)
+    if history is None:
+        return None
+    first, last = history.window(task["start"], task["stop"])
+    origins = np.arange(first, last, task["origin_step"])
+    # Only forecast from hours that were observed, like the live service
+    origins = origins[observed[:, origins].any(axis=0)]
+    if not len(origins):
+        return None
+
+    targets = origins[:, None] + horizons[None, :]
+    in_history = targets < history.length
+    targets = np.minimum(targets, history.length - 1)
+
+    # One forecast per (origin, horizon), as predict_batch would have made it
+    forecast = predictor.forecast_history(model_set, history, origins, horizons)
+    valid_times = forecast["valid_time"].view("datetime64[s]")
+    valid_month = valid_times.astype("datetime64[M]").astype(np.int64) % 12
+    valid_hour = (forecast["valid_time"] // HOUR) % 24
+
+    # Group forecasts by the month they were issued in, then by horizon
+    origin_months = history.times[origins].view("datetime64[s]").astype("datetime64[M]")
+    month_labels, month_index = np.unique(origin_months, return_inverse=True)
+    group = (month_index[:, None] * len(horizons) + np.arange(len(horizons))[None, :]).ravel()
+    n_groups = len(month_labels) * len(horizons)
+
+    rows = []
+    for i, param in enumerate(predictor.PARAMETERS):
+        if param not in forecast:
+            continue
+        prediction, lower, upper = forecast[param], forecast[f"{param}_lower"], forecast[f"{param}_upper"]
+        actual = np.where(in_history & observed[i][targets], history.column(param)[targets], np.nan)
+        reference = state["climatology"][i][valid_month, valid_hour]
+
+        # Per-forecast sufficient statistics, summed into their groups
+        sums = error_sums(prediction[..., None], actual[..., None], reference[..., None],
+                          lower[..., None], upper[..., None])
+        grouped = {name: np.bincount(group, weights=np.ravel(values), minlength=n_groups)
+                   for name, values in sums.items()}
+        rows.append(pd.DataFrame({
+            "month": np.repeat(month_labels.astype(str), len(horizons)),
+            "horizon": np.tile(horizons, len(month_labels)),
+            "parameter": param,
+            **{name: grouped[name] for name in SUMS}
+        }))
+
+    block = pd.concat(rows, ignore_index=True)
+    block = block[block["n"] > 0]
+    block.insert(0, "location", location["name"])
+    block.insert(1, "lat", lat)
+    block.insert(2, "lon", lon)
+    block.insert(3, "model_key", task["model_key"])
+    block.insert(4, "model_version", task["model_version"])
+    block["n"] = block["n"].astype(np.int64)
+    block["n_inside"] = block["n_inside"].astype(np.int64)
+    return block
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Walk-forward backtest of the forecast models over cached history")
+    parser.add_argument("--locations", help="comma-separated mapped locations, e.g. mumbai.bandra,mumbai.andheri")
+    parser.add_argument("--city", help="every mapped area and sub-region of this city")
+    parser.add_argument("--start", required=True, help="first origin date (YYYY-MM-DD)")
+    parser.add_argument("--end", required=True, help="last origin date (YYYY-MM-DD)")
+    parser.add_argument("--horizons", default="1-24", help="hours ahead, as 1-24 or 1,3,6,12,24")
+    parser.add_argument("--origin-step", type=int, default=1, help="hours between forecast origins")
+    parser.add_argument("--model-key", help="score this model set everywhere instead of each location's live one")
+    parser.add_argument("--version", help="model version for --model-key (default: current)")
+    parser.add_argument("--jobs", type=int, default=None)
+    parser.add_argument("--output", default="backtest.parquet")
+    args = parser.parse_args(argv)
+
+    if "-" in args.horizons:
+        low, high = args.horizons.split("-")
+        horizons = range(int(low), int(high) + 1)
+    else:
+        horizons = [int(h) for h in args.horizons.split(",") if h]
+
+    backtest = WalkForwardBacktest(horizons=horizons, origin_step=args.origin_step, n_jobs=args.jobs)
+    locations = [name for name in (args.locations or "").split(",") if name]
+    if args.city:
+        locations += [r["key"] for r in backtest.predictor.micro_location_mapper.regions if r["city"] == args.city.lower()]
+    if not locations:
+        parser.error("give --locations or --city")
+
+    results = backtest.run(locations, args.start, args.end, args.model_key, args.version, args.output)
+    summary = backtest.summarize(results, by=("parameter",))
+    print(summary[["parameter", "n", "rmse", "mae", "bias", "skill_score", "coverage"]].to_string(index=False))
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
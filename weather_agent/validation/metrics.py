@@ -1,4 +1,57 @@
+import numpy as np
+
+
+def _stack(values: dict, parameters: list) -> np.ndarray:
+    # (parameters, samples) float64 array from {param: values}
+    return np.vstack([np.asarray(values[param], dtype=float).ravel() for param in parameters])
+
+
+def error_sums(predicted: np.ndarray, actual: np.ndarray, reference: np.ndarray = None,
+               lower: np.ndarray = None, upper: np.ndarray = None, axis: int = -1) -> dict:
+    # Sufficient statistics along `axis`, ignoring samples whose actual value is
+    # NaN. Sums from different batches add up, so metrics over any grouping can
+    # be computed afterwards with error_metrics().
+    valid = ~np.isnan(actual)
+    error = np.where(valid, predicted - actual, 0.0)
+    sums = {
+        "n": valid.sum(axis=axis),
+        "sum_error": error.sum(axis=axis),
+        "sum_sq_error": np.square(error).sum(axis=axis),
+        "sum_abs_error": np.abs(error).sum(axis=axis)
+    }
+    if reference is not None:
+        sums["sum_sq_error_reference"] = np.square(np.where(valid, reference - actual, 0.0)).sum(axis=axis)
+    if lower is not None and upper is not None:
+        sums["n_inside"] = (valid & (actual >= lower) & (actual <= upper)).sum(axis=axis)
+    return sums
+
+
+def error_metrics(sums: dict) -> dict:
+    # RMSE, MAE, bias, skill score (1 - MSE / reference MSE; 1 is perfect, 0 is
+    # no better than the reference) and interval coverage from error_sums()
+    n = np.asarray(sums["n"], dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        metrics = {
+            "rmse": np.sqrt(sums["sum_sq_error"] / n),
+            "mae": sums["sum_abs_error"] / n,
+            "bias": sums["sum_error"] / n
+        }
+        if "sum_sq_error_reference" in sums:
+            metrics["skill_score"] = 1 - sums["sum_sq_error"] / np.asarray(sums["sum_sq_error_reference"], dtype=float)
+        if "n_inside" in sums:
+            metrics["coverage"] = sums["n_inside"] / n
+    return metrics
+
+
 class ForecastValidator:
+    # Scores one batch of forecasts. predictions: {param: values}, optionally
+    # with f"{param}_lower" / f"{param}_upper" bounds (as predict_batch returns
+    # them); actual_weather: {param: values} or a DataFrame. Skill is measured
+    # against `climatology` ({param: values} for the same samples) when given,
+    # otherwise against the mean of the actual values.
+    def __init__(self, climatology: dict = None):
+        self.climatology = climatology
+
     def validate_forecast(self, predictions, actual_weather):
         metrics = {
             'rmse': self._calculate_rmse(predictions, actual_weather),
@@ -6,4 +59,53 @@ class ForecastValidator:
             'skill_score': self._calculate_skill_score(predictions, actual_weather),
             'reliability': self._assess_reliability(predictions, actual_weather)
         }
-        return metrics 
\ No newline at end of file
+        return metrics
+
+    def _parameters(self, predictions, actual_weather) -> list:
+        return [param for param in predictions if param in actual_weather
+                and not param.endswith(('_lower', '_upper'))]
+
+    def _metrics(self, predictions, actual_weather, **extra) -> tuple:
+        parameters = self._parameters(predictions, actual_weather)
+        sums = error_sums(_stack(predictions, parameters), _stack(actual_weather, parameters), **{
+            name: _stack(values, parameters) for name, values in extra.items()
+        })
+        return parameters, error_metrics(sums)
+
+    def _calculate_rmse(self, predictions, actual_weather) -> dict:
+        parameters, metrics = self._metrics(predictions, actual_weather)
+        return {param: float(value) for param, value in zip(parameters, metrics["rmse"])}
+
+    def _calculate_mae(self, predictions, actual_weather) -> dict:
+        parameters, metrics = self._metrics(predictions, actual_weather)
+        return {param: float(value) for param, value in zip(parameters, metrics["mae"])}
+
+    def _calculate_skill_score(self, predictions, actual_weather) -> dict:
+        parameters = self._parameters(predictions, actual_weather)
+        reference = self.climatology
+        if reference is None:
+            actual = _stack(actual_weather, parameters)
+            means = np.nanmean(actual, axis=1)
+            reference = {param: np.full(actual.shape[1], mean) for param, mean in zip(parameters, means)}
+        parameters, metrics = self._metrics(predictions, actual_weather, reference=reference)
+        return {param: float(value) for param, value in zip(parameters, metrics["skill_score"])}
+
+    def _assess_reliability(self, predictions, actual_weather) -> dict:
+        # Share of actual values inside the forecast interval, next to the bias;
+        # coverage is None for parameters without bounds
+        parameters = self._parameters(predictions, actual_weather)
+        bounded = [param for param in parameters if f"{param}_lower" in predictions and f"{param}_upper" in predictions]
+        _, metrics = self._metrics(predictions, actual_weather)
+        coverage = {}
+        if bounded:
+            sums = error_sums(_stack(predictions, bounded), _stack(actual_weather, bounded),
+                              lower=_stack({p: predictions[f"{p}_lower"] for p in bounded}, bounded),
+                              upper=_stack({p: predictions[f"{p}_upper"] for p in bounded}, bounded))
+            coverage = dict(zip(bounded, error_metrics(sums)["coverage"]))
+        return {
+            param: {
+                "bias": float(bias),
+                "coverage": float(coverage[param]) if param in coverage else None
+            }
+            for param, bias in zip(parameters, metrics["bias"])
+        }
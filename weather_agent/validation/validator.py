@@ -1,30 +1,34 @@
 import pandas as pd
 import numpy as np
-from sklearn.metrics import mean_squared_error, mean_absolute_error
+
+from .metrics import error_sums, error_metrics
 
 class WeatherValidator:
     def __init__(self):
         self.metrics = {}
-    
+
     def validate_predictions(self, predictions: dict, actual: pd.DataFrame):
-        for parameter in predictions.keys():
-            mse = mean_squared_error(actual[parameter], predictions[parameter])
-            mae = mean_absolute_error(actual[parameter], predictions[parameter])
-            
+        # Every parameter in one (parameters x samples) reduction
+        parameters = list(predictions.keys())
+        predicted = np.vstack([np.asarray(predictions[p], dtype=float).ravel() for p in parameters])
+        observed = np.vstack([np.asarray(actual[p], dtype=float).ravel() for p in parameters])
+        metrics = error_metrics(error_sums(predicted, observed))
+
+        for i, parameter in enumerate(parameters):
             self.metrics[parameter] = {
-                'rmse': np.sqrt(mse),
-                'mae': mae
+                'rmse': float(metrics['rmse'][i]),
+                'mae': float(metrics['mae'][i])
             }
-        
+
         return self.metrics
-    
+
     def generate_report(self):
         report = "Weather Prediction Validation Report\n"
         report += "================================\n\n"
-        
+
         for parameter, metrics in self.metrics.items():
             report += f"{parameter.capitalize()}:\n"
             report += f"  RMSE: {metrics['rmse']:.2f}\n"
             report += f"  MAE: {metrics['mae']:.2f}\n\n"
-        
-        return report 
\ No newline at end of file
+
+        return report
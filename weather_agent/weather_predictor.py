@@ -1,120 +1,334 @@
 # Remove this line since we already have the proper import below
 # import datetime
+import asyncio
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from sklearn.ensemble import GradientBoostingRegressor
 from sklearn.preprocessing import StandardScaler
 from .data_fetcher import OpenMeteoFetcher  # Note the relative import
+from .hourly_series import HourlySeries
+from .history_store import HistoryStore, LocationHistory
+from .training.model_registry import ModelRegistry, ModelSet
+from .training.parallel_trainer import ESTIMATORS, fit_targets, warm_start_targets, can_warm_start
+from .feature_engine import RollingFeatureEngine, FEATURE_NAMES, SEASON_BY_MONTH
+from .data.location_mapping import MicroLocationMapper
+from .instrumentation import span, timed
 
 class WeatherPredictor:
-    def __init__(self):
+    PARAMETERS = ['temperature', 'precipitation', 'humidity', 'wind_speed']
+    TRAINING_WINDOW_DAYS = 730
+    # Locations without their own models are served by Mumbai's
+    DEFAULT_LOCATION = (19.0760, 72.8777)
+    # Coordinates this close to a mapped area share that area's models
+    MODEL_SNAP_KM = 2.0
+    # Prediction intervals: split-conformal on the most recent hours of the window,
+    # calibrated separately for every lead (hours between the feature row and
+    # the forecast hour) up to INTERVAL_MAX_LEAD, on at most CALIBRATION_ROWS
+    # rows each past lead 0. Errors swing with the hour of day, so leads aren't
+    # bucketed.
+    INTERVAL_COVERAGE = 0.9
+    CALIBRATION_FRACTION = 0.1
+    INTERVAL_MAX_LEAD = 7 * 24
+    CALIBRATION_ROWS = 1000
+    # Physical limits the interval bounds are clipped to
+    BOUNDS = {'precipitation': (0, None), 'humidity': (0, 100), 'wind_speed': (0, None)}
+    # Micro forecasts: predicted precipitation (mm/h) above this counts as rain
+    RAIN_THRESHOLD = 0.2
+    MICRO_HOURS = 24
+    # Upper edges (mm/h) of light, moderate and heavy rain; anything above is violent
+    INTENSITY_BINS = np.array([2.5, 7.6, 50.0])
+    INTENSITY_LABELS = np.array(['light', 'moderate', 'heavy', 'violent'])
+    # Incremental refresh: boosting stages added per refresh, fitted on the new
+    # hours plus this much context from just before the calibration window
+    REFRESH_ESTIMATORS = 10
+    REFRESH_CONTEXT_HOURS = 7 * 24
+    # A refresh turns into a full retrain when the last one is this old, or
+    # when the live models' RMSE on the new hours is DRIFT_RATIO x their
+    # calibration RMSE (judged once there are MIN_DRIFT_HOURS new hours)
+    FULL_RETRAIN_DAYS = 7
+    DRIFT_RATIO = 1.5
+    MIN_DRIFT_HOURS = 24
+
+    def __init__(self, registry: ModelRegistry = None):
         self.data_fetcher = OpenMeteoFetcher()
-        self.models = {
-            'temperature': GradientBoostingRegressor(),
-            'precipitation': GradientBoostingRegressor(),
-            'humidity': GradientBoostingRegressor(),
-            'wind_speed': GradientBoostingRegressor()
-        }
-        self.scalers = {
-            'temperature': StandardScaler(),
-            'precipitation': StandardScaler(),
-            'humidity': StandardScaler(),
-            'wind_speed': StandardScaler()
-        }
+        self.micro_location_mapper = MicroLocationMapper()
+        # Fitted models live in the registry and are loaded on first use
+        self.registry = registry or ModelRegistry()
+        # One streaming feature engine per location, fed only the new hours
+        self.feature_engines = {}
+        # Compact float32 training history per location, kept between retrains
+        self.history_store = HistoryStore()
+        # Last observed wind direction (degrees) per location, for rain drift
+        self.wind_directions = {}
+
+    def _model_key(self, lat: float, lon: float) -> str:
+        # One model set per mapped area (sub-regions share their area's);
+        # anywhere else is keyed by its rounded coordinates
+        region, distance_km = self.micro_location_mapper.nearest(lat, lon)[0]
+        if distance_km <= self.MODEL_SNAP_KM:
+            return f"{region['city']}.{region['area']}"
+        return self.registry.location_key(lat, lon)
+
+    def model_key(self, location) -> str:
+        # Registry key of the model set that serves this location: its own, or
+        # DEFAULT_LOCATION's while it has none
+        location = self.normalize_location(location)
+        key = self._model_key(location["lat"], location["lon"])
+        if self.registry.current_version(key) is None:
+            key = self._model_key(*self.DEFAULT_LOCATION)
+        return key
+
+    def _get_model_set(self, lat: float, lon: float) -> ModelSet:
+        model_set = self.registry.get(self._model_key(lat, lon))
+        if model_set is None:
+            model_set = self.registry.get(self._model_key(*self.DEFAULT_LOCATION))
+        if model_set is None or not model_set.is_trained():
+            raise Exception("Model not trained")
+        return model_set
         
-    def train(self, location_lat: float, location_lon: float):
+    @timed("train")
+    def train(self, location_lat: float, location_lon: float, estimator: str = 'gbr',
+              early_stopping: bool = None, n_jobs: int = None, progress=None):
+        # estimator: 'gbr' (GradientBoostingRegressor) or 'hist' (HistGradientBoostingRegressor);
+        # early stopping defaults to on for 'hist'. n_jobs=1 trains in-process.
+        # progress(stage, fraction) is called as training moves along.
+        if early_stopping is None:
+            early_stopping = estimator == 'hist'
+        progress = progress or (lambda stage, fraction: None)
+        progress("fetching", 0.05)
+
         # Fetch last 2 years of data
         end_date = datetime.now().strftime("%Y-%m-%d")
-        start_date = (datetime.now() - timedelta(days=730)).strftime("%Y-%m-%d")
+        start_date = (datetime.now() - timedelta(days=self.TRAINING_WINDOW_DAYS)).strftime("%Y-%m-%d")
         
-        historical_data = self.data_fetcher.fetch_historical_data(
+        series = self.data_fetcher.fetch_historical_series(
             location_lat, location_lon, start_date, end_date
         )
         
-        # Debug: Print available columns
-        print("Available columns:", historical_data.columns.tolist())
-        
-        # Map OpenMeteo columns to our model parameters and handle missing values
-        column_mapping = {
-            'temperature': 'temperature',
-            'precipitation': 'precipitation',
-            'humidity': 'humidity',
-            'wind_speed': 'wind_speed'
-        }
-        
-        # Create new columns with mapped names and fill NaN values
-        for model_param, api_param in column_mapping.items():
-            if api_param in historical_data.columns:
-                historical_data[model_param] = historical_data[api_param].ffill().bfill().fillna(0)
-            else:
-                raise Exception(f"Required column {api_param} not found in data. Available columns: {historical_data.columns.tolist()}")
+        for param in self.PARAMETERS:
+            if param not in series:
+                raise Exception(f"Required column {param} not found in data. Available columns: {series.names()}")
+        observed = self._observed_times(series)
+
+        # Keep the history as compact float32 and fill gaps in place; features
+        # and targets below are views into it
+        history = self.history_store.update(self.registry.location_key(location_lat, location_lon), series)
+        history.fill_gaps()
+        first, last = history.window(series.times[0], series.times[-1] + 1)
         
         # Prepare features
-        features = self._prepare_features(historical_data)
-        
-        # Train models for each weather parameter
-        for param in self.models.keys():
-            try:
-                X = self.scalers[param].fit_transform(features)
-                y = historical_data[param].values
-                # Double check for any remaining NaN values
-                if np.any(np.isnan(y)):
-                    raise Exception(f"NaN values found in {param} target data")
-                self.models[param].fit(X, y)
-            except Exception as e:
-                raise Exception(f"Error training {param} model: {str(e)}")
+        progress("features", 0.3)
+        features = self._prepare_features(history, first, last)
+
+        # Only hours that were really observed are targets: fill_gaps() copies
+        # the last value into gaps and into the archive's not-yet-published
+        # tail, and fitting or calibrating on those would measure made-up values
+        times = history.times[first:last]
+        usable = np.isin(times, observed)
+        features, times = features[usable], times[usable]
+
+        # Scale the shared feature matrix once; every parameter uses the same scaler
+        scaler = StandardScaler()
+        X = scaler.fit_transform(features)
+
+        targets = {}
+        for param in self.PARAMETERS:
+            y = history.column(param)[first:last][usable]
+            # Double check for any remaining NaN values
+            if np.any(np.isnan(y)):
+                raise Exception(f"NaN values found in {param} target data")
+            targets[param] = y
+
+        # Hold out the most recent hours to calibrate the prediction intervals;
+        # the models never see them, so their residuals are honest
+        n_fit = len(X) - max(int(len(X) * self.CALIBRATION_FRACTION), 1)
+        if n_fit < 1:
+            raise Exception("Not enough history to train and calibrate")
+
+        # Train a fresh set of models, one per parameter, in parallel; the live
+        # set keeps serving until the new one is saved and swapped in
+        progress("fitting", 0.4)
+        try:
+            with span("train.fit"):
+                models, timings = fit_targets(X[:n_fit], {param: y[:n_fit] for param, y in targets.items()},
+                                              estimator, early_stopping, n_jobs)
+        except Exception as e:
+            raise Exception(f"Error training models: {str(e)}")
+
+        progress("calibrating", 0.9)
+        intervals = self._calibrate_intervals(models, scaler, features[n_fit:],
+                                              {param: y[n_fit:] for param, y in targets.items()}, times[n_fit:])
+
+        model_set = ModelSet(models, {param: scaler for param in models})
+        model_set.metadata = {
+            "start_date": start_date,
+            "end_date": end_date,
+            "n_samples": len(features),
+            "estimator": estimator,
+            "early_stopping": early_stopping,
+            "fit_seconds": {param: round(seconds, 3) for param, seconds in timings.items()},
+            "intervals": intervals,
+            # Where refresh() picks up from, and the held-out hours its new
+            # stages must not be fitted on
+            "trained_through": int(observed[-1]) if len(observed) else None,
+            "calibration_window": [int(times[n_fit]), int(times[-1])],
+            "full_trained_at": datetime.now().isoformat(),
+            "refreshes": 0
+        }
+        progress("saving", 0.95)
+        version = self.registry.save(
+            self._model_key(location_lat, location_lon),
+            f"{self.TRAINING_WINDOW_DAYS}d",
+            model_set
+        )
+
+        return {
+            "message": "Models trained successfully",
+            "version": version,
+            "fit_seconds": model_set.metadata["fit_seconds"]
+        }
+
+    @timed("refresh")
+    def refresh(self, location_lat: float, location_lon: float, estimator: str = None, progress=None,
+                **train_options):
+        # Incremental retrain: extend the live models with REFRESH_ESTIMATORS
+        # warm-started stages fitted on the hours that arrived since the last
+        # full train (plus REFRESH_CONTEXT_HOURS from before its calibration
+        # window), so the cost follows the new data rather than the whole window
+        # and the calibrated intervals stay honest. Runs a
+        # full train() instead when there's nothing to extend, one is due
+        # (FULL_RETRAIN_DAYS) or the new hours show drift.
+        progress = progress or (lambda stage, fraction: None)
+        model_key = self._model_key(location_lat, location_lon)
+        live = self.registry.get(model_key) if self.registry.current_version(model_key) else None
+        reason = self._full_retrain_reason(live, estimator)
+        if reason is None:
+            progress("fetching", 0.05)
+            trained_through = live.metadata["trained_through"]
+            calibration_start, calibration_end = live.metadata["calibration_window"]
+            context_start = calibration_start - self.REFRESH_CONTEXT_HOURS * 3600
+            # A day more than the context, so its rolling features are warmed up
+            start_date = pd.Timestamp(context_start - 86400, unit='s').strftime("%Y-%m-%d")
+            end_date = datetime.now().strftime("%Y-%m-%d")
+            series = self.data_fetcher.fetch_historical_series(location_lat, location_lon, start_date, end_date)
+            observed = self._observed_times(series)
 
-        return {"message": "Models trained successfully"}
+            history = self.history_store.update(self.registry.location_key(location_lat, location_lon), series)
+            history.fill_gaps()
+            first, last = history.window(series.times[0], series.times[-1] + 1)
+            progress("features", 0.2)
+            features = self._prepare_features(history, first, last)
+            times = history.times[first:last]
+            usable = np.isin(times, observed)
+            new = usable & (times > trained_through)
+            if not new.any():
+                return {"message": "No new hours since the models were trained", "version": live.version,
+                        "new_hours": 0}
+
+            # Drift: how the live models do on hours they have never seen
+            progress("checking drift", 0.3)
+            predictions = live.predict(features[new])
+            targets = {param: history.column(param)[first:last] for param in self.PARAMETERS}
+            drift = {}
+            for param, prediction in predictions.items():
+                rmse = float(np.sqrt(np.mean(np.square(targets[param][new] - prediction))))
+                drift[param] = round(rmse / max(live.metadata["intervals"][param]["rmse"], 1e-6), 3)
+            drifted = [param for param, ratio in drift.items() if ratio > self.DRIFT_RATIO]
+            if drifted and new.sum() >= self.MIN_DRIFT_HOURS:
+                reason = f"drift in {', '.join(drifted)}"
+
+        if reason is not None:
+            # Same estimator as the live models unless another one was asked for
+            estimator = estimator or (live.metadata.get("estimator") if live else None)
+            result = self.train(location_lat, location_lon, estimator=estimator if estimator in ESTIMATORS else 'gbr',
+                                progress=progress, **train_options)
+            result["refresh"] = f"full retrain: {reason}"
+            return result
+
+        progress("fitting", 0.4)
+        # Never the calibration hours: the intervals are reused as they are
+        rows = usable & (((times >= context_start) & (times < calibration_start)) | (times > calibration_end))
+        X = live.scalers[next(iter(live.models))].transform(features[rows])
+        with span("train.fit"):
+            models, timings = warm_start_targets(live.models, X, {param: targets[param][rows] for param in live.models},
+                                                 self.REFRESH_ESTIMATORS)
+
+        # Intervals stay the ones calibrated at the last full retrain; no stage
+        # has been fitted on its calibration window
+        model_set = ModelSet(models, live.scalers)
+        model_set.metadata = dict(live.metadata,
+                                  end_date=end_date,
+                                  n_refresh_samples=int(rows.sum()),
+                                  fit_seconds={param: round(seconds, 3) for param, seconds in timings.items()},
+                                  trained_through=int(times[new][-1]),
+                                  refreshes=live.metadata.get("refreshes", 0) + 1,
+                                  refreshed_at=datetime.now().isoformat(),
+                                  drift=drift)
+        progress("saving", 0.95)
+        version = self.registry.save(model_key, live.version.split("/")[0], model_set)
+        return {
+            "message": "Models refreshed",
+            "version": version,
+            "new_hours": int(new.sum()),
+            "drift": drift,
+            "fit_seconds": model_set.metadata["fit_seconds"]
+        }
+
+    def _full_retrain_reason(self, model_set, estimator: str = None):
+        # Why refresh() can't just extend model_set, or None when it can
+        if model_set is None:
+            return "no models yet"
+        metadata = model_set.metadata
+        if estimator and estimator != metadata.get("estimator"):
+            return f"estimator changed to {estimator}"
+        if not all(can_warm_start(model) for model in model_set.models.values()):
+            return "models can't be warm-started"
+        intervals = metadata.get("intervals") or {}
+        if (metadata.get("trained_through") is None or "calibration_window" not in metadata
+                or not all("rmse" in intervals.get(p, {}) for p in model_set.models)):
+            return "models predate incremental refresh"
+        full_trained_at = datetime.fromisoformat(metadata["full_trained_at"])
+        if datetime.now() - full_trained_at >= timedelta(days=self.FULL_RETRAIN_DAYS):
+            return f"last full retrain was {full_trained_at:%Y-%m-%d}"
+        return None
+
+    def _observed_times(self, series) -> np.ndarray:
+        # Hours where every target was actually observed (the archive's most
+        # recent hours are still null)
+        observed = np.ones(len(series), dtype=bool)
+        for param in self.PARAMETERS:
+            observed &= ~np.isnan(series[param])
+        return series.times[observed]
 
     def predict(self, location: str, target_date: str) -> dict:
-        lat, lon = 19.0760, 72.8777
-        
-        # Get recent data for prediction
-        end_date = datetime.now().strftime("%Y-%m-%d")
-        start_date = (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d")
-        recent_data = self.data_fetcher.fetch_historical_data(lat, lon, start_date, end_date)
-        
-        # Map OpenMeteo columns to our model parameters
-        column_mapping = {
-            'temperature': 'temperature',
-            'precipitation': 'precipitation',
-            'humidity': 'humidity',
-            'wind_speed': 'wind_speed'
+        result = self.predict_batch([location], [self._target_horizon(target_date)])
+        return self._format_prediction(result)
+
+    async def apredict(self, location: str, target_date: str) -> dict:
+        # Same as predict() but fetches recent data without blocking the event loop
+        result = await self.apredict_batch([location], [self._target_horizon(target_date)])
+        return self._format_prediction(result)
+
+    def _target_horizon(self, target_date: str) -> int:
+        # Forecast the hour of target_date (noon when only a date is given)
+        target = pd.Timestamp(target_date)
+        if len(target_date) <= 10:
+            target += pd.Timedelta(hours=12)
+        now = pd.Timestamp.now().floor('h')
+        return max(0, int((target - now) / pd.Timedelta(hours=1)))
+
+    @timed("format")
+    def _format_prediction(self, result: dict) -> dict:
+        predictions = {param: round(float(result[param][0]), 2) for param in self.PARAMETERS}
+        confidence_intervals = {
+            param: {
+                'lower': round(float(result[f"{param}_lower"][0]), 2),
+                'upper': round(float(result[f"{param}_upper"][0]), 2),
+                'coverage': result["interval_coverage"][0]
+            }
+            for param in self.PARAMETERS
         }
         
-        # Create new columns with mapped names and fill NaN values
-        for model_param, api_param in column_mapping.items():
-            if api_param in recent_data.columns:
-                recent_data[model_param] = recent_data[api_param].fillna(method='ffill').fillna(method='bfill').fillna(0)
-        
-        # Prepare features for prediction
-        features = self._prepare_features(recent_data)
-        
-        # Make predictions
-        predictions = {}
-        confidence_intervals = {}
-        
-        # Check if models are trained and make predictions
-        for param, model in self.models.items():
-            try:
-                if hasattr(model, 'n_features_in_'):  # Check if model is trained
-                    X = self.scalers[param].transform(features[-1:])
-                    pred = model.predict(X)[0]
-                    
-                    # Calculate prediction intervals
-                    lower, upper = self._calculate_confidence_intervals(X, param)
-                    
-                    predictions[param] = round(float(pred), 2)
-                    confidence_intervals[param] = {
-                        'lower': round(float(lower), 2),
-                        'upper': round(float(upper), 2)
-                    }
-                else:
-                    raise Exception("Model not trained")
-            except Exception as e:
-                raise Exception(f"Error predicting {param}: {str(e)}")
-        
         # Format and return response
         return {
             "temperature": f"{predictions['temperature']}°C",
@@ -124,40 +338,268 @@ class WeatherPredictor:
             "explanation": self._generate_explanation(predictions),
             "confidence_intervals": confidence_intervals
         }
-    
-    def _prepare_features(self, df: pd.DataFrame) -> np.ndarray:
-        # Fill NaN values in the input data
-        df = df.ffill().bfill()
-        
-        # Create a copy of the dataframe to avoid modifying the original
-        df_copy = df.copy()
-        
-        features = pd.DataFrame({
-            # Temporal features
-            'hour': df_copy['timestamp'].dt.hour,
-            'day': df_copy['timestamp'].dt.day,
-            'month': df_copy['timestamp'].dt.month,
-            'season': df_copy['timestamp'].dt.month.map(self._get_season),
-            
-            # Weather patterns
-            'temperature_moving_avg': df_copy.get('temperature', pd.Series(0, index=df_copy.index)).rolling(24, min_periods=1).mean(),
-            'pressure_gradient': df_copy.get('pressure', pd.Series(0, index=df_copy.index)).diff().fillna(0),
-            
-            # Atmospheric stability indicators
-            'temp_humidity_index': (df_copy.get('temperature', pd.Series(0, index=df_copy.index)) * 
-                                  df_copy.get('humidity', pd.Series(50, index=df_copy.index))),
-            'pressure_tendency': self._calculate_pressure_tendency(df_copy.get('pressure', pd.Series(0, index=df_copy.index))),
-            
-            # Historical patterns
-            'last_24h_rain': df_copy.get('precipitation', pd.Series(0, index=df_copy.index)).rolling(24, min_periods=1).sum(),
-            'temp_range': (df_copy.get('temperature', pd.Series(0, index=df_copy.index)).rolling(24, min_periods=1).max() - 
-                         df_copy.get('temperature', pd.Series(0, index=df_copy.index)).rolling(24, min_periods=1).min())
-        })
+
+    def predict_batch(self, locations: list, horizons: list) -> dict:
+        # locations: names known to MicroLocationMapper ("bangalore.peenya"),
+        # (lat, lon) tuples or {"lat", "lon", "name"} dicts
+        # horizons: hours ahead of the current hour
+        # Builds one feature matrix for every location x horizon and runs each
+        # model once per parameter over it. Returns columns, one row per pair.
+        locations = [self.normalize_location(loc) for loc in locations]
+
+        # Latest weather features per location, computed once
+        base_rows = np.vstack([self._latest_features(loc["lat"], loc["lon"]) for loc in locations])
+        return self._predict_rows(locations, base_rows, horizons)
+
+    async def apredict_batch(self, locations: list, horizons: list) -> dict:
+        # Same as predict_batch() with the per-location fetches run concurrently
+        locations = [self.normalize_location(loc) for loc in locations]
+        base_rows = np.vstack(await asyncio.gather(*(
+            self._alatest_features(loc["lat"], loc["lon"]) for loc in locations
+        )))
+        # Loading a model set (joblib files, compiling older versions) is
+        # blocking disk work, so it happens off the event loop
+        model_sets = await asyncio.to_thread(self._get_model_sets, locations)
+        return self._predict_rows(locations, base_rows, horizons, model_sets)
+
+    def _get_model_sets(self, locations: list) -> list:
+        return [self._get_model_set(loc["lat"], loc["lon"]) for loc in locations]
+
+    def _predict_rows(self, locations: list, base_rows: np.ndarray, horizons: list, model_sets: list = None) -> dict:
+        horizons = np.asarray(horizons, dtype=int)
+        n_horizons = len(horizons)
+        now = pd.Timestamp.now().floor('h')
+
+        # Each location's row once for every horizon
+        features = np.repeat(base_rows, n_horizons, axis=0)
+        valid_times = pd.DatetimeIndex(now + pd.to_timedelta(np.tile(horizons, len(locations)), unit='h'))
+        # Hours from each location's feature row (its last observed hour; the
+        # archive lags days behind) to the forecast hour, which picks the
+        # calibrated interval
+        leads = np.repeat([self._feature_lag(loc, now) for loc in locations], n_horizons) + np.tile(horizons, len(locations))
+
+        result = {
+            "location": np.repeat([loc["name"] for loc in locations], n_horizons).tolist(),
+            "lat": np.repeat([loc["lat"] for loc in locations], n_horizons).tolist(),
+            "lon": np.repeat([loc["lon"] for loc in locations], n_horizons).tolist(),
+            "horizon": np.tile(horizons, len(locations)).tolist(),
+            "valid_time": valid_times.strftime("%Y-%m-%dT%H:%M").tolist(),
+        }
+        model_versions = np.empty(len(features), dtype=object)
+        coverages = np.empty(len(features), dtype=object)
+        for param in self.PARAMETERS:
+            for column in (param, f"{param}_lower", f"{param}_upper"):
+                result[column] = np.empty(len(features))
+
+        # Locations sharing a model set are predicted together
+        if model_sets is None:
+            model_sets = self._get_model_sets(locations)
+        groups = {}
+        for i, model_set in enumerate(model_sets):
+            groups.setdefault(id(model_set), (model_set, []))[1].append(i)
+
+        for model_set, location_indices in groups.values():
+            rows = (np.asarray(location_indices)[:, None] * n_horizons + np.arange(n_horizons)).ravel()
+            try:
+                forecast = self._forecast(model_set, features[rows], valid_times.asi8[rows] // 10 ** 9, leads[rows])
+            except Exception as e:
+                raise Exception(f"Error predicting: {str(e)}")
+            for column, values in forecast.items():
+                result[column][rows] = values
+            model_versions[rows] = model_set.version
+            coverages[rows] = self._interval_coverage(model_set.metadata.get("intervals") or {}, leads[rows])
+
+        for param in self.PARAMETERS:
+            for column in (param, f"{param}_lower", f"{param}_upper"):
+                result[column] = np.round(result[column], 2).tolist()
+        result["model_version"] = model_versions.tolist()
+        # Nominal coverage of the [lower, upper] bounds; None where the lead is
+        # past the calibrated ones (or for model sets trained before intervals
+        # were calibrated per lead)
+        result["interval_coverage"] = coverages.tolist()
+        return result
+
+    def forecast_history(self, model_set: ModelSet, history: LocationHistory, origins: np.ndarray,
+                         horizons: np.ndarray) -> dict:
+        # Forecasts model_set would have issued from past hours of a gap-filled
+        # LocationHistory: from the feature row of each origin (row index) for
+        # each horizon (hours) after it, as predict_batch does from the latest
+        # row. Returns "valid_time" (epoch seconds) and every parameter's point
+        # forecast and "_lower"/"_upper" bounds, each (origins, horizons).
+        origins, horizons = np.asarray(origins, dtype=np.int64), np.asarray(horizons, dtype=np.int64)
+        features = self._prepare_features(history)
+        valid_times = history.times[origins][:, None] + horizons[None, :] * 3600
+        forecast = self._forecast(model_set, np.repeat(features[origins], len(horizons), axis=0),
+                                  valid_times.ravel(), np.tile(horizons, len(origins)))
+        forecast = {column: values.reshape(valid_times.shape) for column, values in forecast.items()}
+        forecast["valid_time"] = valid_times
+        return forecast
+
+    def _forecast(self, model_set: ModelSet, features: np.ndarray, valid_times: np.ndarray, leads: np.ndarray) -> dict:
+        # Point forecasts and bounds per parameter for feature rows moved to
+        # valid_times (epoch seconds), `leads` hours after the rows' own hours
+        X = self._move_to_valid_time(np.array(features), valid_times)
+        # All parameters in one pass through the compiled ensemble (sklearn per
+        # parameter for models that aren't compiled)
+        with span("predict"):
+            predictions = model_set.predict(X)
+        intervals = model_set.metadata.get("intervals") or {}
+        forecast = {}
+        for param, prediction in predictions.items():
+            # Intervals are the point forecast shifted by residual quantiles
+            # stored at training time; no extra model calls
+            lower, upper = self._calculate_confidence_intervals(prediction, param, intervals.get(param), leads)
+            forecast[param], forecast[f"{param}_lower"], forecast[f"{param}_upper"] = prediction, lower, upper
+        return forecast
+
+    def _feature_lag(self, location: dict, now: pd.Timestamp) -> int:
+        # Hours between the location's latest feature row and `now`
+        engine = self.feature_engines.get(self.registry.location_key(location["lat"], location["lon"]))
+        if engine is None or engine.last_timestamp is None:
+            return 0
+        return max(0, int((now - engine.last_timestamp) / pd.Timedelta(hours=1)))
+
+    def _move_to_valid_time(self, features: np.ndarray, valid_times) -> np.ndarray:
+        # Moves the temporal features (hour, day, month, season) of feature rows
+        # to valid_times (epoch seconds), in place: a persisted row turned into
+        # the forecast for a later hour
+        valid = np.asarray(valid_times, dtype=np.int64).view("datetime64[s]")
+        months = valid.astype("datetime64[M]")
+        features[:, 0] = (valid - valid.astype("datetime64[D]")).astype(np.int64) // 3600
+        features[:, 1] = (valid.astype("datetime64[D]") - months).astype(np.int64) + 1
+        features[:, 2] = months.astype(np.int64) % 12 + 1
+        features[:, 3] = SEASON_BY_MONTH[months.astype(np.int64) % 12 + 1]
+        return features
+
+    def location_key(self, location) -> str:
+        # Locations with the same key get identical forecasts (same feature
+        # engine and model set), so responses can be shared between them
+        location = self.normalize_location(location)
+        return self.registry.location_key(location["lat"], location["lon"])
+
+    def model_version(self, location) -> str:
+        # Version of the model set that would serve this location right now
+        location = self.normalize_location(location)
+        return self._get_model_set(location["lat"], location["lon"]).version
+
+    async def amodel_version(self, location) -> str:
+        # model_version() for the API; the first call for a location loads its models
+        return await asyncio.to_thread(self.model_version, location)
+
+    def normalize_location(self, location) -> dict:
+        # A mapped name, (lat, lon) or {"lat", "lon", "name"} as {"lat", "lon", "name"}
+        if isinstance(location, str):
+            region = self.micro_location_mapper.resolve(location)
+            return {"lat": region["lat"], "lon": region["lon"], "name": location}
+        if isinstance(location, dict):
+            if location.get("lat") is None or location.get("lon") is None:
+                return self.normalize_location(location["name"])
+            lat, lon = float(location["lat"]), float(location["lon"])
+            name = location.get("name") or f"{lat},{lon}"
+        else:
+            lat, lon = float(location[0]), float(location[1])
+            name = f"{lat},{lon}"
+        return {"lat": lat, "lon": lon, "name": name}
+
+    def _latest_features(self, lat: float, lon: float) -> np.ndarray:
+        start_date, end_date = self._feature_window(lat, lon)
+        recent_data = self.data_fetcher.fetch_historical_series(lat, lon, start_date, end_date)
+        return self._feed_engine(lat, lon, recent_data)
+
+    async def _alatest_features(self, lat: float, lon: float) -> np.ndarray:
+        start_date, end_date = self._feature_window(lat, lon)
+        recent_data = await self.data_fetcher.afetch_historical_series(lat, lon, start_date, end_date)
+        return self._feed_engine(lat, lon, recent_data)
+
+    def _feature_window(self, lat: float, lon: float):
+        # A new location's engine is primed from the last 30 days; after that
+        # only the hours since its last update are read
+        engine = self.feature_engines.get(self.registry.location_key(lat, lon))
+        end_date = datetime.now().strftime("%Y-%m-%d")
+        if engine is None or engine.last_timestamp is None:
+            start_date = (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d")
+        else:
+            start_date = engine.last_timestamp.strftime("%Y-%m-%d")
+        return start_date, end_date
+
+    @timed("features.update")
+    def _feed_engine(self, lat: float, lon: float, recent_data: HourlySeries) -> np.ndarray:
+        key = self.registry.location_key(lat, lon)
+        engine = self.feature_engines.get(key)
+
+        # The archive lags a few days; only feed hours that have been observed
+        observed = np.zeros(len(recent_data), dtype=bool)
+        for param in self.PARAMETERS:
+            observed |= ~np.isnan(recent_data[param])
+        if observed.any():
+            engine = self.feature_engines.setdefault(key, engine or RollingFeatureEngine())
+            engine.update_many(recent_data.slice(0, np.flatnonzero(observed)[-1] + 1))
+        if 'wind_direction' in recent_data:
+            seen = np.flatnonzero(~np.isnan(recent_data['wind_direction']))
+            if len(seen):
+                self.wind_directions[key] = round(float(recent_data['wind_direction'][seen[-1]]), 1)
+        if engine is None or engine.count == 0:
+            raise Exception(f"No recent observations for {lat}, {lon}")
+
+        return engine.features()
+
+    @timed("features")
+    def _prepare_features(self, history, first: int = 0, last: int = None) -> np.ndarray:
+        # Batch version of RollingFeatureEngine, used for training on full history.
+        # Works on the float32 columns of a gap-filled LocationHistory (hours
+        # first..last); a DataFrame with a timestamp column is converted once.
+        if not isinstance(history, LocationHistory):
+            history = LocationHistory.from_series(HourlySeries.from_frame(history, 'timestamp'))
+            history.fill_gaps()
+        last = history.length if last is None else last
+        n = last - first
+
+        timestamps = history.times[first:last].view('datetime64[s]')
+        months = timestamps.astype('datetime64[M]')
+        temperature = history.column('temperature')[first:last]
+        humidity = history.column('humidity')[first:last]
+        pressure = history.column('pressure')[first:last]
+        precipitation = history.column('precipitation')[first:last]
+
+        # Columns in FEATURE_NAMES order, written straight into one float32 array
+        features = np.empty((n, len(FEATURE_NAMES)), dtype=np.float32)
+        # Temporal features
+        features[:, 0] = (history.times[first:last] // 3600) % 24
+        features[:, 1] = (timestamps.astype('datetime64[D]') - months).astype(np.int64) + 1
+        features[:, 2] = months.astype(np.int64) % 12 + 1
+        features[:, 3] = SEASON_BY_MONTH[features[:, 2].astype(np.int64)]
+        # Weather patterns
+        features[:, 4] = self._rolling_sum(temperature, 24) / np.minimum(np.arange(1, n + 1), 24)
+        features[0, 5] = 0
+        np.subtract(pressure[1:], pressure[:-1], out=features[1:, 5])
+        # Atmospheric stability indicators
+        np.multiply(temperature, humidity, out=features[:, 6])
+        features[:, 7] = self._calculate_pressure_tendency(pressure)
+        # Historical patterns
+        features[:, 8] = self._rolling_sum(precipitation, 24)
+        features[:, 9] = self._rolling_range(temperature, 24)
         
         # Fill any remaining NaN values with 0
-        features = features.fillna(0)
+        np.nan_to_num(features, copy=False)
         
-        return features.values
+        return features
+
+    def _rolling_sum(self, values: np.ndarray, window: int) -> np.ndarray:
+        # Sum of the last `window` values (fewer at the start), like rolling(min_periods=1).sum()
+        sums = np.cumsum(values, dtype=np.float64)
+        sums[window:] -= sums[:-window]
+        return sums
+
+    def _rolling_range(self, values: np.ndarray, window: int) -> np.ndarray:
+        # max - min over the last `window` values; sliding_window_view is a strided
+        # view, so the only new array is the result
+        result = np.empty(len(values), dtype=np.float32)
+        head = min(window - 1, len(values))
+        result[:head] = np.maximum.accumulate(values[:head]) - np.minimum.accumulate(values[:head])
+        if len(values) >= window:
+            windows = np.lib.stride_tricks.sliding_window_view(values, window)
+            result[head:] = windows.max(axis=1) - windows.min(axis=1)
+        return result
 
     def _generate_explanation(self, predictions: dict) -> str:
         # Generate a human-readable explanation
@@ -172,10 +614,88 @@ class WeatherPredictor:
             
         return f"Based on historical weather patterns, expect {weather_type} with a temperature of {predictions['temperature']}°C"
 
-    def _calculate_confidence_intervals(self, X, param):
-        # Placeholder for calculating confidence intervals
-        # This should be implemented based on the specific model and its confidence interval calculation
-        return (X[0][0] - 0.5, X[0][0] + 0.5)
+    def _calibrate_intervals(self, models: dict, scaler, features: np.ndarray, targets: dict,
+                             times: np.ndarray = None) -> dict:
+        # Split-conformal residual quantiles per parameter: with n held-out
+        # residuals r = y - prediction, [prediction + q_low, prediction + q_high]
+        # covers a new observation with probability >= INTERVAL_COVERAGE.
+        # Forecasts are the feature row of the last observed hour with only the
+        # temporal features moved ahead (_predict_rows), so errors grow with the
+        # lead; each lead up to INTERVAL_MAX_LEAD is calibrated on exactly such
+        # rows, built from pairs of held-out hours that far apart (by `times`,
+        # epoch seconds in order; rows may have gaps). Leads with too few pairs
+        # for the upper quantile are left out. Without `times` the rows are a
+        # random sample and only lead 0 is calibrated.
+        alpha = 1 - self.INTERVAL_COVERAGE
+        intervals = {"coverage": self.INTERVAL_COVERAGE, "n_calibration": len(features)}
+        by_lead = {param: {"leads": [], "lower_by_lead": [], "upper_by_lead": []} for param in models}
+        for lead in range(self.INTERVAL_MAX_LEAD + 1 if times is not None else 1):
+            origins = np.arange(len(features))
+            if lead:
+                # Rows whose hour `lead` hours later is a row too
+                later = np.searchsorted(times, times + lead * 3600)
+                origins = origins[times[np.minimum(later, len(times) - 1)] == times + lead * 3600]
+                if len(origins) > self.CALIBRATION_ROWS:
+                    origins = origins[np.linspace(0, len(origins) - 1, self.CALIBRATION_ROWS).astype(np.int64)]
+                valid = later[origins]
+            else:
+                valid = origins
+            n = len(origins)
+            if n < 1 or np.ceil((n + 1) * (1 - alpha / 2)) > n:
+                break
+            X = features[origins] if lead == 0 else self._move_to_valid_time(features[origins], times[valid])
+            X = scaler.transform(X)
+            for param, model in models.items():
+                residuals = np.sort(targets[param][valid] - model.predict(X))
+                # finite-sample corrected ranks of the lower and upper quantiles
+                low = max(int(np.floor((n + 1) * alpha / 2)) - 1, 0)
+                high = min(int(np.ceil((n + 1) * (1 - alpha / 2))) - 1, n - 1)
+                by_lead[param]["leads"].append(lead)
+                by_lead[param]["lower_by_lead"].append(float(residuals[low]))
+                by_lead[param]["upper_by_lead"].append(float(residuals[high]))
+                if lead == 0:
+                    inside = (residuals >= residuals[low]) & (residuals <= residuals[high])
+                    intervals[param] = {
+                        "lower": float(residuals[low]),
+                        "upper": float(residuals[high]),
+                        "calibration_coverage": round(float(inside.mean()), 4),
+                        # Baseline for refresh()'s drift check
+                        "rmse": float(np.sqrt(np.mean(np.square(residuals))))
+                    }
+        for param in models:
+            if param not in intervals:
+                raise Exception("Not enough history to calibrate prediction intervals")
+            intervals[param].update(by_lead[param])
+        return intervals
+
+    def _calculate_confidence_intervals(self, prediction: np.ndarray, param: str, interval: dict = None, leads=None):
+        # Vectorized over all rows of one model; without calibration data (older
+        # model sets) the bounds collapse to the point forecast. With `leads`
+        # each row gets its lead's quantiles (the longest calibrated lead's
+        # beyond them, see _interval_coverage).
+        if interval is None:
+            return prediction, prediction
+        if leads is not None and "leads" in interval:
+            index = np.minimum(np.searchsorted(interval["leads"], leads), len(interval["leads"]) - 1)
+            lower = prediction + np.asarray(interval["lower_by_lead"])[index]
+            upper = prediction + np.asarray(interval["upper_by_lead"])[index]
+        else:
+            lower = prediction + interval["lower"]
+            upper = prediction + interval["upper"]
+        floor, ceiling = self.BOUNDS.get(param, (None, None))
+        if floor is not None or ceiling is not None:
+            lower = np.clip(lower, floor, ceiling)
+            upper = np.clip(upper, floor, ceiling)
+        return lower, upper
+
+    def _interval_coverage(self, intervals: dict, leads: np.ndarray) -> np.ndarray:
+        # Nominal coverage per row, None past the longest calibrated lead. Model
+        # sets calibrated before intervals were per lead only hold it at lead 0.
+        coverage = np.full(len(leads), None, dtype=object)
+        longest = [max(intervals[param].get("leads", [0])) for param in self.PARAMETERS if param in intervals]
+        if intervals.get("coverage") is not None and longest:
+            coverage[np.asarray(leads) <= min(longest)] = intervals["coverage"]
+        return coverage
 
     def _get_season(self, month: int) -> int:
         if month in [12, 1, 2]:
@@ -193,39 +713,111 @@ class WeatherPredictor:
 
     def _calculate_pressure_tendency(self, pressure):
         # Calculate 3-hour pressure change
-        return pressure.diff(periods=3)
+        tendency = np.full(len(pressure), np.nan, dtype=np.float32)
+        np.subtract(pressure[3:], pressure[:-3], out=tendency[3:])
+        return tendency
 
     def predict_micro_location(self, city: str, area: str, target_date: str) -> dict:
-        location_data = self.micro_location_mapper.get_coordinates(city, area)
-        
-        # Get hourly predictions for the next 24 hours
-        hourly_predictions = {}
-        for hour in range(24):
-            features = self._prepare_micro_features(location_data, hour)
-            predictions = self._get_hourly_prediction(features)
-            
-            if predictions['precipitation'] > 0.2:  # Significant rain threshold
-                hourly_predictions[hour] = {
-                    "rain_probability": f"{predictions['precipitation'] * 100:.1f}%",
-                    "intensity": self._get_rain_intensity(predictions['precipitation']),
-                    "duration": self._estimate_duration(hour, predictions),
-                    "specific_location": self._get_specific_location(location_data, predictions)
+        # Hour-by-hour rain nowcast for every sub-region of an area: one
+        # (sub_regions x 24 hours) batch through _predict_rows, so each model
+        # runs once for the whole area
+        regions, horizons = self._micro_request(city, area, target_date)
+        result = self.predict_batch(regions, horizons)
+        return self._micro_forecast(regions, horizons, result)
+
+    async def apredict_micro_location(self, city: str, area: str, target_date: str) -> dict:
+        regions, horizons = self._micro_request(city, area, target_date)
+        result = await self.apredict_batch(regions, horizons)
+        return self._micro_forecast(regions, horizons, result)
+
+    def _micro_request(self, city: str, area: str, target_date: str):
+        # 24 hours from the start of target_date (or its hour, when one is
+        # given), never earlier than the current hour
+        target = pd.Timestamp(target_date)
+        now = pd.Timestamp.now().floor('h')
+        start = max(0, int((target - now) / pd.Timedelta(hours=1)))
+        regions = [{"lat": r["lat"], "lon": r["lon"], "name": r["key"]}
+                   for r in self.micro_location_mapper.get_sub_regions(city, area)]
+        return regions, list(range(start, start + self.MICRO_HOURS))
+
+    @timed("micro_forecast")
+    def _micro_forecast(self, regions: list, horizons: list, result: dict) -> dict:
+        # Everything below works on (sub_regions, hours) arrays
+        shape = (len(regions), len(horizons))
+        precipitation = np.asarray(result["precipitation"]).reshape(shape)
+        raining = precipitation > self.RAIN_THRESHOLD
+
+        intensity = self.INTENSITY_LABELS[np.searchsorted(self.INTENSITY_BINS, precipitation)]
+        intensity = np.where(raining, intensity, 'none')
+        duration = self._remaining_run_length(raining)
+        radius = np.where(raining, self._calculate_affected_radius(precipitation), 0.0)
+        rain_probability = np.clip(precipitation * 100, 0, 100)
+
+        valid_times = np.asarray(result["valid_time"]).reshape(shape)
+        columns = {
+            column: np.asarray(result[column]).reshape(shape)
+            for param in self.PARAMETERS
+            for column in (param, f"{param}_lower", f"{param}_upper")
+        }
+
+        sub_regions = []
+        for i, region in enumerate(regions):
+            wind_direction = self.wind_directions.get(self.registry.location_key(region["lat"], region["lon"]))
+            landmarks = self._get_nearby_landmarks(region["lat"], region["lon"], radius[i].max())
+            hourly = {"valid_time": valid_times[i].tolist()}
+            hourly.update({column: values[i].tolist() for column, values in columns.items()})
+            hourly.update({
+                "rain_probability": np.round(rain_probability[i], 1).tolist(),
+                "intensity": intensity[i].tolist(),
+                "duration_hours": duration[i].tolist(),
+                "affected_radius_km": np.round(radius[i], 2).tolist()
+            })
+            sub_regions.append({
+                "name": region["name"],
+                "lat": region["lat"],
+                "lon": region["lon"],
+                "wind_direction": wind_direction,
+                "hourly": hourly,
+                # Only the hours with significant rain, keyed by valid time
+                "rain_events": {
+                    str(valid_times[i, h]): {
+                        "rain_probability": f"{rain_probability[i, h]:.1f}%",
+                        "intensity": str(intensity[i, h]),
+                        "duration": int(duration[i, h]),
+                        "specific_location": {
+                            "center": {"lat": region["lat"], "lon": region["lon"]},
+                            "radius": round(float(radius[i, h]), 2),
+                            "direction": wind_direction,
+                            "landmarks": landmarks
+                        }
+                    }
+                    for h in np.flatnonzero(raining[i])
                 }
-        
-        return self._format_micro_prediction(hourly_predictions)
+            })
 
-    def _get_specific_location(self, location_data, predictions):
-        # Use terrain data and wind patterns to predict exact rain location
-        base_lat, base_lon = location_data['lat'], location_data['lon']
-        wind_direction = predictions['wind_direction']
-        wind_speed = predictions['wind_speed']
-        
-        # Calculate affected area radius based on precipitation intensity
-        affected_radius = self._calculate_affected_radius(predictions['precipitation'])
-        
         return {
-            "center": {"lat": base_lat, "lon": base_lon},
-            "radius": affected_radius,
-            "direction": wind_direction,
-            "landmarks": self._get_nearby_landmarks(base_lat, base_lon)
-        }
\ No newline at end of file
+            "rain_threshold": self.RAIN_THRESHOLD,
+            # One value only when every hour has the same nominal coverage
+            "interval_coverage": (result["interval_coverage"][0]
+                                  if len(set(result["interval_coverage"])) == 1 else None),
+            "model_version": result["model_version"][0] if result["model_version"] else None,
+            "sub_regions": sub_regions
+        }
+
+    def _remaining_run_length(self, raining: np.ndarray) -> np.ndarray:
+        # Hours left in the current rain spell, this hour included (0 when dry),
+        # computed per row with a reset-on-dry cumulative sum from the end
+        reversed_rain = raining[:, ::-1].astype(np.int64)
+        totals = np.cumsum(reversed_rain, axis=1)
+        resets = np.maximum.accumulate(np.where(reversed_rain == 0, totals, 0), axis=1)
+        return (totals - resets)[:, ::-1]
+
+    def _calculate_affected_radius(self, precipitation: np.ndarray) -> np.ndarray:
+        # Heavier rain comes from larger cells: ~1 km for drizzle, growing with
+        # the square root of the rate and capped at 10 km
+        return np.clip(1.0 + 2.0 * np.sqrt(np.maximum(precipitation, 0)), 1.0, 10.0)
+
+    def _get_nearby_landmarks(self, lat: float, lon: float, radius_km: float) -> list:
+        # Mapped areas inside the largest rain radius around the point
+        nearby = self.micro_location_mapper.nearest(lat, lon, k=5)
+        return [region["key"] for region, distance in nearby if 0 < distance <= max(radius_km, 1.0)]